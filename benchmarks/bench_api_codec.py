@@ -0,0 +1,96 @@
+# bench_api_codec.py
+#
+# This script is used to measure the cost of fetching entity lists from the Netbird API.
+# It starts the local mock API (benchmarks/mock_api.py) with a synthetic account and, for
+# every entity type and response encoding, reports bytes on the wire and request time
+# through netbird_api; parse time is measured separately for stdlib json and orjson.
+#
+# Usage:
+# python3 benchmarks/bench_api_codec.py [--peers 20000] [--runs 5] [--output bench_api_codec.json]
+#
+# Version: 1.0.1
+#
+
+import os
+import sys
+import json
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_api import MockApi, ENCODERS, synthetic_store
+
+ENTITIES = {
+    'peers': '/api/peers',
+    'groups': '/api/groups',
+    'policies': '/api/policies',
+    'resources': '/api/networks/n0/resources',
+}
+
+
+def codecs():
+    result = {'json': json.loads}
+    try:
+        import orjson
+        result['orjson'] = orjson.loads
+    except ImportError:
+        pass
+    return result
+
+
+def best_of(runs, func):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Замер объёма и разбора ответов API')
+    parser.add_argument('--peers', type=int, default=20000, help='Число пиров в синтетическом аккаунте')
+    parser.add_argument('--groups', type=int, default=2000, help='Число групп')
+    parser.add_argument('--policies', type=int, default=2000, help='Число политик')
+    parser.add_argument('--resources', type=int, default=5000, help='Число ресурсов в сети')
+    parser.add_argument('--runs', type=int, default=5, help='Число повторов (берётся минимум)')
+    parser.add_argument('--output', type=str, default='bench_api_codec.json', help='Файл для результатов в JSON')
+    args = parser.parse_args(argv)
+
+    mock = MockApi(synthetic_store(peers=args.peers, groups=args.groups, policies=args.policies,
+                                   networks=1, resources_per_network=args.resources)).start()
+    os.environ['NETBIRD_API_URL'] = mock.url
+    os.environ['NETBIRD_API_TOKEN'] = 'benchmark'
+    os.environ['NETBIRD_GET_FRESHNESS'] = '0'
+    import netbird_api as api
+    api.configure()
+    session = api.session()
+
+    results = {'json_codec': api.JSON_CODEC, 'entities': {}}
+    print(f"{'entity':<10} {'encoding':<9} {'bytes':>11} {'request ms':>11}")
+    for entity, path in ENTITIES.items():
+        raw = mock.encoded_list(path, None)
+        entry = {'objects': len(json.loads(raw)), 'raw_bytes': len(raw), 'encodings': {}, 'parse_ms': {}}
+        for encoding in ['identity'] + list(ENCODERS):
+            session.headers['Accept-Encoding'] = encoding
+            before = mock.bytes_sent[path]
+            elapsed = best_of(args.runs, lambda: api.request('GET', path).raise_for_status())
+            wire = (mock.bytes_sent[path] - before) // args.runs
+            entry['encodings'][encoding] = {'bytes': wire, 'request_ms': round(elapsed * 1000, 2)}
+            print(f"{entity:<10} {encoding:<9} {wire:>11} {elapsed * 1000:>11.2f}")
+        for name, loads in codecs().items():
+            elapsed = best_of(args.runs, lambda: loads(raw))
+            entry['parse_ms'][name] = round(elapsed * 1000, 2)
+            print(f"{entity:<10} parse {name:<14} {elapsed * 1000:>11.2f} ms")
+        results['entities'][entity] = entry
+    mock.stop()
+    with open(args.output, 'w') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {args.output}")
+
+
+if __name__ == '__main__':
+    main()
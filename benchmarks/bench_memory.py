@@ -0,0 +1,117 @@
+# bench_memory.py
+#
+# This script is used to measure the memory held by the API-side lookups on a large account.
+# It starts the local mock API (benchmarks/mock_api.py) with a synthetic tenant (50k peers by
+# default) and, in a fresh process per mode, fetches peers and groups and keeps what the
+# tools need: raw dicts indexed by name (as the configurator did before netbird_models) or
+# compact models (NameIndex for name -> id, Inventory for group membership).
+# Reported: peak RSS of the process (ru_maxrss, includes the transient full JSON parse) and
+# memory still retained after the lookups are built (tracemalloc, separate run).
+#
+# Usage:
+# python3 benchmarks/bench_memory.py [--peers 50000] [--groups 5000] [--output bench_memory.json]
+#
+# Version: 1.0.1
+#
+
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MODES = ['raw', 'models']
+
+
+def peak_rss_mb():
+    # ru_maxrss: килобайты в Linux, байты в macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def fetch(api, path):
+    resp = api.request('GET', path)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def build(api, mode):
+    import netbird_models
+    if mode == 'raw':
+        peers = fetch(api, '/api/peers')
+        groups = fetch(api, '/api/groups')
+        return {p['name']: p for p in peers}, {g['name']: g for g in groups}
+    # Разобранные списки живут только пока строятся модели; строки общие через таблицу символов
+    peers = fetch(api, '/api/peers')
+    groups = fetch(api, '/api/groups')
+    inventory = netbird_models.Inventory(peers, groups)
+    peer_ids = netbird_models.NameIndex(peers, inventory.symbols)
+    group_ids = netbird_models.NameIndex(groups, inventory.symbols)
+    return peer_ids, group_ids, inventory
+
+
+def worker(mode, traced):
+    # Отдельный процесс на каждый замер: пик RSS не сбрасывается внутри процесса
+    import tracemalloc
+    import netbird_api as api
+    api.configure()
+    api.session()
+    if traced:
+        tracemalloc.start()
+    start = time.perf_counter()
+    held = build(api, mode)
+    elapsed = time.perf_counter() - start
+    api.clear_cache()
+    gc.collect()
+    result = {'seconds': round(elapsed, 3)}
+    if traced:
+        result['retained_mb'] = round(tracemalloc.get_traced_memory()[0] / 2 ** 20, 1)
+    else:
+        result['peak_rss_mb'] = peak_rss_mb()
+    del held
+    print(json.dumps(result))
+
+
+def run_worker(mode, traced, env):
+    args = [sys.executable, os.path.abspath(__file__), '--worker', mode] + (['--traced'] if traced else [])
+    proc = subprocess.run(args, env=env, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Замер памяти индексов пиров и групп')
+    parser.add_argument('--peers', type=int, default=50000, help='Число пиров в синтетическом аккаунте')
+    parser.add_argument('--groups', type=int, default=5000, help='Число групп')
+    parser.add_argument('--output', type=str, default='bench_memory.json', help='Файл для результатов в JSON')
+    parser.add_argument('--worker', choices=MODES, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--traced', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.worker:
+        return worker(args.worker, args.traced)
+
+    from mock_api import MockApi, synthetic_store
+    mock = MockApi(synthetic_store(peers=args.peers, groups=args.groups, policies=0, networks=0)).start()
+    env = dict(os.environ, NETBIRD_API_URL=mock.url, NETBIRD_API_TOKEN='benchmark', NETBIRD_GET_FRESHNESS='0',
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+    results = {'peers': args.peers, 'groups': args.groups, 'modes': {}}
+    print(f"{'mode':<8} {'peak RSS MB':>12} {'retained MB':>12} {'seconds':>8}")
+    for mode in MODES:
+        entry = run_worker(mode, False, env)
+        entry.update(retained_mb=run_worker(mode, True, env)['retained_mb'])
+        results['modes'][mode] = entry
+        print(f"{mode:<8} {entry['peak_rss_mb']:>12} {entry['retained_mb']:>12} {entry['seconds']:>8}")
+    mock.stop()
+    with open(args.output, 'w') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# bench_startup.py
+#
+# This script is used to measure the cold-start time of the Netbird IaC tools.
+# For every module it runs `python -X importtime -c "import <module>"` and sums the
+# self time reported per top-level package; for every CLI command it times `--help`.
+# Results are printed and written to a JSON file so they can be compared across commits.
+#
+# Usage:
+# python3 benchmarks/bench_startup.py [--runs 5] [--output bench_startup.json]
+#
+# Version: 1.0.1
+#
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ['netbird', 'netbird_configurator', 'netbird_linter', 'netbird_access', 'visualize_relations']
+COMMANDS = [[], ['sync', '--help'], ['lint', '--help'], ['visualize', '--help'], ['access', '--help']]
+
+
+def import_time(module):
+    # Возвращает (общее время импорта в мкс, топ пакетов по собственному времени)
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    per_package = {}
+    total = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len('import time:'):].split('|')]
+        package = name.strip().split('.')[0]
+        per_package[package] = per_package.get(package, 0) + int(self_us)
+        total += int(self_us)
+    top = sorted(per_package.items(), key=lambda kv: -kv[1])[:10]
+    return total, dict(top)
+
+
+def command_time(args, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(ROOT, 'netbird.py')] + args, cwd=ROOT, capture_output=True)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Замер времени холодного старта')
+    parser.add_argument('--runs', type=int, default=5, help='Число запусков каждой команды (берётся минимум)')
+    parser.add_argument('--output', type=str, default='bench_startup.json', help='Файл для результатов в JSON')
+    args = parser.parse_args(argv)
+
+    results = {'python': sys.version.split()[0], 'imports': {}, 'commands': {}}
+    # Базовая стоимость запуска интерпретатора (site, encodings) без модулей проекта
+    baseline, _ = import_time('sys')
+    results['interpreter_ms'] = round(baseline / 1000, 1)
+    print(f"{'interpreter':<31} {baseline / 1000:8.1f} ms")
+    for module in MODULES:
+        total, top = import_time(module)
+        results['imports'][module] = {'total_ms': round(total / 1000, 1), 'top_packages_ms': {k: round(v / 1000, 1) for k, v in top.items()}}
+        print(f"import {module:<24} {total / 1000:8.1f} ms")
+    for args_ in COMMANDS:
+        name = ' '.join(['netbird.py'] + args_)
+        elapsed = command_time(args_, args.runs)
+        results['commands'][name] = round(elapsed * 1000, 1)
+        print(f"{name:<32} {elapsed * 1000:8.1f} ms")
+    with open(args.output, 'w') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {args.output}")
+
+
+if __name__ == '__main__':
+    main()
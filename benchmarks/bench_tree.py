@@ -0,0 +1,172 @@
+# bench_tree.py
+#
+# This script is used to measure the linter and the visualizer on large configuration trees.
+# For every size a synthetic tree is generated (benchmarks/generate_tree.py) in a temporary
+# directory and timed: lint by stage, graph build, filter queries (around the largest group
+# and a random one, depth 1, 2 and unlimited), layout and headless render (Agg backend),
+# the level-of-detail view (aggregation, layout, render, one expand of a peer bucket) and the
+# HTML export (layout and payload).
+# Layout and render of the full graph are skipped above --layout-limit nodes: every iteration
+# of the spring layout is quadratic in the number of nodes (about 9 s for 1k nodes).
+# Results are printed and written to a JSON file so they can be compared across commits.
+#
+# Usage:
+# python3 benchmarks/bench_tree.py [--sizes 1000,10000,100000] [--layout-limit 3000] [--output bench_tree.json]
+#
+# Version: 1.0.1
+#
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+FILTER_DEPTHS = [1, 2, None]
+
+
+class StageTimer:
+    # Совместим с netbird_profile.null_stage: with timer.stage('name'): ...
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(self.timings.get(name, 0) + time.perf_counter() - start, 4)
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, round(time.perf_counter() - start, 4)
+
+
+def git_commit():
+    try:
+        proc = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True)
+        return proc.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def bench_filters(G, visualize_relations, rng):
+    # Запросы вокруг самой связной группы и случайной группы на разную глубину
+    groups = [n for n, data in G.nodes(data=True) if data.get('type') == 'group']
+    if not groups:
+        return {}
+    targets = {'largest': max(groups, key=G.degree), 'random': rng.choice(groups)}
+    results = {}
+    for label, group in targets.items():
+        for depth in FILTER_DEPTHS:
+            sub, elapsed = timed(visualize_relations.filter_graph, G, {group}, depth)
+            results[f"{label}/depth={depth if depth is not None else 'all'}"] = {'seconds': elapsed, 'nodes': sub.number_of_nodes()}
+    return results
+
+
+def bench_lod(G, visualize_relations, path):
+    # Свёрнутое представление: размер не должен зависеть от числа объектов
+    import numpy as np
+
+    lod, build_seconds = timed(visualize_relations.LodView, G, True)
+    pos, layout_seconds = timed(visualize_relations.layout, lod.view)
+    _, render_seconds = timed(visualize_relations.render, G, path, False, pos, lod)
+    result = {'build': build_seconds, 'layout': layout_seconds, 'render': render_seconds,
+              'nodes': lod.view.number_of_nodes(), 'edges': len(lod.edges()), 'expand': None}
+    buckets = [n for n, data in lod.view.nodes(data=True) if data.get('type') == 'peers']
+    if buckets:
+        bucket = max(buckets, key=lambda n: lod.view.nodes[n]['count'])
+        start = time.perf_counter()
+        added = lod.expand(bucket)
+        visualize_relations.layout_neighborhood(lod.view, added, np.array(pos[bucket]))
+        result['expand'] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def bench_size(objects, seed, layout_limit, workdir):
+    import netbird_linter
+    import visualize_html
+    import visualize_relations
+    from generate_tree import generate_tree
+
+    root = os.path.join(workdir, f"tree-{objects}")
+    os.makedirs(root, exist_ok=True)
+    counts, generate_seconds = timed(generate_tree, root, objects, seed)
+    result = {'objects': objects, 'counts': counts, 'generate': generate_seconds}
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        timer = StageTimer()
+        (errors, warnings), result['lint'] = timed(netbird_linter.lint, timer.stage)
+        result['lint_stages'] = timer.timings
+        result['lint_findings'] = {'errors': len(errors), 'warnings': len(warnings)}
+        G, result['build_graph'] = timed(visualize_relations.build_graph)
+        result['graph'] = {'nodes': G.number_of_nodes(), 'edges': G.number_of_edges()}
+        result['filters'] = bench_filters(G, visualize_relations, random.Random(seed))
+        result['lod'] = bench_lod(G, visualize_relations, os.path.join(workdir, f"graph-{objects}-lod.png"))
+        size, seconds = timed(visualize_html.export_html, G, os.path.join(workdir, f"graph-{objects}.html"),
+                              visualize_relations.NODE_COLORS, visualize_relations.NODE_LABELS)
+        result['html'] = {'seconds': seconds, 'mb': round(size / 2 ** 20, 2)}
+        if G.number_of_nodes() <= layout_limit:
+            pos, result['layout'] = timed(visualize_relations.layout, G)
+            _, result['render'] = timed(visualize_relations.render, G, os.path.join(workdir, f"graph-{objects}.png"), False, pos)
+        else:
+            result['layout'] = result['render'] = None
+            result['skipped'] = f"layout/render: {G.number_of_nodes()} узлов > --layout-limit {layout_limit}"
+    finally:
+        os.chdir(cwd)
+    return result
+
+
+def print_result(r):
+    fmt = lambda v: f"{v:8.3f}" if isinstance(v, (int, float)) else f"{'-':>8}"
+    print(f"{r['objects']:>8} {r['graph']['nodes']:>8} {fmt(r['generate'])} {fmt(r['lint'])} {fmt(r['build_graph'])} "
+          f"{fmt(max((f['seconds'] for f in r['filters'].values()), default=None))} {fmt(r['layout'])} {fmt(r['render'])}")
+    print(f"{'':>8} lint: " + ', '.join(f"{k} {v:.3f}" for k, v in r['lint_stages'].items()))
+    lod = r['lod']
+    print(f"{'':>8} lod: {lod['nodes']} узлов, {lod['edges']} рёбер; свёртка {lod['build']:.3f}, укладка {lod['layout']:.3f}, "
+          f"отрисовка {lod['render']:.3f}, раскрытие {fmt(lod['expand']).strip()}")
+    print(f"{'':>8} html: {r['html']['seconds']:.3f} с, {r['html']['mb']} МБ")
+    if r.get('skipped'):
+        print(f"{'':>8} пропущено {r['skipped']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Замер линтера и визуализатора на синтетических деревьях')
+    parser.add_argument('--sizes', type=str, default='1000,10000,100000', help='Размеры деревьев (число объектов) через запятую')
+    parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора')
+    parser.add_argument('--layout-limit', type=int, default=3000, help='Максимум узлов графа для укладки и отрисовки')
+    parser.add_argument('--keep', type=str, default=None, metavar='DIR', help='Сохранить деревья и изображения в DIR вместо временного каталога')
+    parser.add_argument('--output', type=str, default='bench_tree.json', help='Файл для результатов в JSON')
+    args = parser.parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    output = os.path.abspath(args.output)
+
+    results = {'python': sys.version.split()[0], 'commit': git_commit(), 'seed': args.seed,
+               'layout_limit': args.layout_limit, 'sizes': {}}
+    print(f"{'objects':>8} {'nodes':>8} {'generate':>8} {'lint':>8} {'graph':>8} {'filter':>8} {'layout':>8} {'render':>8}")
+    with tempfile.TemporaryDirectory(prefix='bench_tree-') as tmp:
+        workdir = os.path.abspath(args.keep) if args.keep else tmp
+        os.makedirs(workdir, exist_ok=True)
+        for objects in sizes:
+            result = bench_size(objects, args.seed, args.layout_limit, workdir)
+            results['sizes'][str(objects)] = result
+            print_result(result)
+    with open(output, 'w') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {output}")
+
+
+if __name__ == '__main__':
+    main()
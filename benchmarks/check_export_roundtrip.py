@@ -0,0 +1,133 @@
+# check_export_roundtrip.py
+#
+# This script is used to check that an exported account syncs back without changes.
+# It starts the local mock API (benchmarks/mock_api.py) with a synthetic account that also has
+# host and domain resources, a single-peer router and a rule with port ranges, exports it with
+# netbird_export into a temporary directory and runs the configurator on the exported tree.
+# The round trip is clean when nothing is created or deleted and every object keeps its fields.
+#
+# Usage:
+# python3 benchmarks/check_export_roundtrip.py [--peers 200] [--keep DIR]
+#
+# Version: 1.0.1
+#
+
+import os
+import sys
+import json
+import copy
+import shutil
+import argparse
+import tempfile
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_api import MockApi, synthetic_store
+
+RED = '\033[91m'
+GREEN = '\033[92m'
+RESET = '\033[0m'
+
+# Поля, которые API вычисляет сам или которые синхронизация не передаёт (mock хранит тело запроса как есть:
+# name роутера и network ресурса/роутера — служебные поля конфигуратора)
+IGNORED = {'id', 'peers_count', 'issued', 'resources', 'status', 'description', 'is_service_user', 'network'}
+# Ссылка в ответе API: {id, name, ...}; в теле запроса — id
+REF_KEYS = {'id', 'name', 'type', 'peers_count'}
+
+
+def roundtrip_store(peers):
+    store = synthetic_store(peers=peers, groups=20, policies=10, networks=3, resources_per_network=4)
+    resources = store['/api/networks/n0/resources']
+    resources['r0-1'].update(type='host', address='10.0.1.5/32')
+    resources['r0-2'].update(type='domain', address='*.example.com')
+    # Роутер с одним пиром вместо групп
+    store['/api/networks/n1/routers']['rt1'] = {'id': 'rt1', 'peer': 'p1', 'peer_groups': [], 'metric': 100,
+                                                'masquerade': False, 'enabled': True}
+    rule = store['/api/policies']['pol0']['rules'][0]
+    rule.update(protocol='tcp', port_ranges=[{'start': 8000, 'end': 8100}])
+    rule = store['/api/policies']['pol1']['rules'][0]
+    rule.update(destinations=None, destinationResource={'id': 'r0-1', 'type': 'host'})
+    return store
+
+
+def normalize(store):
+    # {коллекция по именам: отсортированные объекты}: id заменены именами, порядок не учитывается
+    names = {}
+    for items in store.values():
+        for obj in items.values():
+            names[obj['id']] = obj.get('name') or obj.get('email') or obj['id']
+
+    def fields(obj):
+        return {k: norm(v) for k, v in obj.items() if k not in IGNORED and v not in (None, [], '')}
+
+    def norm(value):
+        if isinstance(value, dict) and 'id' in value and set(value) <= REF_KEYS and value['id'] in names:
+            return [names[value['id']], value.get('type')] if value.get('type') else names[value['id']]
+        if isinstance(value, dict):
+            return fields(value)
+        if isinstance(value, list):
+            return sorted((norm(v) for v in value), key=json.dumps)
+        return names.get(value, value) if isinstance(value, str) else value
+
+    result = {}
+    for coll, items in store.items():
+        if coll == '/api/peers':
+            continue
+        key = '/'.join(names.get(part, part) for part in coll.split('/'))
+        objs = [dict(obj, name=None) if coll.endswith('/routers') else obj for obj in items.values()]
+        result[key] = sorted((fields(obj) for obj in objs), key=json.dumps)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Проверка: экспортированный аккаунт синхронизируется без изменений')
+    parser.add_argument('--peers', type=int, default=200, help='Число пиров синтетического аккаунта')
+    parser.add_argument('--keep', type=str, default=None, metavar='DIR', help='Сохранить экспортированное дерево в DIR')
+    args = parser.parse_args(argv)
+
+    mock = MockApi(roundtrip_store(args.peers)).start()
+    os.environ['NETBIRD_API_URL'] = mock.url
+    os.environ['NETBIRD_API_TOKEN'] = 'roundtrip'
+    import netbird_api as api
+    import netbird_export
+    import netbird_configurator
+
+    before = normalize(copy.deepcopy(mock.store))
+    workdir = args.keep or tempfile.mkdtemp(prefix='netbird-roundtrip-')
+    cwd = os.getcwd()
+    try:
+        api.configure()
+        netbird_export.export_tree(workdir)
+        os.chdir(workdir)
+        mock.requests.clear()
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            netbird_configurator.main(['--journal', os.path.join(workdir, '.netbird-journal.jsonl')])
+    finally:
+        os.chdir(cwd)
+        mock.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    # peer роутера — id пира, а не имя из yaml
+    peer_ids = set(mock.store['/api/peers'])
+    bad_peers = [f"{coll}: peer {r['peer']!r}" for coll, items in mock.store.items() if coll.endswith('/routers')
+                 for r in items.values() if r.get('peer') and r['peer'] not in peer_ids]
+    writes = sorted(f"{method} {path}" for (method, path), count in mock.requests.items() if method in ('POST', 'DELETE'))
+    after = normalize(mock.store)
+    changed = [coll for coll in sorted(set(before) | set(after)) if before.get(coll) != after.get(coll)]
+    for line in writes:
+        print(f"{RED}✗{RESET} {line}")
+    for line in bad_peers:
+        print(f"{RED}✗{RESET} {line}")
+    for coll in changed:
+        print(f"{RED}✗{RESET} {coll}\n  до:    {before.get(coll)}\n  после: {after.get(coll)}")
+    if writes or changed or bad_peers:
+        sys.exit(1)
+    print(f"{GREEN}✓{RESET} экспорт и синхронизация без изменений")
+
+
+if __name__ == '__main__':
+    main()
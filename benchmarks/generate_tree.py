@@ -0,0 +1,194 @@
+# generate_tree.py
+#
+# This script is used to generate a synthetic Netbird configuration tree for benchmarks.
+# The total number of objects is split between entities in proportions close to a real
+# account: peers in groups (each peer in one or two groups), users with auto_groups, networks
+# with resources and routes, policies with one to three rules over groups and resources, dns.
+# Files are written in both forms the tools accept: a list of objects and a single object.
+# The output depends only on the arguments and --seed.
+#
+# Usage:
+# python3 benchmarks/generate_tree.py --objects 10000 --output /tmp/tree [--seed 1] [--force]
+#
+# Version: 1.0.1
+#
+
+import os
+import sys
+import random
+import argparse
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from netbird_config import CONFIG_DIRS, is_yaml_file
+
+try:
+    Dumper = yaml.CSafeDumper
+except AttributeError:
+    Dumper = yaml.SafeDumper
+
+# Доли объектов по сущностям; пиры в конфигурации существуют только как участники групп
+SHARES = {'peers': 0.60, 'groups': 0.10, 'users': 0.10, 'policies': 0.08, 'resources': 0.08, 'routes': 0.02, 'dns': 0.02}
+FILE_SIZE = 50          # объектов в одном файле-списке
+SINGLE_FILE_SHARE = 0.2  # доля файлов в виде одного объекта
+RESOURCES_PER_NETWORK = 20
+PORTS = ['22', '80', '443', '5432', '6443', '8080', '9100']
+OS_PATTERNS = ['Linux*', 'Darwin*', 'Windows*']
+
+
+def split_counts(objects):
+    # Не меньше одного объекта каждой сущности, чтобы были все виды связей
+    return {entity: max(1, int(objects * share)) for entity, share in SHARES.items()}
+
+
+def write_yaml(path, data):
+    with open(path, 'w') as f:
+        yaml.dump(data, f, Dumper=Dumper, allow_unicode=True, sort_keys=False)
+
+
+def write_entity(root, entity, items, rng, prefix):
+    # Объекты раскладываются по файлам: часть файлов — одиночные объекты, остальные — списки
+    path = os.path.join(root, entity)
+    os.makedirs(path, exist_ok=True)
+    files = 0
+    i = 0
+    while i < len(items):
+        if rng.random() < SINGLE_FILE_SHARE:
+            write_yaml(os.path.join(path, f"{prefix}-{files}.yaml"), items[i])
+            i += 1
+        else:
+            write_yaml(os.path.join(path, f"{prefix}-{files}.yaml"), items[i:i + FILE_SIZE])
+            i += FILE_SIZE
+        files += 1
+    return files
+
+
+def make_groups(counts, rng):
+    # Группы пользователей (u-*) и пиров (c-*); каждый пир в одной-двух группах пиров
+    user_groups = [f"u-team-{i}" for i in range(max(1, counts['groups'] // 10))]
+    peer_groups = [f"c-cluster-{i}" for i in range(max(1, counts['groups'] - len(user_groups)))]
+    members = {name: [] for name in peer_groups}
+    for i in range(counts['peers']):
+        peer = f"peer-{i}"
+        members[peer_groups[i % len(peer_groups)]].append(peer)
+        if rng.random() < 0.3:
+            members[rng.choice(peer_groups)].append(peer)
+    groups = [{'name': name} for name in user_groups]
+    groups += [{'name': name, 'peers': sorted(set(peers))} for name, peers in members.items()]
+    # Несколько групп задают состав селекторами
+    for g in groups[len(user_groups)::25]:
+        g['peers_match'] = [f"peer-{rng.randint(1, 9)}*", {'os': rng.choice(OS_PATTERNS), 'hostname': 're:^host-\\d+$'}]
+    return groups, user_groups, peer_groups
+
+
+def make_users(counts, user_groups, rng):
+    return [{
+        'name': f"user-{i}",
+        'email': f"user-{i}@example.com",
+        'role': 'owner' if i == 0 else rng.choice(['admin', 'user', 'user', 'user']),
+        'is_blocked': rng.random() < 0.05,
+        'auto_groups': rng.sample(user_groups, min(len(user_groups), rng.randint(1, 2))),
+    } for i in range(counts['users'])]
+
+
+def make_networks(counts, peer_groups, rng):
+    # {сеть: (описание сети, ресурсы, роуты)}; адреса ресурсов не пересекаются между сетями
+    networks = {}
+    total = max(1, counts['resources'] // RESOURCES_PER_NETWORK)
+    for n in range(total):
+        name = f"net-{n}"
+        networks[name] = ({'name': name, 'description': f"synthetic network {n}"}, [], [])
+    for i in range(counts['resources']):
+        name = f"net-{i % total}"
+        address = f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}/32" if i % 4 else f"10.{128 + i // 256 % 128}.{i % 256}.0/24"
+        networks[name][1].append({'name': f"res-{i}", 'enabled': True, 'address': address,
+                                  'groups': [rng.choice(peer_groups)]})
+    for i in range(counts['routes']):
+        name = f"net-{i % total}"
+        networks[name][2].append({'name': f"route-{i}", 'enabled': True, 'metric': 9999, 'masquerade': True,
+                                  'peer_groups': [rng.choice(peer_groups)]})
+    for network, resources, routes in networks.values():
+        network['resources'] = [r['name'] for r in resources]
+        network['routes'] = [r['name'] for r in routes]
+    return networks
+
+
+def make_rule(i, j, user_groups, peer_groups, resources, rng):
+    rule = {'name': f"policy-{i}-rule-{j}", 'description': '', 'enabled': True, 'action': 'accept',
+            'bidirectional': rng.random() < 0.5, 'protocol': rng.choice(['all', 'tcp', 'tcp', 'udp'])}
+    if rule['protocol'] != 'all':
+        rule['ports'] = rng.sample(PORTS, rng.randint(1, 3))
+    rule['sources'] = ['All'] if rng.random() < 0.05 else rng.sample(user_groups + peer_groups, rng.randint(1, 2))
+    if resources and rng.random() < 0.3:
+        rule['destinationResource'] = [rng.choice(resources)]
+    else:
+        rule['destinations'] = rng.sample(peer_groups, min(len(peer_groups), rng.randint(1, 3)))
+    return rule
+
+
+def make_policies(counts, user_groups, peer_groups, resources, rng):
+    return [{
+        'name': f"policy-{i}",
+        'description': f"synthetic policy {i}",
+        'enabled': True,
+        'rules': [make_rule(i, j, user_groups, peer_groups, resources, rng) for j in range(rng.randint(1, 3))],
+    } for i in range(counts['policies'])]
+
+
+def make_dns(counts, peer_groups, rng):
+    return [{
+        'name': f"dns-{i}",
+        'description': f"synthetic nameserver group {i}",
+        'primary': False,
+        'search_domains_enabled': True,
+        'domains': [f"zone-{i}.example.com"],
+        'nameservers': [{'ip': f"172.16.{i // 256 % 256}.{i % 256}", 'ns_type': 'udp', 'port': 53}],
+        'groups': ['All'] if i == 0 else [rng.choice(peer_groups)],
+    } for i in range(counts['dns'])]
+
+
+def generate_tree(root, objects=1000, seed=1):
+    # Возвращает {сущность: число объектов, 'files': число файлов}
+    rng = random.Random(seed)
+    counts = split_counts(objects)
+    groups, user_groups, peer_groups = make_groups(counts, rng)
+    networks = make_networks(counts, peer_groups, rng)
+    resources = [r['name'] for n in networks.values() for r in n[1]]
+    files = write_entity(root, 'groups', groups, rng, 'groups')
+    files += write_entity(root, 'users', make_users(counts, user_groups, rng), rng, 'users')
+    files += write_entity(root, 'policy', make_policies(counts, user_groups, peer_groups, resources, rng), rng, 'policies')
+    files += write_entity(root, 'dns', make_dns(counts, peer_groups, rng), rng, 'dns')
+    # Ресурсы и роуты: один файл на сеть (имя файла — имя сети); роуты сети из одного объекта — одиночным объектом
+    for entity in ['networks', 'resources', 'routes']:
+        os.makedirs(os.path.join(root, entity), exist_ok=True)
+    for name, (network, network_resources, routes) in networks.items():
+        write_yaml(os.path.join(root, 'networks', f"{name}.yaml"), network)
+        write_yaml(os.path.join(root, 'resources', f"{name}.yaml"), network_resources)
+        if routes:
+            write_yaml(os.path.join(root, 'routes', f"{name}.yaml"), routes[0] if len(routes) == 1 else routes)
+        files += 2 + bool(routes)
+    counts.update(groups=len(groups), networks=len(networks), files=files)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Генерация синтетического дерева конфигурации Netbird')
+    parser.add_argument('--objects', type=int, default=1000, help='Общее число объектов (пиры, группы, пользователи, политики, ресурсы, роуты, dns)')
+    parser.add_argument('--output', type=str, required=True, help='Каталог для дерева конфигурации')
+    parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора случайных чисел')
+    parser.add_argument('--force', action='store_true', help='Писать в каталог, где уже есть yaml-файлы конфигурации')
+    args = parser.parse_args(argv)
+    existing = [d for d in CONFIG_DIRS if os.path.isdir(os.path.join(args.output, d))
+                and any(is_yaml_file(f) for f in os.listdir(os.path.join(args.output, d)))]
+    if existing and not args.force:
+        print(f"В {args.output} уже есть конфигурация ({', '.join(existing)}); используйте --force")
+        sys.exit(1)
+    counts = generate_tree(args.output, args.objects, args.seed)
+    print(', '.join(f"{k}: {v}" for k, v in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+# mock_api.py
+#
+# This module is a local in-memory stand-in for the Netbird management API used by the
+# benchmarks. It serves list/create/update/delete for groups, peers, users, policies,
+# dns nameservers, networks and their resources/routers, honours Accept-Encoding
+# (gzip, deflate, br when brotli is installed) and counts requests and bytes sent.
+#
+# Usage:
+# from mock_api import MockApi, synthetic_store
+# api = MockApi(synthetic_store(peers=20000)).start()
+# os.environ['NETBIRD_API_URL'] = api.url
+#
+# Version: 1.0.1
+#
+
+import gzip
+import json
+import zlib
+import threading
+import itertools
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODERS = {
+    'gzip': lambda data: gzip.compress(data, compresslevel=6),
+    'deflate': zlib.compress,
+}
+if brotli is not None:
+    ENCODERS['br'] = lambda data: brotli.compress(data, quality=5)
+
+
+def synthetic_store(peers=1000, groups=200, policies=100, networks=10, resources_per_network=20):
+    # Коллекции в формате ответов API: {путь коллекции: {id: объект}}
+    store = {
+        '/api/peers': {},
+        '/api/groups': {},
+        '/api/users': {},
+        '/api/policies': {},
+        '/api/dns/nameservers': {},
+        '/api/networks': {},
+    }
+    group_refs = [{'id': f"g{i}", 'name': f"group-{i}", 'peers_count': 0} for i in range(groups)]
+    for i in range(peers):
+        group = group_refs[i % groups] if groups else None
+        store['/api/peers'][f"p{i}"] = {
+            'id': f"p{i}", 'name': f"peer-{i}", 'ip': f"100.{64 + i // 65536 % 64}.{i // 256 % 256}.{i % 256}",
+            'connection_ip': f"203.0.{i // 256 % 256}.{i % 256}", 'connected': i % 3 != 0,
+            'last_seen': '2026-01-01T00:00:00Z', 'os': 'Linux 6.1', 'kernel_version': '6.1.0',
+            'geoname_id': 2643743, 'version': '0.36.0', 'ui_version': '', 'hostname': f"host-{i}",
+            'user_id': 'u1', 'ssh_enabled': False, 'dns_label': f"peer-{i}.netbird.cloud",
+            'login_expiration_enabled': True, 'login_expired': False, 'approval_required': False,
+            'inactivity_expiration_enabled': False, 'country_code': 'GB', 'city_name': 'London',
+            'serial_number': f"SN{i:08d}", 'accessible_peers_count': peers - 1,
+            'groups': [group] if group else [],
+        }
+    for i, ref in enumerate(group_refs):
+        members = [{'id': f"p{j}", 'name': f"peer-{j}"} for j in range(i, peers, groups)]
+        store['/api/groups'][ref['id']] = dict(ref, peers=members, peers_count=len(members), resources=[], issued='api')
+    store['/api/users']['u1'] = {'id': 'u1', 'email': 'admin@example.com', 'name': 'admin', 'role': 'owner',
+                                 'status': 'active', 'is_blocked': False, 'is_service_user': False, 'auto_groups': []}
+    for i in range(policies):
+        src, dst = group_refs[i % groups], group_refs[(i + 1) % groups]
+        store['/api/policies'][f"pol{i}"] = {
+            'id': f"pol{i}", 'name': f"policy-{i}", 'description': '', 'enabled': True, 'source_posture_checks': [],
+            'rules': [{'id': f"rule{i}", 'name': f"rule-{i}", 'description': '', 'enabled': True, 'action': 'accept',
+                       'bidirectional': True, 'protocol': 'all', 'sources': [src], 'destinations': [dst]}],
+        }
+    for n in range(networks):
+        store['/api/networks'][f"n{n}"] = {'id': f"n{n}", 'name': f"net-{n}", 'description': ''}
+        store[f"/api/networks/n{n}/resources"] = {
+            f"r{n}-{j}": {'id': f"r{n}-{j}", 'name': f"res-{n}-{j}", 'description': '', 'type': 'subnet',
+                          'address': f"10.{n % 256}.{j % 256}.0/24", 'enabled': True,
+                          'groups': [group_refs[j % groups]] if groups else []}
+            for j in range(resources_per_network)
+        }
+        store[f"/api/networks/n{n}/routers"] = {
+            f"rt{n}": {'id': f"rt{n}", 'peer_groups': [group_refs[n % groups]['id']] if groups else [],
+                       'metric': 9999, 'masquerade': True, 'enabled': True},
+        }
+    return store
+
+
+def split_path(path):
+    # Путь коллекции и id объекта: /api/networks/{id}/resources/{rid}, /api/dns/nameservers/{id}
+    parts = path.rstrip('/').split('/')
+    if len(parts) >= 5 and parts[2] == 'networks' and parts[4] in ('resources', 'routers'):
+        return '/'.join(parts[:5]), (parts[5] if len(parts) > 5 else None)
+    if path.startswith('/api/dns/nameservers'):
+        return '/api/dns/nameservers', (parts[4] if len(parts) > 4 else None)
+    return '/'.join(parts[:3]), (parts[3] if len(parts) > 3 else None)
+
+
+class MockApi:
+    def __init__(self, store=None, host='127.0.0.1', port=0):
+        self.store = store if store is not None else synthetic_store()
+        self.requests = Counter()
+        self.bytes_sent = Counter()
+        self.lock = threading.RLock()
+        self.ids = itertools.count(1)
+        self._encoded = {}
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        # Бенчмарки открывают много соединений одновременно
+        self.server.request_queue_size = 128
+
+    @property
+    def url(self):
+        return f"http://{self.server.server_address[0]}:{self.server.server_port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    def encoded_list(self, coll, encoding):
+        # Сериализованный (и сжатый) список кэшируется до первой записи
+        key = (coll, encoding)
+        if key not in self._encoded:
+            data = json.dumps(list(self.store.get(coll, {}).values())).encode()
+            self._encoded[key] = ENCODERS[encoding](data) if encoding else data
+        return self._encoded[key]
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, code, body, encoding=None):
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                if encoding:
+                    self.send_header('Content-Encoding', encoding)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with mock.lock:
+                    mock.bytes_sent[self.path] += len(body)
+
+            def _encoding(self):
+                accepted = [e.strip().split(';')[0] for e in (self.headers.get('Accept-Encoding') or '').split(',')]
+                return next((e for e in ('br', 'gzip', 'deflate') if e in accepted and e in ENCODERS), None)
+
+            def _handle(self, method):
+                with mock.lock:
+                    mock.requests[(method, self.path)] += 1
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                coll, oid = split_path(self.path)
+                with mock.lock:
+                    items = mock.store.get(coll)
+                    if items is None:
+                        return self._send(404, b'{"message": "not found"}')
+                    if method == 'GET':
+                        if oid is None:
+                            encoding = self._encoding()
+                            return self._send(200, mock.encoded_list(coll, encoding), encoding)
+                        if oid not in items:
+                            return self._send(404, b'{"message": "not found"}')
+                        return self._send(200, json.dumps(items[oid]).encode())
+                    mock._encoded.clear()
+                    if method == 'POST':
+                        oid = f"id{next(mock.ids)}"
+                    elif oid not in items:
+                        return self._send(404, b'{"message": "not found"}')
+                    if method == 'DELETE':
+                        del items[oid]
+                        if coll == '/api/networks':
+                            for kind in ('resources', 'routers'):
+                                mock.store.pop(f"/api/networks/{oid}/{kind}", None)
+                        return self._send(200, b'{}')
+                    if method == 'POST' and coll == '/api/networks':
+                        for kind in ('resources', 'routers'):
+                            mock.store[f"/api/networks/{oid}/{kind}"] = {}
+                    items[oid] = dict(body or {}, id=oid)
+                    return self._send(200, json.dumps(items[oid]).encode())
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def do_PUT(self):
+                self._handle('PUT')
+
+            def do_DELETE(self):
+                self._handle('DELETE')
+
+        return Handler
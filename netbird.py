@@ -0,0 +1,57 @@
+# netbird.py
+#
+# This script is the single command line entry point for the Netbird IaC tools.
+# Subcommands import their modules lazily, so `--help` and light commands do not pay
+# for requests, networkx or matplotlib.
+#
+# Usage:
+# python3 netbird.py <command> [args...]
+# python3 netbird.py sync --tag groups
+#
+# Version: 1.0.1
+#
+
+import sys
+
+# command: (модуль, функция, аргументы по умолчанию, описание)
+COMMANDS = {
+    'sync': ('netbird_configurator', 'main', [], 'Синхронизация локальной конфигурации с API'),
+    'plan': ('netbird_configurator', 'main', ['--plan'], 'Показать изменения без применения'),
+    'lint': ('netbird_linter', 'main', [], 'Проверка конфигурации'),
+    'visualize': ('visualize_relations', 'main', [], 'Визуализация связей между сущностями'),
+    'access': ('netbird_access', 'main', [], 'Матрица эффективного доступа'),
+    'impact': ('netbird_impact', 'main', [], 'Объекты и пиры, затронутые изменением'),
+    'policies': ('netbird_policy', 'main', [], 'Оптимизация правил политик: отчёт и скомпилированные политики'),
+    'export': ('netbird_export', 'main', [], 'Экспорт существующего аккаунта в yaml-файлы'),
+    'daemon': ('netbird_daemon', 'main', [], 'Демон: применение изменений при сохранении файлов'),
+    'accounts': ('netbird_accounts', 'main', [], 'Синхронизация нескольких аккаунтов по манифесту'),
+    'gc': ('netbird_gc', 'main', [], 'Неиспользуемые объекты аккаунта и план их удаления'),
+    'rollback': ('netbird_rollback', 'main', [], 'Откат применённого запуска по снимкам объектов'),
+}
+
+
+def print_usage():
+    print("Использование: netbird.py <command> [args...]\n")
+    print("Команды:")
+    for name, (module, func, defaults, help_text) in COMMANDS.items():
+        print(f"  {name:<12} {help_text}")
+    print("\nСправка по команде: netbird.py <command> --help")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help', 'help'):
+        print_usage()
+        return 0
+    command = COMMANDS.get(argv[0])
+    if command is None:
+        print(f"Неизвестная команда: {argv[0]}\n")
+        print_usage()
+        return 2
+    module_name, func_name, defaults, help_text = command
+    module = __import__(module_name)
+    return getattr(module, func_name)(defaults + argv[1:])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,335 @@
+# netbird_access.py
+#
+# This script is used to evaluate the effective access defined by the Netbird configuration.
+# It compiles policies into a sparse group x group/resource reachability matrix (bitsets)
+# and answers which peers/users can reach a target and what a peer/user can reach.
+#
+# Usage:
+# python3 netbird_access.py who-can-reach 192.168.15.0/24
+# python3 netbird_access.py reachable-from c-Home-peer1 vasyakrg@gmail.com
+# python3 netbird_access.py matrix
+#
+# Version: 1.0.1
+#
+
+import argparse
+import json
+import sys
+
+from netbird_cidr import CidrIndex, parse_network
+from netbird_config import load_config_tree, iter_items, network_name, as_list
+from netbird_models import Inventory
+from netbird_selectors import SelectorSet, group_selectors
+
+RED = '\033[91m'
+YELLOW = '\033[93m'
+GREEN = '\033[92m'
+RESET = '\033[0m'
+
+ALL_GROUP = 'All'
+PROTOCOLS = ('all', 'tcp', 'udp', 'icmp')
+
+
+def iter_bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class AccessMatrix:
+    # Строки матрицы: группа-источник -> [маска групп назначения, маска ресурсов назначения].
+    # Матрица хранится отдельно для каждого protocol, пустые строки не хранятся.
+
+    def __init__(self, tree):
+        self.groups = []
+        self.group_index = {}
+        self.known_groups = set()
+        self.resources = []
+        self.resource_index = {}
+        self.peers = []
+        self.peer_index = {}
+        self.peer_groups = []
+        self.users = {}
+        self.rows = {}
+        self.group_resources = {}
+        self.address_index = None
+        self.problems = []
+        self._seen_problems = set()
+        self._reach_cache = {}
+        self._compile(tree)
+
+    def _group(self, name):
+        idx = self.group_index.get(name)
+        if idx is None:
+            idx = len(self.groups)
+            self.groups.append(name)
+            self.group_index[name] = idx
+        return idx
+
+    def _problem(self, msg):
+        if msg not in self._seen_problems:
+            self._seen_problems.add(msg)
+            self.problems.append(msg)
+
+    def _group_mask(self, names, where):
+        mask = 0
+        for name in as_list(names):
+            if name not in self.known_groups:
+                self._problem(f"Группа '{name}' из {where} не описана в groups")
+            mask |= 1 << self._group(name)
+        return mask
+
+    def _compile(self, tree):
+        self._group(ALL_GROUP)
+        self.known_groups.add(ALL_GROUP)
+        group_peers = {}
+        for fname, idx, g in iter_items(tree, 'groups'):
+            if 'name' not in g:
+                continue
+            self._group(g['name'])
+            self.known_groups.add(g['name'])
+            group_peers[g['name']] = as_list(g.get('peers'))
+        self._expand_selectors(tree, group_peers)
+        # Пиры: все пиры входят в группу All
+        for gname, peers in group_peers.items():
+            bit = 1 << self.group_index[gname]
+            for peer in peers:
+                pidx = self.peer_index.get(peer)
+                if pidx is None:
+                    pidx = len(self.peers)
+                    self.peers.append(peer)
+                    self.peer_index[peer] = pidx
+                    self.peer_groups.append(1)
+                self.peer_groups[pidx] |= bit
+        # Пользователи: пиры пользователя попадают в его auto_groups
+        for fname, idx, u in iter_items(tree, 'users'):
+            if 'email' not in u:
+                continue
+            self.users[u['email']] = 1 | self._group_mask(u.get('auto_groups'), f"users ({fname})")
+        # Сети, в которых есть хотя бы один включённый роутер
+        routed = set()
+        for fname, idx, r in iter_items(tree, 'routes'):
+            if r.get('enabled', True):
+                routed.add(network_name(fname))
+        # Ресурсы
+        for fname, idx, r in iter_items(tree, 'resources'):
+            if 'name' not in r:
+                continue
+            net = network_name(fname)
+            ridx = len(self.resources)
+            self.resources.append({
+                'name': r['name'],
+                'network': net,
+                'address': r.get('address'),
+                'enabled': r.get('enabled', True),
+                'routed': net in routed,
+            })
+            self.resource_index[r['name']] = ridx
+            gmask = self._group_mask(r.get('groups'), f"resources ({fname})")
+            if not r.get('enabled', True):
+                continue
+            if net not in routed:
+                self._problem(f"Ресурс '{r['name']}' в сети {net} недоступен: нет включённых роутов")
+                continue
+            for gi in iter_bits(gmask):
+                self.group_resources[gi] = self.group_resources.get(gi, 0) | (1 << ridx)
+        self.address_index = CidrIndex((res['address'], ridx) for ridx, res in enumerate(self.resources) if res['address'])
+        # Политики
+        for fname, idx, policy in iter_items(tree, 'policy'):
+            if not policy.get('enabled', True):
+                continue
+            for rule in as_list(policy.get('rules')):
+                if not isinstance(rule, dict):
+                    continue
+                if not rule.get('enabled', True) or rule.get('action', 'accept') != 'accept':
+                    continue
+                self._compile_rule(rule, f"policy ({fname})")
+
+    def _expand_selectors(self, tree, group_peers):
+        # peers_match без API раскрывается только по пирам, перечисленным в группах явно
+        # (условия по hostname/os доступны лишь при синхронизации, где есть инвентарь API)
+        selectors = group_selectors(g for fname, idx, g in iter_items(tree, 'groups'))
+        if not selectors:
+            return
+        known = sorted({peer for peers in group_peers.values() for peer in peers})
+        try:
+            expanded = SelectorSet(selectors).expand(Inventory([{'id': p, 'name': p} for p in known]))
+        except ValueError as e:
+            self._problem(f"peers_match: {e}")
+            return
+        for name, peers in expanded.items():
+            group_peers[name] = list(dict.fromkeys(group_peers.get(name, []) + peers))
+
+    def _compile_rule(self, rule, where):
+        protocol = rule.get('protocol', 'all')
+        src = self._group_mask(rule.get('sources'), where)
+        dst = self._group_mask(rule.get('destinations'), where)
+        rdst = 0
+        for gi in iter_bits(dst):
+            rdst |= self.group_resources.get(gi, 0)
+        for name in as_list(rule.get('destinationResource')):
+            ridx = self.resource_index.get(name)
+            if ridx is None:
+                self._problem(f"Ресурс '{name}' из {where} не описан в resources")
+                continue
+            res = self.resources[ridx]
+            if res['enabled'] and res['routed']:
+                rdst |= 1 << ridx
+        rows = self.rows.setdefault(protocol, {})
+        for s in iter_bits(src):
+            row = rows.setdefault(s, [0, 0])
+            row[0] |= dst
+            row[1] |= rdst
+        if rule.get('bidirectional'):
+            for d in iter_bits(dst):
+                row = rows.setdefault(d, [0, 0])
+                row[0] |= src
+
+    def _protocols(self, protocol):
+        if protocol is None:
+            return list(self.rows)
+        if protocol == 'all':
+            return ['all']
+        return [protocol, 'all']
+
+    def principal_mask(self, name):
+        # Маска групп пира или пользователя
+        if name in self.peer_index:
+            return self.peer_groups[self.peer_index[name]]
+        if name in self.users:
+            return self.users[name]
+        return None
+
+    def reach(self, gmask, protocol=None):
+        # Что доступно участнику с маской групп gmask: (маска групп, маска ресурсов)
+        key = (gmask, protocol)
+        cached = self._reach_cache.get(key)
+        if cached is not None:
+            return cached
+        g = r = 0
+        for proto in self._protocols(protocol):
+            rows = self.rows.get(proto, {})
+            for s in iter_bits(gmask):
+                row = rows.get(s)
+                if row:
+                    g |= row[0]
+                    r |= row[1]
+        self._reach_cache[key] = (g, r)
+        return g, r
+
+    def resolve_target(self, target):
+        # Цель: ресурс, группа, пир или IP/CIDR -> (маска групп, маска ресурсов)
+        if target in self.resource_index:
+            return 0, 1 << self.resource_index[target]
+        if target in self.group_index:
+            # Участники любой группы входят и в All: правила с назначением All тоже ведут к ним
+            return 1 << self.group_index[target] | 1 << self.group_index[ALL_GROUP], 0
+        if target in self.peer_index:
+            return self.peer_groups[self.peer_index[target]], 0
+        if parse_network(target) is None:
+            return None
+        rmask = 0
+        for net, ridxs in self.address_index.covering(target):
+            for ridx in ridxs:
+                rmask |= 1 << ridx
+        return 0, rmask
+
+    def sources_for(self, gmask, rmask, protocol=None):
+        # Маска групп-источников, из которых достижима цель
+        src = 0
+        for proto in self._protocols(protocol):
+            for s, row in self.rows.get(proto, {}).items():
+                if row[0] & gmask or row[1] & rmask:
+                    src |= 1 << s
+        return src
+
+    def who_can_reach(self, targets, protocol=None):
+        result = {}
+        for target in targets:
+            resolved = self.resolve_target(target)
+            if resolved is None:
+                result[target] = None
+                continue
+            src = self.sources_for(resolved[0], resolved[1], protocol)
+            result[target] = {
+                'groups': [self.groups[i] for i in iter_bits(src)],
+                'peers': [p for p, pg in zip(self.peers, self.peer_groups) if pg & src],
+                'users': [u for u, ug in self.users.items() if ug & src],
+            }
+        return result
+
+    def reachable_from(self, principals, protocol=None):
+        result = {}
+        for name in principals:
+            gmask = self.principal_mask(name)
+            if gmask is None:
+                result[name] = None
+                continue
+            g, r = self.reach(gmask, protocol)
+            result[name] = {
+                'groups': [self.groups[i] for i in iter_bits(g)],
+                'resources': [self.resources[i]['name'] for i in iter_bits(r)],
+            }
+        return result
+
+    def matrix(self, protocol=None):
+        result = {}
+        for proto in self._protocols(protocol):
+            for s, row in sorted(self.rows.get(proto, {}).items()):
+                entry = result.setdefault(proto, {}).setdefault(self.groups[s], {'groups': [], 'resources': []})
+                entry['groups'] = [self.groups[i] for i in iter_bits(row[0])]
+                entry['resources'] = [self.resources[i]['name'] for i in iter_bits(row[1])]
+        return result
+
+
+def load_access_matrix(root='.'):
+    return AccessMatrix(load_config_tree(root))
+
+
+def print_result(result, as_json):
+    if as_json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+    for name, entry in result.items():
+        if entry is None:
+            print(f"{RED}✗{RESET} {name}: не найден")
+            continue
+        print(f"{GREEN}{name}{RESET}")
+        for key, values in entry.items():
+            print(f"  {key}: {', '.join(values) if values else '-'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Netbird: матрица эффективного доступа')
+    parser.add_argument('--protocol', type=str, default=None, choices=PROTOCOLS, help='Учитывать только правила с этим protocol (и all)')
+    parser.add_argument('--json', action='store_true', help='Вывод в формате JSON')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('who-can-reach', help='Какие пиры/пользователи имеют доступ к цели (ресурс, группа, пир, IP/CIDR)')
+    p.add_argument('targets', nargs='+')
+    p = sub.add_parser('reachable-from', help='Что доступно пирам/пользователям (по имени пира или email)')
+    p.add_argument('principals', nargs='+')
+    sub.add_parser('matrix', help='Скомпилированная матрица группа -> группы/ресурсы')
+    args = parser.parse_args(argv)
+
+    engine = load_access_matrix()
+    if args.command == 'who-can-reach':
+        result = engine.who_can_reach(args.targets, args.protocol)
+    elif args.command == 'reachable-from':
+        result = engine.reachable_from(args.principals, args.protocol)
+    else:
+        result = engine.matrix(args.protocol)
+        if args.json:
+            print_result(result, True)
+        else:
+            for proto, rows in result.items():
+                print(f"=== protocol: {proto} ===")
+                print_result(rows, False)
+        return
+    print_result(result, args.json)
+    if any(v is None for v in result.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
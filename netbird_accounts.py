@@ -0,0 +1,164 @@
+# netbird_accounts.py
+#
+# This script is used to reconcile many Netbird accounts in one run.
+# Accounts are listed in a yaml manifest (config root, API URL, name of the environment
+# variable with the token). Every account is synced by its own configurator process started
+# in its config root, so caches, the adaptive rate limit, the journal and failures stay per
+# account; up to --jobs processes run at once, so the total time is close to the slowest
+# account rather than the sum. Output of each account goes to its own log, the per-account
+# reports are collected into one summary.
+#
+# Usage:
+# python3 netbird_accounts.py accounts.yaml [--jobs 8] [--plan] [--tag groups] [--logs logs]
+#
+# accounts.yaml:
+# accounts:
+#   - name: customer-a
+#     root: customers/a
+#     api_url: https://api.netbird.io
+#     token_env: NETBIRD_TOKEN_CUSTOMER_A
+#     args: ['--compile-policies']      # необязательно
+#
+# Version: 1.0.1
+#
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import yaml
+
+RED = '\033[91m'
+YELLOW = '\033[93m'
+GREEN = '\033[92m'
+RESET = '\033[0m'
+
+CONFIGURATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'netbird_configurator.py')
+
+
+def load_manifest(path):
+    # Пути root считаются от каталога манифеста; ValueError при ошибке в описании
+    with open(path, 'r') as f:
+        data = yaml.safe_load(f) or {}
+    base = os.path.dirname(os.path.abspath(path))
+    accounts = []
+    for idx, entry in enumerate(data.get('accounts') or [], 1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"аккаунт #{idx}: ожидается словарь")
+        missing = [key for key in ('name', 'root', 'api_url', 'token_env') if not entry.get(key)]
+        if missing:
+            raise ValueError(f"аккаунт #{idx}: не указаны {', '.join(missing)}")
+        accounts.append(dict(entry, root=os.path.join(base, entry['root']), args=list(entry.get('args') or [])))
+    names = [a['name'] for a in accounts]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise ValueError(f"повторяющиеся имена аккаунтов: {', '.join(duplicates)}")
+    return accounts
+
+
+def sync_account(account, common_args, logs_dir, timeout=None):
+    # Отдельный процесс конфигуратора: свой каталог, окружение, кэш и ограничение параллельности
+    result = {'name': account['name'], 'root': account['root'], 'status': 'ok', 'exit_code': None,
+              'duration': 0.0, 'log': os.path.join(logs_dir, f"{account['name']}.log"), 'report': None, 'error': None}
+    token = os.getenv(account['token_env'])
+    if not token:
+        result.update(status='failed', error=f"переменная {account['token_env']} не задана")
+        return result
+    if not os.path.isdir(account['root']):
+        result.update(status='failed', error=f"каталог не найден: {account['root']}")
+        return result
+    report_path = os.path.join(logs_dir, f"{account['name']}.report.json")
+    if os.path.exists(report_path):
+        os.remove(report_path)
+    env = dict(os.environ, NETBIRD_API_URL=account['api_url'], NETBIRD_API_TOKEN=token)
+    args = [sys.executable, CONFIGURATOR] + common_args + account['args'] + ['--report', report_path]
+    started = time.perf_counter()
+    with open(result['log'], 'w') as log:
+        try:
+            proc = subprocess.run(args, cwd=account['root'], env=env, stdout=log, stderr=subprocess.STDOUT, timeout=timeout)
+            result['exit_code'] = proc.returncode
+            if proc.returncode != 0:
+                result['status'] = 'failed'
+        except subprocess.TimeoutExpired:
+            result.update(status='timeout', error=f"превышено время ожидания {timeout} с")
+    result['duration'] = round(time.perf_counter() - started, 3)
+    if os.path.exists(report_path):
+        with open(report_path) as f:
+            result['report'] = json.load(f)
+        result['error'] = result['error'] or result['report'].get('error')
+    return result
+
+
+def run_accounts(accounts, common_args, logs_dir, jobs, timeout=None):
+    # Потоки только ждут дочерние процессы: вся работа с API идёт в процессах аккаунтов
+    os.makedirs(logs_dir, exist_ok=True)
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(accounts)))) as pool:
+        futures = [pool.submit(sync_account, account, common_args, logs_dir, timeout) for account in accounts]
+        for future in as_completed(futures):
+            result = future.result()
+            color = GREEN if result['status'] == 'ok' else RED
+            print(f"{color}[{result['status']}]{RESET} {result['name']} за {result['duration']:.1f} с")
+            results.append(result)
+    order = {a['name']: i for i, a in enumerate(accounts)}
+    return sorted(results, key=lambda r: order[r['name']])
+
+
+def print_summary(results, wall):
+    print(f"\n{GREEN}=== ACCOUNTS ==={RESET}")
+    print(f"{'account':<24} {'status':<8} {'time, s':>8} {'requests':>9} {'throttled':>9}  log")
+    for r in results:
+        api = (r['report'] or {}).get('api') or {}
+        print(f"{r['name']:<24} {r['status']:<8} {r['duration']:>8.1f} {api.get('requests', '-'):>9} {api.get('throttled', '-'):>9}  {r['log']}")
+        if r['error']:
+            print(f"  {RED}{r['error']}{RESET}")
+    failed = [r for r in results if r['status'] != 'ok']
+    total = sum(r['duration'] for r in results)
+    print(f"Аккаунтов: {len(results)}, с ошибками: {len(failed)}; "
+          f"время {wall:.1f} с (последовательно было бы ~{total:.1f} с)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Netbird: синхронизация нескольких аккаунтов параллельно')
+    parser.add_argument('manifest', help='yaml-манифест аккаунтов')
+    parser.add_argument('--jobs', type=int, default=8, help='Сколько аккаунтов синхронизировать одновременно')
+    parser.add_argument('--tag', type=str, default=None, help='Тег этапа для всех аккаунтов (см. netbird_configurator.py --tag)')
+    parser.add_argument('--plan', action='store_true', help='Только показать изменения')
+    parser.add_argument('--account', action='append', default=None, metavar='NAME', help='Синхронизировать только указанные аккаунты; можно указать несколько раз')
+    parser.add_argument('--logs', type=str, default='logs', help='Каталог для логов и отчётов аккаунтов')
+    parser.add_argument('--timeout', type=float, default=None, help='Ограничение времени на аккаунт, с')
+    parser.add_argument('--json', type=str, default=None, metavar='FILE', help='Записать сводный отчёт в JSON')
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    try:
+        accounts = load_manifest(args.manifest)
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"{RED}Манифест {args.manifest}: {e}{RESET}")
+        sys.exit(1)
+    if args.account:
+        unknown = set(args.account) - {a['name'] for a in accounts}
+        if unknown:
+            print(f"{RED}Нет в манифесте: {', '.join(sorted(unknown))}{RESET}")
+            sys.exit(1)
+        accounts = [a for a in accounts if a['name'] in args.account]
+    common_args = (['--tag', args.tag] if args.tag else []) + (['--plan'] if args.plan else [])
+
+    started = time.perf_counter()
+    results = run_accounts(accounts, common_args, os.path.abspath(args.logs), args.jobs, args.timeout)
+    wall = time.perf_counter() - started
+    print_summary(results, wall)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'wall': round(wall, 3), 'accounts': results}, f, ensure_ascii=False, indent=2)
+    if any(r['status'] != 'ok' for r in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
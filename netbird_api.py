@@ -0,0 +1,679 @@
+# netbird_api.py
+#
+# This module is the HTTP layer for the Netbird API.
+# It holds the connection settings (read from .env on first use, not on import),
+# a shared keep-alive session and the request helper used by the configurator.
+# Concurrent identical GETs share one in-flight request and its parsed result, which stays
+# fresh for a short window (NETBIRD_GET_FRESHNESS); optionally GET results are kept warm
+# until invalidated. Any write drops the cached lists it may have changed.
+# Concurrency is adaptive (AIMD): the in-flight limit grows while responses are fast and
+# healthy and is halved on 429/503, which are retried after Retry-After.
+# Callers that need only a lookup (name -> id) ask for a compact model of a list
+# (see netbird_models) built once from the response and invalidated together with it.
+# Bodies are encoded and parsed with orjson when it is installed (stdlib json otherwise), and
+# compressed responses are requested explicitly.
+# Every applied run can be recorded to an append-only journal (writes, their status and the ids
+# of created objects, no response bodies, completed stages); a resumed run skips the completed stages,
+# reads the API again for the rest and skips confirmed writes.
+# Before the first write to an object in a run its pre-image is taken from the list already
+# fetched (no extra GET) and kept in the run file together with the ids of created objects,
+# so the run can be rolled back (see netbird_rollback).
+#
+# Usage:
+# import netbird_api as api
+# api.configure()
+# resp = api.request('GET', '/api/groups')
+# groups = api.get_model('/api/groups')     # NameIndex: name -> id
+#
+# Version: 1.0.1
+#
+
+import os
+import re
+import json
+import time
+import threading
+
+import netbird_models
+
+YELLOW = '\033[93m'
+RESET = '\033[0m'
+
+API_URL = None
+HEADERS = {}
+DEBUG = False
+DRY_RUN = False
+MAX_WORKERS = 16
+MAX_RETRIES = 5
+CACHE = False
+FRESHNESS = 2.0
+RUNS_DIR = '.netbird-runs'
+RUN_ID = None
+# Списки, в которые конфигуратор не пишет: для снимков их хранить не нужно
+PREIMAGE_SKIP = ('/api/peers',)
+RUN_FILE_RE = re.compile(r'^\d{8}-\d{6}-[0-9a-f]{4}\.jsonl$')
+
+JSON_CODEC = 'json'
+
+_configured = False
+_session = None
+_loads = json.loads
+_dumps = None
+_planned = 0
+_cache = {}
+_models = {}
+_cache_lock = threading.Lock()
+_inflight = {}
+_get_stats = {'fetched': 0, 'coalesced': 0, 'fresh': 0, 'bytes': 0}
+_limiter = None
+_journal = None
+_journal_lock = threading.Lock()
+_journal_ops = 0
+_confirmed = {}
+_completed_stages = set()
+_run_path = None
+_run = None
+_run_lock = threading.Lock()
+_fetched = {}
+_fetched_index = {}
+_captured = set()
+
+
+def configure(api_url=None, api_token=None, dry_run=None):
+    # Настройки берутся из аргументов, затем из окружения и .env
+    global API_URL, HEADERS, DEBUG, DRY_RUN, MAX_WORKERS, FRESHNESS, _configured, _session, _limiter
+    from dotenv import load_dotenv
+    load_dotenv()
+    API_URL = api_url or os.getenv('NETBIRD_API_URL')
+    HEADERS = {
+        'Authorization': f"Bearer {api_token or os.getenv('NETBIRD_API_TOKEN')}",
+        'Content-Type': 'application/json',
+    }
+    DEBUG = os.getenv('DEBUG', 'false').lower() == 'true'
+    MAX_WORKERS = int(os.getenv('NETBIRD_MAX_WORKERS', '16'))
+    FRESHNESS = float(os.getenv('NETBIRD_GET_FRESHNESS', '2'))
+    if dry_run is not None:
+        DRY_RUN = dry_run
+    _session = None
+    _limiter = ConcurrencyLimiter(MAX_WORKERS)
+    load_codec()
+    _configured = True
+
+
+def stdlib_dumps(obj):
+    return json.dumps(obj).encode()
+
+
+def load_codec():
+    # orjson — необязательная зависимость: быстрее stdlib json при разборе больших списков (peers)
+    global JSON_CODEC, _loads, _dumps
+    try:
+        import orjson
+    except ImportError:
+        JSON_CODEC, _loads, _dumps = 'json', json.loads, stdlib_dumps
+        return
+
+    def orjson_dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    JSON_CODEC, _loads, _dumps = 'orjson', orjson.loads, orjson_dumps
+
+
+def loads(data):
+    return _loads(data)
+
+
+def dumps(obj):
+    if _dumps is None:
+        load_codec()
+    return _dumps(obj)
+
+
+def ensure_configured():
+    if not _configured:
+        configure()
+
+
+def session():
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util import make_headers
+        _session = requests.Session()
+        # Только кодировки, которые urllib3 умеет распаковать (br/zstd — при установленных brotli/zstandard)
+        _session.headers['Accept-Encoding'] = make_headers(accept_encoding=True)['accept-encoding']
+        adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+    return _session
+
+
+def print_debug_request(method, url, headers, body=None):
+    if not DEBUG:
+        return
+    headers_to_print = dict(headers)
+    if 'Authorization' in headers_to_print:
+        headers_to_print['Authorization'] = 'Bearer ******'
+    print(f"{YELLOW}[DEBUG] {method} {url}{RESET}")
+    print(f"{YELLOW}[DEBUG] headers: {headers_to_print}{RESET}")
+    if body is not None:
+        print(f"{YELLOW}[DEBUG] body: {body}{RESET}")
+
+
+class StoredResponse:
+    # Ответ, не требующий обращения к API: результат из кэша или запланированное изменение (plan)
+    def __init__(self, body, status_code=200, text=''):
+        self._body = body
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        pass
+
+
+def planned_response(method, path, body):
+    global _planned
+    print(f"{YELLOW}[PLAN] {method} {path}{RESET}")
+    if method == 'POST':
+        _planned += 1
+        return StoredResponse(dict(body or {}, id=f"planned-{_planned}"))
+    if method == 'PUT':
+        return StoredResponse(dict(body or {}, id=path.rsplit('/', 1)[-1]))
+    return StoredResponse({})
+
+
+def enable_cache(enabled=True):
+    global CACHE
+    CACHE = enabled
+    clear_cache()
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+        _models.clear()
+
+
+def expired(stored_at):
+    return not CACHE and time.monotonic() - stored_at > FRESHNESS
+
+
+def evict_expired():
+    # Устаревшие списки не держим в памяти до следующего запроса того же пути (вызывать под _cache_lock)
+    for key in [k for k, (_, stored_at) in _cache.items() if expired(stored_at)]:
+        del _cache[key]
+    for key in [k for k, (_, stored_at) in _models.items() if expired(stored_at)]:
+        del _models[key]
+
+
+def cached_response(path):
+    # Без постоянного кэша результат GET действителен FRESHNESS секунд
+    with _cache_lock:
+        entry = _cache.get(path)
+    if entry is None:
+        return None
+    resp, stored_at = entry
+    if expired(stored_at):
+        return None
+    return resp
+
+
+def get_model(path, build=netbird_models.NameIndex):
+    # Компактная модель списка (build(objs)): строится один раз и живёт столько же, сколько ответ GET.
+    # Разные модели одного списка строятся из одного ответа.
+    key = (path, build)
+    with _cache_lock:
+        entry = _models.get(key)
+    if entry is not None and not expired(entry[1]):
+        return entry[0]
+    resp = request('GET', path)
+    resp.raise_for_status()
+    model = build(resp.json())
+    with _cache_lock:
+        cached = _cache.get(path)
+        # Модель сохраняется, только если ответ не был сброшен записью, пока она строилась
+        if cached is not None and cached[0] is resp:
+            evict_expired()
+            _models[key] = (model, cached[1])
+    return model
+
+
+def invalidate(path):
+    # Запись по пути сбрасывает кэш этого пути, его коллекций-родителей и вложенных списков:
+    # PUT /api/networks/1/resources/2 сбрасывает /api/networks/1/resources и /api/networks.
+    # Выполняющиеся GET по этим путям могли прочитать состояние до записи: к ним больше не присоединяются.
+    with _cache_lock:
+        for key in [k for k in _cache if path.startswith(k) or k.startswith(path)]:
+            del _cache[key]
+        for key in [k for k in _models if path.startswith(k[0]) or k[0].startswith(path)]:
+            del _models[key]
+        for key, flight in _inflight.items():
+            if path.startswith(key) or key.startswith(path):
+                flight.stale = True
+
+
+class Flight:
+    # Выполняющийся GET, результат которого получают все параллельные запросы того же пути
+    def __init__(self):
+        self.done = threading.Event()
+        self.resp = None
+        self.error = None
+        self.stale = False
+
+
+def fetch_shared(path):
+    with _cache_lock:
+        flight = _inflight.get(path)
+        leader = flight is None or flight.stale
+        if leader:
+            flight = Flight()
+            _inflight[path] = flight
+            _get_stats['fetched'] += 1
+        else:
+            _get_stats['coalesced'] += 1
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.resp
+    try:
+        resp = send('GET', f"{API_URL}{path}")
+        if resp.status_code == 200:
+            with _cache_lock:
+                _get_stats['bytes'] += int(resp.headers.get('Content-Length') or len(resp.content))
+            # Результат общий для всех вызовов: объекты нельзя изменять на месте
+            resp = StoredResponse(loads(resp.content), resp.status_code)
+            if _run_path is not None:
+                remember_list(path, resp.json())
+        flight.resp = resp
+        return resp
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _cache_lock:
+            if _inflight.get(path) is flight:
+                del _inflight[path]
+            # Под той же блокировкой, что и invalidate: запись не может вклиниться между проверкой и сохранением
+            if flight.resp is not None and flight.resp.status_code == 200 and not flight.stale:
+                evict_expired()
+                _cache[path] = (flight.resp, time.monotonic())
+        flight.done.set()
+
+
+def journal_key(method, path, body):
+    return method, path, json.dumps(body, sort_keys=True)
+
+
+def write_journal(entry):
+    global _journal_ops
+    with _journal_lock:
+        if 'op' in entry and entry['op'] is None:
+            _journal_ops += 1
+            entry['op'] = _journal_ops
+        _journal.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        _journal.flush()
+        return entry.get('op')
+
+
+def read_journal(path):
+    entries = []
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # Последняя строка могла остаться недописанной при аварийном завершении
+                break
+    return entries
+
+
+def replay_journal(entries):
+    # Восстанавливает набор подтверждённых записей. Ответы GET в журнал не пишутся (в них данные аккаунта):
+    # продолженный запуск заново читает состояние API, в котором уже видны применённые изменения
+    global _journal_ops
+    pending = {}
+    for entry in entries:
+        kind = entry.get('kind')
+        if kind == 'write':
+            pending[entry['op']] = entry
+            _journal_ops = max(_journal_ops, entry['op'])
+        elif kind == 'stage':
+            _completed_stages.add(entry['stage'])
+        elif kind == 'result':
+            write = pending.pop(entry['op'], None)
+            if write is None:
+                continue
+            invalidate(write['path'])
+            if entry['status'] < 400:
+                response = StoredResponse({'id': entry['id']} if entry.get('id') else None, entry['status'])
+                keys = [journal_key(write['method'], write['path'], write.get('body'))]
+                if write['method'] == 'POST' and entry.get('id'):
+                    # Созданный объект при повторном запуске уже существует и обновляется тем же телом
+                    keys.append(journal_key('PUT', f"{write['path']}/{entry['id']}", write.get('body')))
+                for key in keys:
+                    _confirmed.setdefault(key, []).append(response)
+    # Запросы без результата могли как примениться, так и нет: их списки будут перечитаны
+    for write in pending.values():
+        invalidate(write['path'])
+    return sum(1 for entry in entries if entry.get('kind') == 'result' and entry['status'] < 400)
+
+
+def open_journal(path, resume=False):
+    # Возвращает число подтверждённых изменений, которые будут пропущены
+    global _journal, _journal_ops
+    _confirmed.clear()
+    _completed_stages.clear()
+    _journal_ops = 0
+    confirmed = 0
+    entries = read_journal(path) if resume and os.path.exists(path) else []
+    if entries and entries[-1].get('kind') != 'complete':
+        confirmed = replay_journal(entries)
+        _journal = open(path, 'a')
+    else:
+        _journal = open(path, 'w')
+    write_journal({'kind': 'start', 'time': time.time(), 'resume': bool(confirmed)})
+    return confirmed
+
+
+def close_journal(complete=True):
+    global _journal
+    if _journal is None:
+        return
+    if complete:
+        write_journal({'kind': 'complete', 'time': time.time()})
+    _journal.close()
+    _journal = None
+
+
+def complete_stage(name):
+    # Этап выполнен целиком: продолженный запуск его пропускает
+    if _journal is not None:
+        write_journal({'kind': 'stage', 'stage': name, 'time': time.time()})
+
+
+def stage_completed(name):
+    return name in _completed_stages
+
+
+def take_confirmed(method, path, body):
+    if not _confirmed:
+        return None
+    key = journal_key(method, path, body)
+    with _journal_lock:
+        responses = _confirmed.get(key)
+        if not responses:
+            return None
+        resp = responses.pop(0)
+        if not responses:
+            del _confirmed[key]
+    return resp
+
+
+def run_file(runs_dir, run_id):
+    return os.path.join(runs_dir, f"{run_id}.jsonl")
+
+
+def list_runs(runs_dir=RUNS_DIR):
+    # id запусков по времени начала (id начинается с времени)
+    if not os.path.isdir(runs_dir):
+        return []
+    return sorted(f[:-len('.jsonl')] for f in os.listdir(runs_dir) if RUN_FILE_RE.match(f))
+
+
+def open_run(runs_dir=RUNS_DIR, resume=False):
+    # Начинает запуск со снимками изменяемых объектов; при resume продолжает последний незавершённый.
+    # Файл запуска создаётся при первой записи: запуски без изменений следов не оставляют
+    global _run_path, _run, RUN_ID
+    close_run(complete=False)
+    _fetched.clear()
+    _fetched_index.clear()
+    _captured.clear()
+    runs = list_runs(runs_dir)
+    previous = read_journal(run_file(runs_dir, runs[-1])) if resume and runs else []
+    if previous and previous[-1].get('kind') != 'complete':
+        RUN_ID = runs[-1]
+        _captured.update(entry['path'] for entry in previous if entry.get('kind') in ('preimage', 'created'))
+    else:
+        RUN_ID = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.urandom(2).hex()}"
+    _run_path = run_file(runs_dir, RUN_ID)
+    return RUN_ID
+
+
+def close_run(complete=True):
+    global _run_path, _run
+    with _run_lock:
+        # Продолжённый запуск без новых записей тоже помечается завершённым
+        if _run is None and complete and _run_path is not None and os.path.exists(_run_path):
+            _run = open(_run_path, 'a')
+        if _run is not None:
+            if complete:
+                _run.write(json.dumps({'kind': 'complete', 'time': time.time()}) + '\n')
+            _run.close()
+        touched = _run is not None
+        _run_path = _run = None
+        _fetched.clear()
+        _fetched_index.clear()
+        _captured.clear()
+    return touched
+
+
+def write_run(entry):
+    global _run
+    with _run_lock:
+        if _run_path is None:
+            return
+        if _run is None:
+            os.makedirs(os.path.dirname(_run_path) or '.', exist_ok=True)
+            resumed = os.path.exists(_run_path)
+            _run = open(_run_path, 'a')
+            if not resumed:
+                _run.write(json.dumps({'kind': 'start', 'run_id': RUN_ID, 'time': time.time()}) + '\n')
+        _run.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+        _run.flush()
+
+
+def remember_list(path, objs):
+    # Полученный в запуске список — источник снимков, даже если он уже вытеснен из кэша
+    if isinstance(objs, list) and not path.startswith(PREIMAGE_SKIP):
+        with _run_lock:
+            _fetched[path] = objs
+
+
+def find_preimage(path):
+    # Объект /api/<список>/<id> из уже полученного списка: сначала действующий кэш, затем списки запуска
+    collection, _, obj_id = path.rpartition('/')
+    with _cache_lock:
+        entry = _cache.get(collection)
+    objs = entry[0].json() if entry is not None else None
+    with _run_lock:
+        if not isinstance(objs, list):
+            objs = _fetched.get(collection)
+        if objs is None:
+            return None
+        index = _fetched_index.get(collection)
+        if index is None or index[0] is not objs:
+            index = (objs, {o.get('id'): o for o in objs if isinstance(o, dict)})
+            _fetched_index[collection] = index
+    return index[1].get(obj_id)
+
+
+def capture_preimage(method, path):
+    # Снимок берётся один раз — до первой записи в объект в этом запуске
+    with _run_lock:
+        first = path not in _captured
+        _captured.add(path)
+    if first:
+        write_run({'kind': 'preimage', 'method': method, 'path': path, 'object': find_preimage(path)})
+
+
+def record_deleted(paths):
+    # Удаление подтверждается только после успешного ответа: откат пересоздаёт лишь действительно удалённые
+    if _run_path is None:
+        return
+    for path in paths:
+        write_run({'kind': 'deleted', 'path': path})
+
+
+def run_active():
+    return _run_path is not None
+
+
+def capture_cascade(paths):
+    # Объекты, которые API удаляет вместе с родителем (ресурсы и роутеры сети): снимок каждого записывается
+    # до удаления родителя, чтобы откат пересоздал их под новым id родителя
+    if _run_path is None:
+        return
+    for path in paths:
+        capture_preimage('DELETE', path)
+
+
+def record_created(path, body):
+    if isinstance(body, dict) and body.get('id'):
+        created = f"{path}/{body['id']}"
+        with _run_lock:
+            _captured.add(created)
+        write_run({'kind': 'created', 'path': created})
+
+
+def response_body(resp):
+    try:
+        return loads(resp.content)
+    except ValueError:
+        return None
+
+
+class ConcurrencyLimiter:
+    # AIMD-ограничение числа одновременных запросов: +1 за каждые limit быстрых успешных ответов,
+    # уменьшение вдвое на 429/503. Ответ считается быстрым, пока задержка не превышает
+    # LATENCY_FACTOR * минимальную наблюдаемую (рост задержки — признак очереди на сервере).
+    LATENCY_FACTOR = 2.0
+    THROTTLE_STATUSES = (429, 503)
+
+    def __init__(self, maximum, initial=4, minimum=1):
+        self.maximum = max(maximum, minimum)
+        self.minimum = minimum
+        self.limit = float(min(initial, self.maximum))
+        self.in_flight = 0
+        self.base_latency = None
+        self.latency_avg = None
+        self.requests = 0
+        self.throttled = 0
+        self.retries = 0
+        self.peak_limit = self.limit
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, status, latency):
+        with self._cond:
+            self.in_flight -= 1
+            self.requests += 1
+            if status in self.THROTTLE_STATUSES:
+                self.throttled += 1
+                self.limit = max(self.minimum, self.limit / 2)
+            else:
+                self.base_latency = latency if self.base_latency is None else min(self.base_latency, latency)
+                self.latency_avg = latency if self.latency_avg is None else 0.8 * self.latency_avg + 0.2 * latency
+                if 0 < status < 500 and latency <= self.base_latency * self.LATENCY_FACTOR:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                    self.peak_limit = max(self.peak_limit, self.limit)
+            self._cond.notify_all()
+
+    def record_retry(self):
+        with self._cond:
+            self.retries += 1
+
+    def metrics(self):
+        with self._cond:
+            return {
+                'limit': int(self.limit),
+                'peak_limit': int(self.peak_limit),
+                'max_limit': self.maximum,
+                'in_flight': self.in_flight,
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'retries': self.retries,
+                'latency_ms': round((self.latency_avg or 0) * 1000, 1),
+            }
+
+
+def metrics():
+    result = _limiter.metrics() if _limiter else {}
+    with _cache_lock:
+        result['gets'] = dict(_get_stats)
+    return result
+
+
+def retry_delay(resp, attempt):
+    try:
+        return float(resp.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return min(0.5 * 2 ** attempt, 30)
+
+
+def send(method, url, body=None):
+    # Единственная точка сетевого обмена (её оборачивает профилировщик)
+    for attempt in range(MAX_RETRIES + 1):
+        _limiter.acquire()
+        start = time.perf_counter()
+        status = 0
+        try:
+            data = dumps(body) if body is not None else None
+            resp = session().request(method, url, headers=HEADERS, data=data)
+            status = resp.status_code
+        finally:
+            _limiter.release(status, time.perf_counter() - start)
+        if status not in ConcurrencyLimiter.THROTTLE_STATUSES or attempt == MAX_RETRIES:
+            return resp
+        _limiter.record_retry()
+        time.sleep(retry_delay(resp, attempt))
+
+
+def request(method, path, body=None):
+    ensure_configured()
+    if method == 'GET':
+        cached = cached_response(path)
+        if cached is not None:
+            with _cache_lock:
+                _get_stats['fresh'] += 1
+            return cached
+    if DRY_RUN:
+        if method != 'GET':
+            return planned_response(method, path, body)
+        if '/planned-' in path:
+            # Объект будет создан при применении: на удалённой стороне у него ещё ничего нет
+            return StoredResponse([])
+    if method == 'GET':
+        return fetch_shared(path)
+    url = f"{API_URL}{path}"
+    confirmed = take_confirmed(method, path, body)
+    if confirmed is not None:
+        print(f"{YELLOW}[RESUME] {method} {path} уже применён{RESET}")
+        return confirmed
+    print_debug_request(method, url, HEADERS, body)
+    if _run_path is not None and method in ('PUT', 'DELETE'):
+        capture_preimage(method, path)
+    op = None
+    if _journal is not None:
+        op = write_journal({'kind': 'write', 'op': None, 'method': method, 'path': path, 'body': body})
+    resp = send(method, url, body)
+    invalidate(path)
+    result = response_body(resp) if op is not None or (_run_path is not None and method == 'POST') else None
+    if op is not None:
+        # Из ответа сохраняется только id: по нему продолженный запуск сопоставляет созданные объекты
+        obj_id = result.get('id') if isinstance(result, dict) else None
+        write_journal({'kind': 'result', 'op': op, 'status': resp.status_code, 'id': obj_id})
+    if _run_path is not None and method == 'POST' and resp.status_code < 400:
+        record_created(path, result)
+    if method == 'DELETE' and 200 <= resp.status_code < 300:
+        record_deleted([path])
+    return resp
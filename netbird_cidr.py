@@ -0,0 +1,136 @@
+# netbird_cidr.py
+#
+# This module is used to index the CIDR addresses of Netbird resources.
+# It keeps a sorted interval list per IP version with parent links (CIDR prefixes either
+# nest or do not intersect), so duplicates and shadowed prefixes are found in O(n log n)
+# and "which resource covers IP X" is answered with a binary search.
+#
+# Usage:
+# from netbird_cidr import resource_cidr_index
+#
+# Version: 1.0.1
+#
+
+import bisect
+import ipaddress
+
+from netbird_config import iter_items, network_name
+
+
+def parse_network(address):
+    try:
+        return ipaddress.ip_network(str(address).strip(), strict=False)
+    except ValueError:
+        return None
+
+
+class CidrIndex:
+    # Для каждой версии IP: узлы (уникальные префиксы), отсортированные по (начало, -конец).
+    # У каждого узла есть ссылка на ближайший охватывающий префикс (parent).
+
+    def __init__(self, entries):
+        # entries: итерируемое (address, payload); адреса, не являющиеся IP/CIDR (домены), пропускаются
+        self.skipped = []
+        buckets = {4: {}, 6: {}}
+        for address, payload in entries:
+            net = parse_network(address)
+            if net is None:
+                self.skipped.append((address, payload))
+                continue
+            buckets[net.version].setdefault(net, []).append(payload)
+        self._tables = {version: self._build(nets) for version, nets in buckets.items()}
+
+    @staticmethod
+    def _build(nets):
+        order = sorted(nets, key=lambda n: (int(n.network_address), -int(n.broadcast_address)))
+        starts, ends, parents, stack = [], [], [], []
+        for idx, net in enumerate(order):
+            start, end = int(net.network_address), int(net.broadcast_address)
+            while stack and ends[stack[-1]] < start:
+                stack.pop()
+            parents.append(stack[-1] if stack else -1)
+            starts.append(start)
+            ends.append(end)
+            stack.append(idx)
+        return {
+            'nets': order,
+            'payloads': [nets[n] for n in order],
+            'starts': starts,
+            'ends': ends,
+            'parents': parents,
+        }
+
+    def _find(self, net):
+        # Самый специфичный узел, целиком охватывающий net
+        table = self._tables[net.version]
+        start, end = int(net.network_address), int(net.broadcast_address)
+        idx = bisect.bisect_right(table['starts'], start) - 1
+        while idx >= 0 and table['ends'][idx] < end:
+            idx = table['parents'][idx]
+        return table, idx
+
+    def covering(self, address):
+        # Все префиксы, охватывающие адрес, от самого специфичного к самому общему
+        net = parse_network(address)
+        if net is None:
+            return []
+        table, idx = self._find(net)
+        result = []
+        while idx >= 0:
+            result.append((table['nets'][idx], table['payloads'][idx]))
+            idx = table['parents'][idx]
+        return result
+
+    def lookup(self, address):
+        # Объекты самого специфичного префикса, охватывающего адрес
+        found = self.covering(address)
+        return found[0][1] if found else []
+
+    def duplicates(self):
+        result = []
+        for table in self._tables.values():
+            for net, payloads in zip(table['nets'], table['payloads']):
+                if len(payloads) > 1:
+                    result.append((net, payloads))
+        return result
+
+    def contained(self):
+        # (вложенный префикс, его объекты, ближайший охватывающий префикс, его объекты)
+        result = []
+        for table in self._tables.values():
+            for idx, parent in enumerate(table['parents']):
+                if parent >= 0:
+                    result.append((table['nets'][idx], table['payloads'][idx], table['nets'][parent], table['payloads'][parent]))
+        return result
+
+    def __len__(self):
+        return sum(len(table['nets']) for table in self._tables.values())
+
+
+def resource_cidr_index(tree):
+    # Индекс по address ресурсов (у роутеров сетей адресов нет: сеть роутера — имя файла)
+    def entries():
+        for fname, idx, r in iter_items(tree, 'resources'):
+            if r.get('address'):
+                yield r['address'], {'kind': 'resource', 'name': r.get('name'), 'network': network_name(fname), 'file': fname}
+    return CidrIndex(entries())
+
+
+def describe(payload):
+    return f"{payload['kind']} '{payload['name']}' (сеть {payload['network']})"
+
+
+def find_address_problems(index):
+    # Дубликаты адресов и префиксы, перекрытые префиксами из других сетей
+    problems = []
+    for net, payloads in index.duplicates():
+        problems.append(f"Дубликат адреса {net}: " + ', '.join(describe(p) for p in payloads))
+    for inner, inner_payloads, outer, outer_payloads in index.contained():
+        inner_networks = {p['network'] for p in inner_payloads}
+        outer_networks = {p['network'] for p in outer_payloads}
+        if inner_networks - outer_networks or outer_networks - inner_networks:
+            problems.append(
+                f"Адрес {inner} ({', '.join(describe(p) for p in inner_payloads)}) перекрыт "
+                f"{outer} ({', '.join(describe(p) for p in outer_payloads)})"
+            )
+    return problems
@@ -0,0 +1,109 @@
+# netbird_config.py
+#
+# This module is used to load the Netbird configuration tree from the local directory.
+# It reads groups, users, dns, networks, resources, routes and policy yaml-files into memory,
+# so the linter, the access engine and other tools share one parser.
+# Long-running processes can enable a parse cache keyed by file mtime and size, so only
+# changed files are parsed again.
+#
+# Usage:
+# from netbird_config import load_config_tree, iter_items
+#
+# Version: 1.0.1
+#
+
+import os
+import copy
+import yaml
+
+CONFIG_DIRS = ['groups', 'users', 'dns', 'networks', 'resources', 'routes', 'policy']
+
+FILE_CACHE = False
+_file_cache = {}
+
+
+def enable_file_cache(enabled=True):
+    global FILE_CACHE
+    FILE_CACHE = enabled
+    _file_cache.clear()
+
+
+def is_yaml_file(fname):
+    return fname.endswith('.yaml') or fname.endswith('.yml')
+
+
+def network_name(fname):
+    # Название файла в resources\routes соответствует названию сети
+    return fname.rsplit('.', 1)[0]
+
+
+def object_key(entity, obj):
+    # users сопоставляются с API по email, остальные сущности по имени
+    return obj.get('email') if entity == 'users' else obj.get('name')
+
+
+def load_yaml_file(path):
+    if not FILE_CACHE:
+        return parse_yaml_file(path)
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _file_cache.get(path)
+    if cached is None or cached[0] != key:
+        cached = (key, parse_yaml_file(path))
+        _file_cache[path] = cached
+    # Вызывающий код может изменять объекты (подставлять id вместо имён)
+    return copy.deepcopy(cached[1])
+
+
+def parse_yaml_file(path):
+    with open(path, 'r') as f:
+        return parse_yaml_docs(f)
+
+
+def parse_yaml_docs(stream):
+    # Файл может содержать объект, массив объектов или несколько документов
+    items = []
+    for doc in yaml.safe_load_all(stream):
+        if isinstance(doc, list):
+            items.extend(doc)
+        elif isinstance(doc, dict):
+            items.append(doc)
+    return items
+
+
+def load_entity_dir(entity, root='.', errors=None):
+    # errors — список для (путь, ошибка) файлов, которые не удалось прочитать; без него ошибка пробрасывается
+    files = {}
+    path = os.path.join(root, entity)
+    if not os.path.isdir(path):
+        return files
+    for fname in sorted(os.listdir(path)):
+        if is_yaml_file(fname):
+            try:
+                files[fname] = load_yaml_file(os.path.join(path, fname))
+            except (OSError, ValueError, yaml.YAMLError) as e:
+                if errors is None:
+                    raise
+                errors.append((os.path.join(entity, fname), e))
+    return files
+
+
+def load_config_tree(root='.', errors=None):
+    # {entity: {fname: [obj, ...]}}
+    return {entity: load_entity_dir(entity, root, errors) for entity in CONFIG_DIRS}
+
+
+def iter_items(tree, entity):
+    # Возвращает (fname, idx, obj) для каждого объекта сущности
+    for fname, items in tree.get(entity, {}).items():
+        for idx, obj in enumerate(items):
+            if isinstance(obj, dict):
+                yield fname, idx, obj
+
+
+def as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
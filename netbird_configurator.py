@@ -11,21 +11,19 @@
 #
 
 import os
-import requests
+import sys
 import yaml
-from dotenv import load_dotenv
 import time
+import json
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
-load_dotenv()
-
-API_URL = os.getenv('NETBIRD_API_URL')
-API_TOKEN = os.getenv('NETBIRD_API_TOKEN')
-
-HEADERS = {
-    'Authorization': f'Bearer {API_TOKEN}',
-    'Content-Type': 'application/json',
-}
+import netbird_api as api
+import netbird_config
+import netbird_models
+import netbird_policy
+import netbird_selectors
+from netbird_profile import Profiler, null_stage
 
 ENTITY_DIRS = ['groups', 'networks', 'resources', 'routes', 'policies']
 
@@ -38,32 +36,15 @@ UPDATE = f"{GREEN}✓{RESET}"
 YELLOW = '\033[93m'
 RED_MINUS = f"{RED}-{RESET}"
 
-DEBUG = os.getenv('DEBUG', 'false').lower() == 'true'
-
 def print_spinner(message, spin_idx):
-    import sys
-    waited = 0
-    spin_idx = 0
     spinner = ['|', '/', '-', '\\']
     msg = f"{YELLOW}{message} {spinner[spin_idx % len(spinner)]}{RESET}"
     print(f"\r{msg}", end='', flush=True)
 
-
-def print_debug_request(method, url, headers, body=None):
-    if not DEBUG:
-        return
-    headers_to_print = dict(headers)
-    if 'Authorization' in headers_to_print:
-        headers_to_print['Authorization'] = 'Bearer ******'
-    print(f"{YELLOW}[DEBUG] {method} {url}{RESET}")
-    print(f"{YELLOW}[DEBUG] headers: {headers_to_print}{RESET}")
-    if body is not None:
-        print(f"{YELLOW}[DEBUG] body: {body}{RESET}")
-
 def get_entity_ids_by_names(entity, names):
     if entity == 'resources':
         # Собираем id ресурсов по всем сетям
-        name_to_id = {}
+        ids = []
         if os.path.isdir('resources'):
             for fname in os.listdir('resources'):
                 if fname.endswith('.yaml') or fname.endswith('.yml'):
@@ -71,26 +52,33 @@ def get_entity_ids_by_names(entity, names):
                     network_id = get_entity_ids_by_names('networks', [network_name])
                     if not network_id:
                         continue
-                    url = f"{API_URL}/api/networks/{network_id[0]}/resources"
-                    resp = requests.get(url, headers=HEADERS)
-                    resp.raise_for_status()
-                    objs = resp.json()
-                    for o in objs:
-                        if 'name' in o and 'id' in o:
-                            name_to_id[o['name']] = o['id']
-        return [name_to_id[name] for name in names if name in name_to_id]
+                    resources = api.get_model(f"/api/networks/{network_id[0]}/resources")
+                    ids.extend((name, resources[name]) for name in names if name in resources)
+        found = dict(ids)
+        return [found[name] for name in names if name in found]
     elif entity == 'dns':
-        resp = requests.get(f"{API_URL}/api/dns/nameservers", headers=HEADERS)
-        resp.raise_for_status()
-        objs = resp.json()
-        name_to_id = {o['name']: o['id'] for o in objs}
-        return [name_to_id[name] for name in names if name in name_to_id]
+        return api.get_model("/api/dns/nameservers").resolve(names)
     else:
-        resp = requests.get(f"{API_URL}/api/{entity}", headers=HEADERS)
-        resp.raise_for_status()
-        objs = resp.json()
-        name_to_id = {o['name']: o['id'] for o in objs}
-        return [name_to_id[name] for name in names if name in name_to_id]
+        return get_name_to_id(entity).resolve(names)
+
+def get_network_resource_id(network_name, resource_name):
+    # Один GET ресурсов одной сети вместо обхода всех сетей из resources/
+    network_id = get_name_to_id('networks').get(network_name)
+    if network_id is None:
+        return None
+    return api.get_model(f"/api/networks/{network_id}/resources").get(resource_name)
+
+def get_name_to_id(entity):
+    # Компактный индекс имя -> id (NameIndex), общий для всех вызовов до первой записи
+    return api.get_model(f"/api/{entity}")
+
+def run_parallel(func, items, max_workers=None):
+    # Выполняет func для каждого элемента в пуле потоков с ограничением параллелизма
+    items = list(items)
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers or api.MAX_WORKERS, len(items))) as pool:
+        return list(pool.map(func, items))
 
 def patch_policy_group_names(policy):
     if 'rules' in policy:
@@ -109,52 +97,73 @@ def patch_policy_group_names(policy):
                     resource_name = resource_names[0]
                 else:
                     resource_name = resource_names
-                # ищем id ресурса по имени среди всех сетей
+                # ищем id ресурса только в сети, в файле которой он описан
                 resource_id, resource_type = None, None
-                for net_name in os.listdir('resources') if os.path.isdir('resources') else []:
-                    if not (net_name.endswith('.yaml') or net_name.endswith('.yml')):
-                        continue
-                    with open(os.path.join('resources', net_name), 'r') as f:
-                        configs = yaml.safe_load(f)
-                        if isinstance(configs, list):
-                            for r in configs:
-                                if r and r.get('name') == resource_name:
-                                    resource_id = get_entity_ids_by_names('resources', [resource_name])
-                                    resource_type = r.get('type', 'subnet')
-                                    break
-                        elif isinstance(configs, dict) and configs.get('name') == resource_name:
-                            resource_id = get_entity_ids_by_names('resources', [resource_name])
-                            resource_type = configs.get('type', 'subnet')
+                for fname, configs in netbird_config.load_entity_dir('resources').items():
+                    for r in configs:
+                        if isinstance(r, dict) and r.get('name') == resource_name:
+                            resource_id = get_network_resource_id(netbird_config.network_name(fname), resource_name)
+                            resource_type = r.get('type', 'subnet')
+                            break
                     if resource_id:
                         break
                 if resource_id:
-                    rule['destinationResource'] = {'id': resource_id[0], 'type': resource_type or 'subnet'}
+                    rule['destinationResource'] = {'id': resource_id, 'type': resource_type or 'subnet'}
                     rule['destinations'] = None
     return policy
 
+def expand_peer_selectors(configs):
+    # peers_match всех групп раскрывается по инвентарю пиров API за один проход; найденные пиры
+    # добавляются к явному списку peers и дальше сравниваются и применяются как обычный состав группы
+    selectors = netbird_selectors.group_selectors(configs.values())
+    if not selectors:
+        return configs
+    expanded = netbird_selectors.SelectorSet(selectors).expand(api.get_model("/api/peers", netbird_models.Inventory))
+    result = {}
+    for name, config in configs.items():
+        if name in expanded:
+            config = {k: v for k, v in config.items() if k != 'peers_match'}
+            config['peers'] = list(dict.fromkeys(netbird_config.as_list(config.get('peers')) + expanded[name]))
+        result[name] = config
+    return result
+
+def group_unchanged(name, config):
+    # Группа без других полей, состав которой совпадает с удалённым, не отправляется
+    if set(config) - {'name', 'peers'}:
+        return False
+    desired = frozenset(get_entity_ids_by_names('peers', config.get('peers') or []))
+    return api.get_model("/api/groups", netbird_models.MemberIndex).get(name) == desired
+
 def patch_group_peer_names(group):
     if 'peers' in group:
         group['peers'] = get_entity_ids_by_names('peers', group['peers'])
     return group
 
+def response_object(resp):
+    # Созданный/обновлённый объект из ответа API (если он есть)
+    try:
+        obj = resp.json()
+    except ValueError:
+        return None
+    return obj if isinstance(obj, dict) and obj.get('id') else None
+
 def create_entity(entity, config):
     if entity == 'groups':
         config = patch_group_peer_names(config)
     if entity == 'policies':
         config = patch_policy_group_names(config)
-        url = f"{API_URL}/api/policies"
+        url = "/api/policies"
     elif entity == 'dns/nameservers':
-        url = f"{API_URL}/api/dns/nameservers"
+        url = "/api/dns/nameservers"
     else:
-        url = f"{API_URL}/api/{entity}"
-    print_debug_request('POST', url, HEADERS, config)
-    resp = requests.post(url, headers=HEADERS, json=config)
+        url = f"/api/{entity}"
+    resp = api.request('POST', url, config)
     if resp.status_code not in (200, 201):
         print(f"{DELETE} Ошибка создания {entity}: {resp.status_code} {resp.text}")
         return False
     else:
         print(f"{CREATE} {entity} создан: {config.get('name', config.get('id', ''))}")
-        return True
+        return response_object(resp) or True
 
 def update_entity(entity, entity_id, config):
     if entity == 'groups':
@@ -162,25 +171,23 @@ def update_entity(entity, entity_id, config):
     if entity == 'policies':
         config = patch_policy_group_names(config)
     if entity == 'dns/nameservers':
-        url = f"{API_URL}/api/dns/nameservers/{entity_id}"
+        url = f"/api/dns/nameservers/{entity_id}"
     else:
-        url = f"{API_URL}/api/{entity}/{entity_id}"
-    print_debug_request('PUT', url, HEADERS, config)
-    resp = requests.put(url, headers=HEADERS, json=config)
+        url = f"/api/{entity}/{entity_id}"
+    resp = api.request('PUT', url, config)
     if resp.status_code not in (200, 201):
         print(f"{DELETE} Ошибка обновления {entity}: {resp.status_code} {resp.text}")
         return False
     else:
         print(f"{UPDATE} {entity} обновлён: {config.get('name', config.get('id', ''))}")
-        return True
+        return response_object(resp) or True
 
 def delete_entity(entity, entity_id, name):
     if entity == 'dns/nameservers':
-        url = f"{API_URL}/api/dns/nameservers/{entity_id}"
+        url = f"/api/dns/nameservers/{entity_id}"
     else:
-        url = f"{API_URL}/api/{entity}/{entity_id}"
-    print_debug_request('DELETE', url, HEADERS)
-    resp = requests.delete(url, headers=HEADERS)
+        url = f"/api/{entity}/{entity_id}"
+    resp = api.request('DELETE', url)
     if resp.status_code != 200:
         print(f"{DELETE} Ошибка удаления {entity} {name}: {resp.status_code} {resp.text}")
         return False
@@ -188,52 +195,101 @@ def delete_entity(entity, entity_id, name):
         print(f"{RED_MINUS} {entity} удалён: {name}")
         return True
 
-def sync_entity_dir(entity):
+# Сущность в --only: group:u-devops, policy:zabbix-to-ALL, resource:c-home-vlan15 ...
+SELECTOR_ENTITIES = {
+    'group': 'groups', 'user': 'users', 'dns': 'dns', 'network': 'networks',
+    'resource': 'resources', 'route': 'routes', 'policy': 'policy',
+}
+
+class Selection:
+    # Ограничение синхронизации: файлы целиком (files) и отдельные объекты (objects).
+    # deletes — удалять ли объекты выбранных типов, которых нет в локальных файлах: при изменении
+    # файла (демон) объект мог быть из него удалён, при точечной синхронизации (--only) удалений нет.
+    def __init__(self, files=None, objects=None, deletes=True):
+        self.files = files or {}      # {entity: {fname, ...}}
+        self.objects = objects or {}  # {entity: {(fname, name), ...}}
+        self.deletes = deletes
+
+    def includes(self, entity, fname, name=None):
+        return fname in self.files.get(entity, ()) or (fname, name) in self.objects.get(entity, ())
+
+    def fnames(self, entity):
+        return set(self.files.get(entity, ())) | {fname for fname, name in self.objects.get(entity, ())}
+
+    def includes_network_object(self, entity, network, name):
+        # resources\routes: файл определяется по имени сети
+        return any(netbird_config.network_name(fname) == network and self.includes(entity, fname, name) for fname in self.fnames(entity))
+
+    def entities(self):
+        return {entity for entity in netbird_config.CONFIG_DIRS if self.fnames(entity)}
+
+def parse_selection(values):
+    # --only <entity>/<file>.yaml или --only <entity>:<name>; объекты ищутся в локальных файлах
+    selection = Selection(deletes=False)
+    for value in values:
+        if ':' in value and '/' not in value.split(':', 1)[0]:
+            kind, name = value.split(':', 1)
+            entity = SELECTOR_ENTITIES.get(kind, kind if kind in netbird_config.CONFIG_DIRS else None)
+            if entity is None:
+                raise ValueError(f"неизвестный тип объекта: {kind}")
+            found = [(fname, netbird_config.object_key(entity, obj)) for fname, items in netbird_config.load_entity_dir(entity).items()
+                     for obj in items if isinstance(obj, dict) and name in (obj.get('name'), netbird_config.object_key(entity, obj))]
+            if not found:
+                raise ValueError(f"объект {value} не найден в {entity}/")
+            for fname, obj_name in found:
+                selection.objects.setdefault(entity, set()).add((fname, obj_name))
+        else:
+            entity, _, fname = value.strip('/').partition('/')
+            if entity not in netbird_config.CONFIG_DIRS or not os.path.isfile(os.path.join(entity, fname)):
+                raise ValueError(f"файл не найден: {value}")
+            selection.files.setdefault(entity, set()).add(fname)
+    return selection
+
+def selected(only, entity, fname, name=None):
+    # only: Selection — синхронизировать только выбранные файлы и объекты (None — всё)
+    return only is None or only.includes(entity, fname, name)
+
+def deletes_enabled(only):
+    # Набор на удаление всегда считается по всем локальным файлам
+    return only is None or only.deletes
+
+def sync_entity_dir(entity, only=None, compiled=None):
+    # compiled — {имя: объект}, заменяющие локальные (скомпилированные политики, см. netbird_policy)
     api_entity = 'policies' if entity == 'policy' else entity
     if entity not in ['groups', 'policy', 'users', 'dns']:
         process_entity_dir(entity)
         return
-    stats = {'created': 0, 'updated': 0, 'deleted': 0, 'errors': 0}
+    stats = {'created': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0, 'errors': 0}
     print(f"\n=== {entity.upper()} ===")
     if entity == 'users':
         # users: каждый файл — массив пользователей, ключ — email
         if not os.path.isdir('users'):
             return
-        for fname in os.listdir('users'):
-            if fname.endswith('.yaml') or fname.endswith('.yml'):
-                with open(os.path.join('users', fname), 'r') as f:
-                    configs = yaml.safe_load(f)
-                    if not isinstance(configs, list):
+        for fname, configs in netbird_config.load_entity_dir('users').items():
+            for user in configs:
+                if not isinstance(user, dict) or not selected(only, 'users', fname, user.get('email')):
+                    continue
+                email = user.get('email')
+                if not email:
+                    print(f"{DELETE} user без email в {fname}")
+                    stats['errors'] += 1
+                    continue
+                # auto_groups: преобразуем имена в id
+                if 'auto_groups' in user:
+                    group_ids = get_entity_ids_by_names('groups', user['auto_groups'])
+                    if len(group_ids) != len(user['auto_groups']):
+                        print(f"{DELETE} Не найдены все группы для user {email}: {user['auto_groups']}")
+                        stats['errors'] += 1
                         continue
-                    for user in configs:
-                        email = user.get('email')
-                        if not email:
-                            print(f"{DELETE} user без email в {fname}")
-                            stats['errors'] += 1
-                            continue
-                        # auto_groups: преобразуем имена в id
-                        if 'auto_groups' in user:
-                            group_ids = get_entity_ids_by_names('groups', user['auto_groups'])
-                            if len(group_ids) != len(user['auto_groups']):
-                                print(f"{DELETE} Не найдены все группы для user {email}: {user['auto_groups']}")
-                                stats['errors'] += 1
-                                continue
-                            user['auto_groups'] = group_ids
-                        # ищем id по email
-                        resp = requests.get(f"{API_URL}/api/users", headers=HEADERS)
-                        resp.raise_for_status()
-                        users_api = resp.json()
-                        user_id = None
-                        for u in users_api:
-                            if u.get('email') == email:
-                                user_id = u['id']
-                                break
-                        if not user_id:
-                            print(f"{DELETE} Не найден user по email: {email}")
-                            stats['errors'] += 1
-                            continue
-                        update_entity('users', user_id, user)
-                        stats['updated'] += 1
+                    user['auto_groups'] = group_ids
+                # ищем id по email
+                user_id = api.get_model("/api/users", netbird_models.EmailIndex).get(email)
+                if not user_id:
+                    print(f"{DELETE} Не найден user по email: {email}")
+                    stats['errors'] += 1
+                    continue
+                update_entity('users', user_id, user)
+                stats['updated'] += 1
         print(f"--- ИТОГИ USERS ---")
         print(f"{UPDATE} Обновлено: {stats['updated']}")
         if stats['errors']:
@@ -244,34 +300,31 @@ def sync_entity_dir(entity):
         if not os.path.isdir('dns'):
             return
         # Получаем все существующие dns группы из API
-        resp = requests.get(f"{API_URL}/api/dns/nameservers", headers=HEADERS)
-        resp.raise_for_status()
-        remote_objs = resp.json()
-        remote_by_name = {g['name']: g for g in remote_objs}
-        remote_names = set(remote_by_name.keys())
+        remote_ids = api.get_model("/api/dns/nameservers")
+        remote_names = remote_ids.names()
         local_names = set()
         local_configs = {}
-        for fname in os.listdir('dns'):
-            if fname.endswith('.yaml') or fname.endswith('.yml'):
-                with open(os.path.join('dns', fname), 'r') as f:
-                    obj = yaml.safe_load(f)
-                    if not isinstance(obj, dict) or 'name' not in obj:
+        for fname, items in netbird_config.load_entity_dir('dns').items():
+            for obj in items:
+                if not isinstance(obj, dict) or 'name' not in obj:
+                    continue
+                local_names.add(obj['name'])
+                if not selected(only, 'dns', fname, obj['name']):
+                    continue
+                if 'groups' in obj:
+                    group_ids = get_entity_ids_by_names('groups', obj['groups'])
+                    if len(group_ids) != len(obj['groups']):
+                        print(f"{DELETE} Не найдены все группы для dns {obj.get('name')}: {obj['groups']}")
+                        stats['errors'] += 1
                         continue
-                    if 'groups' in obj:
-                        group_ids = get_entity_ids_by_names('groups', obj['groups'])
-                        if len(group_ids) != len(obj['groups']):
-                            print(f"{DELETE} Не найдены все группы для dns {obj.get('name')}: {obj['groups']}")
-                            stats['errors'] += 1
-                            continue
-                        obj['groups'] = group_ids
-                    local_names.add(obj['name'])
-                    local_configs[obj['name']] = obj
+                    obj['groups'] = group_ids
+                local_configs[obj['name']] = obj
         # Создание и обновление
-        for name in local_names:
+        for name in local_configs:
             if name in remote_names:
                 print(f"{UPDATE} dns: {name}")
                 try:
-                    update_entity('dns/nameservers', remote_by_name[name]['id'], local_configs[name])
+                    update_entity('dns/nameservers', remote_ids[name], local_configs[name])
                     stats['updated'] += 1
                 except Exception as e:
                     print(f"{DELETE} Ошибка обновления dns: {e}")
@@ -285,10 +338,10 @@ def sync_entity_dir(entity):
                     print(f"{DELETE} Ошибка создания dns: {e}")
                     stats['errors'] += 1
         # Удаление
-        for name in remote_names - local_names:
+        for name in (remote_names - local_names if deletes_enabled(only) else ()):
             print(f"{DELETE} Удаляю dns: {name}")
             try:
-                delete_entity('dns/nameservers', remote_by_name[name]['id'], name)
+                delete_entity('dns/nameservers', remote_ids[name], name)
                 stats['deleted'] += 1
             except Exception as e:
                 print(f"{DELETE} Ошибка удаления dns: {e}")
@@ -301,41 +354,25 @@ def sync_entity_dir(entity):
             print(f"{DELETE} Ошибок: {stats['errors']}")
         print()
         return
-    resp = requests.get(f"{API_URL}/api/{api_entity}", headers=HEADERS)
-    resp.raise_for_status()
-    remote_objs = resp.json()
-    remote_by_name = {g['name']: g for g in remote_objs}
-    remote_names = set(remote_by_name.keys())
+    # Для сравнения с локальной конфигурацией нужны только имена и id удалённых объектов
+    remote_ids = api.get_model(f"/api/{api_entity}")
+    remote_names = remote_ids.names()
     local_names = set()
     local_configs = {}
-    if os.path.isdir(entity):
-        for fname in os.listdir(entity):
-            if fname.endswith('.yaml') or fname.endswith('.yml'):
-                with open(os.path.join(entity, fname), 'r') as f:
-                    configs = yaml.safe_load(f)
-                    if entity == 'groups' or entity == 'dns':
-                        if isinstance(configs, list):
-                            for config in configs:
-                                if config and 'name' in config:
-                                    local_names.add(config['name'])
-                                    local_configs[config['name']] = config
-                        elif isinstance(configs, dict) and 'name' in configs:
-                            local_names.add(configs['name'])
-                            local_configs[configs['name']] = configs
-                    elif entity == 'policy':
-                        if isinstance(configs, list):
-                            for config in configs:
-                                if config and 'name' in config:
-                                    local_names.add(config['name'])
-                                    local_configs[config['name']] = config
-                        elif isinstance(configs, dict) and 'name' in configs:
-                            local_names.add(configs['name'])
-                            local_configs[configs['name']] = configs
-                    else:
-                        if isinstance(configs, dict) and 'name' in configs:
-                            local_names.add(configs['name'])
-                            local_configs[configs['name']] = configs
-    for name in local_names - remote_names:
+    for fname, configs in netbird_config.load_entity_dir(entity).items():
+        for config in configs:
+            if isinstance(config, dict) and 'name' in config:
+                local_names.add(config['name'])
+                if selected(only, entity, fname, config['name']):
+                    local_configs[config['name']] = (compiled or {}).get(config['name'], config)
+    if entity == 'groups':
+        try:
+            local_configs = expand_peer_selectors(local_configs)
+        except ValueError as e:
+            # Без полного состава групп нельзя ни обновлять, ни удалять: этап пропускается целиком
+            print(f"{DELETE} peers_match: {e}\n")
+            return
+    for name in [n for n in local_configs if n not in remote_names]:
         if name.upper() == 'ALL':
             continue
         print(f"Создаю {entity[:-1]}: {name}")
@@ -355,18 +392,18 @@ def sync_entity_dir(entity):
         except Exception as e:
             print(f"{DELETE} Ошибка создания: {e}")
             stats['errors'] += 1
-    for name in remote_names - local_names:
+    for name in (remote_names - local_names if deletes_enabled(only) else ()):
         if name.upper() == 'ALL':
             continue
         print(f"Удаляю {entity[:-1]}: {name}")
         try:
             ok = False
             if entity == 'groups':
-                ok = delete_entity(entity, remote_by_name[name]['id'], name)
+                ok = delete_entity(entity, remote_ids[name], name)
             elif entity == 'policy':
-                ok = delete_entity('policies', remote_by_name[name]['id'], name)
+                ok = delete_entity('policies', remote_ids[name], name)
             elif entity == 'dns':
-                ok = delete_entity('dns/nameservers', remote_by_name[name]['id'], name)
+                ok = delete_entity('dns/nameservers', remote_ids[name], name)
             if ok:
                 stats['deleted'] += 1
             else:
@@ -374,18 +411,21 @@ def sync_entity_dir(entity):
         except Exception as e:
             print(f"{DELETE} Ошибка удаления: {e}")
             stats['errors'] += 1
-    for name in local_names & remote_names:
+    for name in [n for n in local_configs if n in remote_names]:
         if name.upper() == 'ALL':
             continue
+        if entity == 'groups' and group_unchanged(name, local_configs[name]):
+            stats['unchanged'] += 1
+            continue
         print(f"Обновляю: {name}")
         try:
             ok = False
             if entity == 'groups':
-                ok = update_entity(entity, remote_by_name[name]['id'], local_configs[name])
+                ok = update_entity(entity, remote_ids[name], local_configs[name])
             elif entity == 'policy':
-                ok = update_entity('policies', remote_by_name[name]['id'], local_configs[name])
+                ok = update_entity('policies', remote_ids[name], local_configs[name])
             elif entity == 'dns':
-                ok = update_entity('dns/nameservers', remote_by_name[name]['id'], local_configs[name])
+                ok = update_entity('dns/nameservers', remote_ids[name], local_configs[name])
             if ok:
                 stats['updated'] += 1
             else:
@@ -396,6 +436,8 @@ def sync_entity_dir(entity):
     print(f"--- ИТОГИ {entity.upper()} ---")
     print(f"{CREATE} Создано: {stats['created']}")
     print(f"{UPDATE} Обновлено: {stats['updated']}")
+    if stats['unchanged']:
+        print(f"{UPDATE} Без изменений: {stats['unchanged']}")
     print(f"{RED_MINUS} Удалено: {stats['deleted']}")
     if stats['errors']:
         print(f"{DELETE} Ошибок: {stats['errors']}")
@@ -415,101 +457,156 @@ def get_network_id_by_name(name):
     ids = get_entity_ids_by_names('networks', [name])
     return ids[0] if ids else None
 
-def create_resource(config):
-    network_id = get_network_id_by_name(config['network'])
+def create_resource(config, network_id=None):
+    if network_id is None:
+        network_id = get_network_id_by_name(config['network'])
     if not network_id:
         print(f"{DELETE} Не найден network для ресурса: {config.get('name')}")
         return
-    url = f"{API_URL}/api/networks/{network_id}/resources"
-    print_debug_request('POST', url, HEADERS, config)
-    resp = requests.post(url, headers=HEADERS, json=config)
+    url = f"/api/networks/{network_id}/resources"
+    resp = api.request('POST', url, config)
     if resp.status_code not in (200, 201):
         print(f"{DELETE} Ошибка создания resource: {resp.status_code} {resp.text}")
     else:
         print(f"{CREATE} resource создан: {config.get('name', config.get('id', ''))}")
 
-def update_resource(resource_id, config):
-    network_id = get_network_id_by_name(config['network'])
+def update_resource(resource_id, config, network_id=None):
+    if network_id is None:
+        network_id = get_network_id_by_name(config['network'])
     if not network_id:
         print(f"{DELETE} Не найден network для ресурса: {config.get('name')}")
         return
-    url = f"{API_URL}/api/networks/{network_id}/resources/{resource_id}"
-    print_debug_request('PUT', url, HEADERS, config)
-    resp = requests.put(url, headers=HEADERS, json=config)
+    url = f"/api/networks/{network_id}/resources/{resource_id}"
+    resp = api.request('PUT', url, config)
     if resp.status_code not in (200, 201):
         print(f"{DELETE} Ошибка обновления resource: {resp.status_code} {resp.text}")
     else:
         print(f"{UPDATE} resource обновлён: {config.get('name', config.get('id', ''))}")
 
-def delete_resource(resource_id, config):
-    network_id = get_network_id_by_name(config['network'])
+def delete_network_object(kind, object_id, network_id):
+    # Только запрос, без вывода: вызывается из потоков run_parallel, результат печатает вызывающий
+    return api.request('DELETE', f"/api/networks/{network_id}/{kind}/{object_id}")
+
+def report_delete(label, resp, name):
+    if resp.status_code != 200:
+        print(f"{DELETE} Ошибка удаления {label} {name}: {resp.status_code} {resp.text}")
+        return False
+    print(f"{DELETE} {label} удалён: {name}")
+    return True
+
+def delete_resource(resource_id, config, network_id=None):
+    if network_id is None:
+        network_id = get_network_id_by_name(config['network'])
     if not network_id:
         print(f"{DELETE} Не найден network для ресурса: {config.get('name')}")
         return
-    url = f"{API_URL}/api/networks/{network_id}/resources/{resource_id}"
-    print_debug_request('DELETE', url, HEADERS)
-    resp = requests.delete(url, headers=HEADERS)
-    if resp.status_code != 200:
-        print(f"{DELETE} Ошибка удаления resource {config.get('name')}: {resp.status_code} {resp.text}")
-    else:
-        print(f"{DELETE} resource удалён: {config.get('name')}")
+    return report_delete('resource', delete_network_object('resources', resource_id, network_id), config.get('name'))
 
-def create_route(config):
-    network_id = get_network_id_by_name(config['network'])
+def create_route(config, network_id=None):
+    if network_id is None:
+        network_id = get_network_id_by_name(config['network'])
     if not network_id:
         print(f"{DELETE} Не найден network для роутера: {config.get('name')}")
         return
-    url = f"{API_URL}/api/networks/{network_id}/routers"
-    print_debug_request('POST', url, HEADERS, config)
-    resp = requests.post(url, headers=HEADERS, json=config)
+    url = f"/api/networks/{network_id}/routers"
+    resp = api.request('POST', url, config)
     if resp.status_code not in (200, 201):
         print(f"{DELETE} Ошибка создания route: {resp.status_code} {resp.text}")
     else:
         print(f"{CREATE} route создан: {config.get('name', config.get('id', ''))}")
 
-def update_route(route_id, config):
-    network_id = get_network_id_by_name(config['network'])
+def update_route(route_id, config, network_id=None):
+    if network_id is None:
+        network_id = get_network_id_by_name(config['network'])
     if not network_id:
         print(f"{DELETE} Не найден network для роутера: {config.get('name')}")
         return
-    url = f"{API_URL}/api/networks/{network_id}/routers/{route_id}"
-    print_debug_request('PUT', url, HEADERS, config)
-    resp = requests.put(url, headers=HEADERS, json=config)
+    url = f"/api/networks/{network_id}/routers/{route_id}"
+    resp = api.request('PUT', url, config)
     if resp.status_code not in (200, 201):
         print(f"{DELETE} Ошибка обновления route: {resp.status_code} {resp.text}")
     else:
         print(f"{UPDATE} route обновлён: {config.get('name', config.get('id', ''))}")
 
-def delete_route(route_id, config):
-    network_id = get_network_id_by_name(config['network'])
+def delete_route(route_id, config, network_id=None):
+    if network_id is None:
+        network_id = get_network_id_by_name(config['network'])
     if not network_id:
         print(f"{DELETE} Не найден network для роутера: {config.get('name')}")
         return
-    url = f"{API_URL}/api/networks/{network_id}/routers/{route_id}"
-    print_debug_request('DELETE', url, HEADERS)
-    resp = requests.delete(url, headers=HEADERS)
-    if resp.status_code != 200:
-        print(f"{DELETE} Ошибка удаления route {config.get('name')}: {resp.status_code} {resp.text}")
-    else:
-        print(f"{DELETE} route удалён: {config.get('name')}")
+    return report_delete('route', delete_network_object('routers', route_id, network_id), config.get('name'))
 
-def patch_resource_group_names(resource):
+def patch_resource_group_names(resource, group_ids=None):
     if 'groups' in resource:
-        resource['groups'] = get_entity_ids_by_names('groups', resource['groups'])
+        if group_ids is None:
+            resource['groups'] = get_entity_ids_by_names('groups', resource['groups'])
+        else:
+            resource['groups'] = [group_ids[name] for name in resource['groups'] if name in group_ids]
     return resource
 
-def patch_route_peer_groups(route):
+def patch_route_peer_groups(route, group_ids=None):
     if 'peer_groups' in route:
-        route['peer_groups'] = get_entity_ids_by_names('groups', route['peer_groups'])
+        if group_ids is None:
+            route['peer_groups'] = get_entity_ids_by_names('groups', route['peer_groups'])
+        else:
+            route['peer_groups'] = [group_ids[name] for name in route['peer_groups'] if name in group_ids]
+    if route.get('peer'):
+        # peer указывается именем пира (так его пишет экспорт); id оставляется как есть
+        route['peer'] = get_name_to_id('peers').get(route['peer'], route['peer'])
     return route
 
-def sync_groups():
-    sync_entity_dir('groups')
+def sync_groups(only=None):
+    sync_entity_dir('groups', only)
+
+class NetworkReadiness:
+    # Готовность сетей отслеживается по ответам create/update: сеть, для которой API вернул объект,
+    # считается готовой сразу. API опрашивается (с экспоненциальной паузой) только по сетям,
+    # созданным без объекта в ответе.
+    def __init__(self, remote_by_name):
+        self.networks = dict(remote_by_name)
+        self.pending = set()
+        self.failed = set()
+
+    def record(self, name, result):
+        if isinstance(result, dict):
+            self.networks[name] = result
+            self.pending.discard(name)
+        elif result:
+            self.pending.add(name)
+        else:
+            self.failed.add(name)
+
+    def verify(self):
+        # Один запрос списка сетей; подтверждаем только недостающие
+        resp = api.request('GET', "/api/networks")
+        resp.raise_for_status()
+        for obj in resp.json() or []:
+            if obj.get('name') in self.pending:
+                self.record(obj['name'], obj)
+
+    def wait(self, timeout=30, initial_interval=0.25, max_interval=5):
+        waited = 0
+        interval = initial_interval
+        spin_idx = 0
+        while self.pending:
+            self.verify()
+            if not self.pending:
+                print(f"\r{GREEN}Все сети появились в API, продолжаем...{' ' * 30}{RESET}")
+                break
+            if waited >= timeout:
+                print(f"\r{RED}Таймаут ожидания сетей: {', '.join(sorted(self.pending))}{' ' * 30}{RESET}")
+                return False
+            print_spinner("Ожидание появления всех сетей в API...", spin_idx)
+            spin_idx += 1
+            time.sleep(interval)
+            waited += interval
+            interval = min(interval * 2, max_interval)
+        return True
 
-def sync_networks():
+def sync_networks(wait=False, only=None):
     print(f"\n=== NETWORKS ===")
     # Получаем все networks из API
-    resp = requests.get(f"{API_URL}/api/networks", headers=HEADERS)
+    resp = api.request('GET', "/api/networks")
     resp.raise_for_status()
     remote_objs = resp.json()
     remote_by_name = {g['name']: g for g in remote_objs}
@@ -517,48 +614,46 @@ def sync_networks():
     # Читаем все networks из файлов (массив или объект)
     local_names = set()
     local_configs = {}
-    if os.path.isdir('networks'):
-        for fname in os.listdir('networks'):
-            if fname.endswith('.yaml') or fname.endswith('.yml'):
-                with open(os.path.join('networks', fname), 'r') as f:
-                    configs = yaml.safe_load(f)
-                    if isinstance(configs, list):
-                        for config in configs:
-                            if config and 'name' in config:
-                                local_names.add(config['name'])
-                                local_configs[config['name']] = config
-                    elif isinstance(configs, dict) and 'name' in configs:
-                        local_names.add(configs['name'])
-                        local_configs[configs['name']] = configs
+    for fname, configs in netbird_config.load_entity_dir('networks').items():
+        for config in configs:
+            if isinstance(config, dict) and 'name' in config:
+                local_names.add(config['name'])
+                if selected(only, 'networks', fname, config['name']):
+                    local_configs[config['name']] = config
+    readiness = NetworkReadiness(remote_by_name)
+    to_create = [name for name in local_configs if name not in remote_names]
+    to_update = [name for name in local_configs if name in remote_names]
     # Создаём недостающие
-    for name in local_names - remote_names:
+    for name in to_create:
         print(f"{CREATE} network: {name}")
-        create_entity('networks', local_configs[name])
+        readiness.record(name, create_entity('networks', local_configs[name]))
     # Обновляем существующие
-    for name in local_names & remote_names:
+    for name in to_update:
         print(f"{UPDATE} network: {name}")
-        update_entity('networks', remote_by_name[name]['id'], local_configs[name])
+        result = update_entity('networks', remote_by_name[name]['id'], local_configs[name])
+        if isinstance(result, dict):
+            readiness.record(name, result)
     # Не удаляем лишние на этом этапе
     print(f"--- ИТОГИ NETWORKS ---")
-    print(f"{CREATE} Создано: {len(local_names - remote_names)}")
-    print(f"{UPDATE} Обновлено: {len(local_names & remote_names)}")
+    print(f"{CREATE} Создано: {len(to_create) - len(readiness.failed)}")
+    print(f"{UPDATE} Обновлено: {len(to_update)}")
+    if readiness.failed:
+        print(f"{DELETE} Ошибок: {len(readiness.failed)}")
     print()
-    return remote_by_name, local_names
+    if wait and not readiness.wait():
+        sys.exit(1)
+    return readiness.networks, local_names
 
 def create_or_update_resource(config):
     network_id = get_network_id_by_name(config['network'])
     if not network_id:
         print(f"{DELETE} Не найден network для ресурса: {config.get('name')}")
         return
-    url = f"{API_URL}/api/networks/{network_id}/resources"
-    resp = requests.get(url, headers=HEADERS)
-    resp.raise_for_status()
-    remote_resources = resp.json() or []
-    remote_by_name = {r['name']: r for r in remote_resources if r and 'name' in r}
+    remote_ids = api.get_model(f"/api/networks/{network_id}/resources")
     config = patch_resource_group_names(config)
-    if config['name'] in remote_by_name:
+    if config['name'] in remote_ids:
         print(f"{UPDATE} resource: {config['name']} в сети {config['network']}")
-        update_resource(remote_by_name[config['name']]['id'], config)
+        update_resource(remote_ids[config['name']], config)
     else:
         print(f"{CREATE} resource: {config['name']} в сети {config['network']}")
         create_resource(config)
@@ -568,18 +663,13 @@ def create_or_update_route(config):
     if not network_id:
         print(f"{DELETE} Не найден network для роутера: {config.get('name')}")
         return
-    url = f"{API_URL}/api/networks/{network_id}/routers"
-    resp = requests.get(url, headers=HEADERS)
+    url = f"/api/networks/{network_id}/routers"
+    resp = api.request('GET', url)
     resp.raise_for_status()
     remote_routes = resp.json() or []
     config = patch_route_peer_groups(config)
-    # Сравниваем только по peer_groups (сортируем для надёжности)
     config_peer_groups = sorted(config.get('peer_groups', []) or [])
-    found = None
-    for r in remote_routes:
-        if sorted(r.get('peer_groups', []) or []) == config_peer_groups:
-            found = r
-            break
+    found = RouterIndex(remote_routes).match(config)
     if found:
         print(f"{UPDATE} route (peer_groups={config_peer_groups}) в сети {config['network']}")
         update_route(found['id'], config)
@@ -587,130 +677,181 @@ def create_or_update_route(config):
         print(f"{CREATE} route (peer_groups={config_peer_groups}) в сети {config['network']}")
         create_route(config)
 
-def sync_resources_and_routes(remote_networks):
+def route_identity(route):
+    # Канонический идентификатор роутера без имени: группы (без учёта порядка), peer, metric, masquerade
+    return (frozenset(route.get('peer_groups') or []), route.get('peer'), route.get('metric'), route.get('masquerade'))
+
+class RouterIndex:
+    # Индекс роутеров сети: по имени, по полному идентификатору и по набору peer_groups.
+    # При совпадении нескольких роутеров выбирается роутер с меньшим id; каждый роутер
+    # сопоставляется не более чем с одним локальным роутом.
+    def __init__(self, routers):
+        self.routers = sorted((r for r in routers if r and 'id' in r), key=lambda r: str(r['id']))
+        self.by_name = {}
+        self.by_identity = {}
+        self.by_groups = {}
+        self.matched = set()
+        for r in reversed(self.routers):
+            if r.get('name'):
+                self.by_name.setdefault(r['name'], []).append(r)
+            identity = route_identity(r)
+            self.by_identity.setdefault(identity, []).append(r)
+            self.by_groups.setdefault(identity[:2], []).append(r)
+
+    def _take(self, candidates):
+        while candidates:
+            r = candidates.pop()
+            if r['id'] not in self.matched:
+                self.matched.add(r['id'])
+                return r
+        return None
+
+    def match_name(self, config):
+        return self._take(self.by_name.get(config.get('name'), [])) if config.get('name') else None
+
+    def match_identity(self, config):
+        return self._take(self.by_identity.get(route_identity(config), []))
+
+    def match_groups(self, config):
+        return self._take(self.by_groups.get(route_identity(config)[:2], []))
+
+    def match(self, config):
+        return self.match_name(config) or self.match_identity(config) or self.match_groups(config)
+
+    def unmatched(self):
+        return [r for r in self.routers if r['id'] not in self.matched]
+
+def match_routes(configs, routers):
+    # Сопоставляет локальные роуты (peer_groups уже в id) с роутерами сети.
+    # Проходы идут от самого точного признака к самому общему, чтобы запасное сопоставление
+    # по peer_groups не забирало роутер, который точно совпадает с другим роутом.
+    index = RouterIndex(routers)
+    found = [None] * len(configs)
+    for match in (index.match_name, index.match_identity, index.match_groups):
+        for i, config in enumerate(configs):
+            if found[i] is None:
+                found[i] = match(config)
+    return list(zip(configs, found)), index.unmatched()
+
+def plan_routes(state):
+    # План create/update/delete роутеров по сетям считается один раз и используется
+    # и синхронизацией, и очисткой
+    if 'route_plan' not in state:
+        group_ids = state['group_ids']
+        plan = {}
+        for network_name, net_state in state['networks'].items():
+            configs = [patch_route_peer_groups(dict(c, network=network_name), group_ids) for c in state['routes'].get(network_name, [])]
+            plan[network_name] = match_routes(configs, net_state['routers'])
+        state['route_plan'] = plan
+    return state['route_plan']
+
+def load_network_configs(entity):
+    # {network: [config, ...]} из resources/*.yaml или routes/*.yaml (имя файла — имя сети)
+    configs = {}
+    for fname, items in netbird_config.load_entity_dir(entity).items():
+        configs[netbird_config.network_name(fname)] = [c for c in items if isinstance(c, dict)]
+    return configs
+
+def fetch_network_state(remote_networks, network_names):
+    # Ресурсы и роутеры сетей: по одному GET на сеть и тип, параллельно
+    def fetch(name):
+        network_id = remote_networks[name]['id']
+        state = {'id': network_id}
+        for kind in ('resources', 'routers'):
+            resp = api.request('GET', f"/api/networks/{network_id}/{kind}")
+            resp.raise_for_status()
+            state[kind] = resp.json() or []
+        # Индекс имя -> id строится один раз на сеть, а не на каждый локальный ресурс
+        state['resource_ids'] = netbird_models.NameIndex(state['resources'])
+        return name, state
+    names = [name for name in network_names if name in remote_networks]
+    return dict(run_parallel(fetch, names))
+
+def load_sync_state(remote_networks, local_network_names=None, extra_networks=()):
+    # Состояние, общее для синхронизации и очистки ресурсов/роутов; extra_networks — удаляемые сети,
+    # состояние которых нужно для снимков отката (запрашивается в том же параллельном проходе)
+    names = list(remote_networks.keys() if local_network_names is None else local_network_names)
+    names += [name for name in extra_networks if name not in names]
+    return {
+        'networks': fetch_network_state(remote_networks, names),
+        'resources': load_network_configs('resources'),
+        'routes': load_network_configs('routes'),
+        'group_ids': get_name_to_id('groups'),
+    }
+
+def selected_networks(only, entity):
+    # Сети, файлы или объекты которых выбраны для синхронизации (None — все сети)
+    if only is None:
+        return None
+    return {netbird_config.network_name(fname) for fname in only.fnames(entity)}
+
+def cascade_networks(remote_networks, local_network_names):
+    # Сети, которые удалит очистка: при записи запуска нужны снимки их ресурсов и роутеров
+    if not api.run_active():
+        return []
+    return [name for name in remote_networks if name not in local_network_names]
+
+def sync_resources_and_routes(remote_networks, local_network_names=None, only=None, extra_networks=()):
     stats_resources = {'created': 0, 'updated': 0, 'errors': 0}
     stats_routes = {'created': 0, 'updated': 0, 'errors': 0}
+    resource_networks = selected_networks(only, 'resources')
+    route_networks = selected_networks(only, 'routes')
+    if only is not None:
+        # Состояние запрашивается только по сетям выбранных файлов и объектов
+        local_network_names = [name for name in local_network_names if name in resource_networks | route_networks]
+    state = load_sync_state(remote_networks, local_network_names, extra_networks)
+    group_ids = state['group_ids']
     # resources
-    if os.path.isdir('resources'):
-        for fname in os.listdir('resources'):
-            if fname.endswith('.yaml') or fname.endswith('.yml'):
-                network_name = fname.rsplit('.', 1)[0]
-                if network_name not in remote_networks:
-                    print(f"{DELETE} Пропускаю resource: не найден network {network_name}")
-                    continue
-                with open(os.path.join('resources', fname), 'r') as f:
-                    configs = yaml.safe_load(f)
-                    if not configs:
-                        continue
-                    if isinstance(configs, list):
-                        for config in configs:
-                            if not config or 'name' not in config:
-                                continue
-                            config = dict(config, network=network_name)
-                            # считаем результат
-                            network_id = get_network_id_by_name(config['network'])
-                            if not network_id:
-                                stats_resources['errors'] += 1
-                                continue
-                            url = f"{API_URL}/api/networks/{network_id}/resources"
-                            resp = requests.get(url, headers=HEADERS)
-                            resp.raise_for_status()
-                            remote_resources = resp.json() or []
-                            remote_by_name = {r['name']: r for r in remote_resources if r and 'name' in r}
-                            config = patch_resource_group_names(config)
-                            if config['name'] in remote_by_name:
-                                print(f"{UPDATE} resource: {config['name']} в сети {config['network']}")
-                                update_resource(remote_by_name[config['name']]['id'], config)
-                                stats_resources['updated'] += 1
-                            else:
-                                print(f"{CREATE} resource: {config['name']} в сети {config['network']}")
-                                create_resource(config)
-                                stats_resources['created'] += 1
-                    elif isinstance(configs, dict) and 'name' in configs:
-                        config = dict(configs, network=network_name)
-                        network_id = get_network_id_by_name(config['network'])
-                        if not network_id:
-                            stats_resources['errors'] += 1
-                        else:
-                            url = f"{API_URL}/api/networks/{network_id}/resources"
-                            resp = requests.get(url, headers=HEADERS)
-                            resp.raise_for_status()
-                            remote_resources = resp.json() or []
-                            remote_by_name = {r['name']: r for r in remote_resources if r and 'name' in r}
-                            config = patch_resource_group_names(config)
-                            if config['name'] in remote_by_name:
-                                print(f"{UPDATE} resource: {config['name']} в сети {config['network']}")
-                                update_resource(remote_by_name[config['name']]['id'], config)
-                                stats_resources['updated'] += 1
-                            else:
-                                print(f"{CREATE} resource: {config['name']} в сети {config['network']}")
-                                create_resource(config)
-                                stats_resources['created'] += 1
+    for network_name, configs in state['resources'].items():
+        if resource_networks is not None and network_name not in resource_networks:
+            continue
+        if network_name not in remote_networks:
+            print(f"{DELETE} Пропускаю resource: не найден network {network_name}")
+            continue
+        net_state = state['networks'].get(network_name)
+        for config in configs:
+            if 'name' not in config:
+                continue
+            if only is not None and not only.includes_network_object('resources', network_name, config['name']):
+                continue
+            if net_state is None:
+                stats_resources['errors'] += 1
+                continue
+            config = patch_resource_group_names(dict(config, network=network_name), group_ids)
+            if config['name'] in net_state['resource_ids']:
+                print(f"{UPDATE} resource: {config['name']} в сети {config['network']}")
+                update_resource(net_state['resource_ids'][config['name']], config, net_state['id'])
+                stats_resources['updated'] += 1
+            else:
+                print(f"{CREATE} resource: {config['name']} в сети {config['network']}")
+                create_resource(config, net_state['id'])
+                stats_resources['created'] += 1
     # routes
-    if os.path.isdir('routes'):
-        for fname in os.listdir('routes'):
-            if fname.endswith('.yaml') or fname.endswith('.yml'):
-                network_name = fname.rsplit('.', 1)[0]
-                if network_name not in remote_networks:
-                    print(f"{DELETE} Пропускаю route: не найден network {network_name}")
-                    continue
-                with open(os.path.join('routes', fname), 'r') as f:
-                    configs = yaml.safe_load(f)
-                    if not configs:
-                        continue
-                    if isinstance(configs, list):
-                        for config in configs:
-                            if not config or 'name' not in config:
-                                continue
-                            config = dict(config, network=network_name)
-                            network_id = get_network_id_by_name(config['network'])
-                            if not network_id:
-                                stats_routes['errors'] += 1
-                                continue
-                            url = f"{API_URL}/api/networks/{network_id}/routers"
-                            resp = requests.get(url, headers=HEADERS)
-                            resp.raise_for_status()
-                            remote_routes = resp.json() or []
-                            config = patch_route_peer_groups(config)
-                            config_peer_groups = sorted(config.get('peer_groups', []) or [])
-                            found = None
-                            for r in remote_routes:
-                                if sorted(r.get('peer_groups', []) or []) == config_peer_groups:
-                                    found = r
-                                    break
-                            if found:
-                                print(f"{UPDATE} route (peer_groups={config_peer_groups}) в сети {config['network']}")
-                                update_route(found['id'], config)
-                                stats_routes['updated'] += 1
-                            else:
-                                print(f"{CREATE} route (peer_groups={config_peer_groups}) в сети {config['network']}")
-                                create_route(config)
-                                stats_routes['created'] += 1
-                    elif isinstance(configs, dict) and 'name' in configs:
-                        config = dict(configs, network=network_name)
-                        network_id = get_network_id_by_name(config['network'])
-                        if not network_id:
-                            stats_routes['errors'] += 1
-                        else:
-                            url = f"{API_URL}/api/networks/{network_id}/routers"
-                            resp = requests.get(url, headers=HEADERS)
-                            resp.raise_for_status()
-                            remote_routes = resp.json() or []
-                            config = patch_route_peer_groups(config)
-                            config_peer_groups = sorted(config.get('peer_groups', []) or [])
-                            found = None
-                            for r in remote_routes:
-                                if sorted(r.get('peer_groups', []) or []) == config_peer_groups:
-                                    found = r
-                                    break
-                            if found:
-                                print(f"{UPDATE} route (peer_groups={config_peer_groups}) в сети {config['network']}")
-                                update_route(found['id'], config)
-                                stats_routes['updated'] += 1
-                            else:
-                                print(f"{CREATE} route (peer_groups={config_peer_groups}) в сети {config['network']}")
-                                create_route(config)
-                                stats_routes['created'] += 1
+    route_plan = plan_routes(state)
+    for network_name, configs in state['routes'].items():
+        if route_networks is not None and network_name not in route_networks:
+            continue
+        if network_name not in remote_networks:
+            print(f"{DELETE} Пропускаю route: не найден network {network_name}")
+            continue
+        net_state = state['networks'].get(network_name)
+        if net_state is None:
+            stats_routes['errors'] += sum(1 for config in configs if 'name' in config)
+            continue
+        for config, found in route_plan[network_name][0]:
+            if 'name' not in config:
+                continue
+            if only is not None and not only.includes_network_object('routes', network_name, config['name']):
+                continue
+            config_peer_groups = sorted(config.get('peer_groups', []) or [])
+            if found:
+                print(f"{UPDATE} route (peer_groups={config_peer_groups}) в сети {config['network']}")
+                update_route(found['id'], config, net_state['id'])
+                stats_routes['updated'] += 1
+            else:
+                print(f"{CREATE} route (peer_groups={config_peer_groups}) в сети {config['network']}")
+                create_route(config, net_state['id'])
+                stats_routes['created'] += 1
     print(f"--- ИТОГИ RESOURCES ---")
     print(f"{CREATE} Создано: {stats_resources['created']}")
     print(f"{UPDATE} Обновлено: {stats_resources['updated']}")
@@ -723,117 +864,190 @@ def sync_resources_and_routes(remote_networks):
     if stats_routes['errors']:
         print(f"{DELETE} Ошибок: {stats_routes['errors']}")
     print()
+    return state
 
-def delete_absent_networks(remote_networks, local_network_names):
-    for name, net in remote_networks.items():
-        if name not in local_network_names:
-            print(f"{DELETE} Удаляю network: {name}")
-            delete_entity('networks', net['id'], name)
-
-def wait_for_networks_ready(local_network_names, timeout=30, interval=3):
-    while True:
-        found_ids = get_entity_ids_by_names('networks', list(local_network_names))
-        if len(found_ids) == len(local_network_names):
-            print(f"\r{GREEN}Все сети появились в API, продолжаем...{' ' * 30}{RESET}")
-            break
-        print_spinner("Ожидание появления всех сетей в API...", spin_idx)
-        spin_idx += 1
-        time.sleep(interval)
-        waited += interval
-        if waited >= timeout:
-            print(f"\r{RED}Таймаут ожидания сетей!{' ' * 30}{RESET}")
-            sys.exit(1)
+def delete_absent_networks(remote_networks, local_network_names, state=None):
+    absent = {name: net for name, net in remote_networks.items() if name not in local_network_names}
+    # Ресурсы и роутеры удаляемой сети API удаляет вместе с ней: для отката их снимки берутся из состояния,
+    # полученного вместе с остальными сетями (cascade_networks)
+    networks = state['networks'] if state else {}
+    for name, net in absent.items():
+        children = [f"/api/networks/{net['id']}/{kind}/{obj['id']}" for kind in ('resources', 'routers')
+                    for obj in networks.get(name, {}).get(kind, []) if obj and 'id' in obj]
+        api.capture_cascade(children)
+        print(f"{DELETE} Удаляю network: {name}")
+        if delete_entity('networks', net['id'], name):
+            api.record_deleted(children)
 
-def cleanup_resources(remote_networks):
+def cleanup_resources(state):
     if not os.path.isdir('resources'):
         return
-    for network_name, net in remote_networks.items():
-        network_id = net['id']
-        url = f"{API_URL}/api/networks/{network_id}/resources"
-        resp = requests.get(url, headers=HEADERS)
-        resp.raise_for_status()
-        remote_resources = resp.json() or []
-        remote_by_name = {r['name']: r for r in remote_resources if r and 'name' in r}
-        local_names = set()
-        fname = f"resources/{network_name}.yaml"
-        if os.path.isfile(fname):
-            with open(fname, 'r') as f:
-                configs = yaml.safe_load(f)
-                if isinstance(configs, list):
-                    for config in configs:
-                        if config and 'name' in config:
-                            local_names.add(config['name'])
-                elif isinstance(configs, dict) and 'name' in configs:
-                    local_names.add(configs['name'])
-        for name, r in remote_by_name.items():
-            if name not in local_names:
-                print(f"{DELETE} Удаляю resource: {name} в сети {network_name}")
-                delete_resource(r['id'], {'network': network_name, 'name': name})
-
-def cleanup_routes(remote_networks):
+    # Список удалений считается в памяти по уже полученному состоянию сетей
+    deletes = []
+    for network_name, net_state in state['networks'].items():
+        local_names = {c['name'] for c in state['resources'].get(network_name, []) if 'name' in c}
+        for r in net_state['resources']:
+            if r and 'name' in r and r['name'] not in local_names:
+                deletes.append((network_name, net_state['id'], r))
+    def delete(item):
+        network_name, network_id, r = item
+        return item, delete_network_object('resources', r['id'], network_id)
+    # Вывод — из основного потока, после всех удалений: строки параллельных потоков не перемешиваются
+    for (network_name, network_id, r), resp in run_parallel(delete, deletes):
+        print(f"{DELETE} Удаляю resource: {r['name']} в сети {network_name}")
+        report_delete('resource', resp, r['name'])
+
+def cleanup_routes(state):
     if not os.path.isdir('routes'):
         return
-    for network_name, net in remote_networks.items():
-        network_id = net['id']
-        url = f"{API_URL}/api/networks/{network_id}/routers"
-        resp = requests.get(url, headers=HEADERS)
-        resp.raise_for_status()
-        remote_routes = resp.json() or []
-        remote_by_peer_groups = {tuple(sorted(r.get('peer_groups', []))): r for r in remote_routes if r and 'peer_groups' in r}
-        local_peer_groups = set()
-        fname = f"routes/{network_name}.yaml"
-        if os.path.isfile(fname):
-            with open(fname, 'r') as f:
-                configs = yaml.safe_load(f)
-                if isinstance(configs, list):
-                    for config in configs:
-                        if config and 'peer_groups' in config:
-                            local_peer_groups.add(tuple(sorted(get_entity_ids_by_names('groups', config['peer_groups']))))
-                elif isinstance(configs, dict) and 'peer_groups' in configs:
-                    local_peer_groups.add(tuple(sorted(get_entity_ids_by_names('groups', configs['peer_groups']))))
-        for peer_groups, r in remote_by_peer_groups.items():
-            if peer_groups not in local_peer_groups:
-                print(f"{DELETE} Удаляю route (peer_groups={list(peer_groups)}) в сети {network_name}")
-                delete_route(r['id'], {'network': network_name, 'name': r.get('name', ''), 'peer_groups': list(peer_groups)})
-
-def cleanup_all(remote_networks, local_network_names):
-    delete_absent_networks(remote_networks, local_network_names)
-    cleanup_resources(remote_networks)
-    cleanup_routes(remote_networks)
-
-def main():
+    # Удаляются роутеры, не сопоставленные ни с одним локальным роутом (тот же индекс, что и при синхронизации)
+    deletes = []
+    for network_name, (pairs, unmatched) in plan_routes(state).items():
+        if network_name not in state['networks']:
+            continue
+        network_id = state['networks'][network_name]['id']
+        for r in unmatched:
+            deletes.append((network_name, network_id, r))
+    def delete(item):
+        network_name, network_id, r = item
+        return item, delete_network_object('routers', r['id'], network_id)
+    for (network_name, network_id, r), resp in run_parallel(delete, deletes):
+        peer_groups = sorted(r.get('peer_groups', []) or [])
+        print(f"{DELETE} Удаляю route (peer_groups={peer_groups}) в сети {network_name}")
+        report_delete('route', resp, r.get('name', ''))
+
+def cleanup_all(remote_networks, local_network_names, state=None):
+    if state is None:
+        state = load_sync_state(remote_networks, local_network_names, cascade_networks(remote_networks, local_network_names))
+    delete_absent_networks(remote_networks, local_network_names, state)
+    # Ресурсы и роуты удалённых сетей удаляются вместе с сетью
+    state = dict(state, networks={name: net for name, net in state['networks'].items() if name in local_network_names})
+    cleanup_resources(state)
+    cleanup_routes(state)
+
+STAGES = ['groups', 'users', 'dns', 'networks', 'resources', 'routes', 'policy', 'cleanup']
+
+def stages_for_tag(tag):
+    return set(STAGES) if tag == 'all' else {tag}
+
+def load_networks():
+    # Сети из API и имена локальных сетей без синхронизации: этапам resources/routes/cleanup нужны только id
+    resp = api.request('GET', "/api/networks")
+    resp.raise_for_status()
+    remote_by_name = {g['name']: g for g in resp.json()}
+    local_names = {config['name'] for fname, configs in netbird_config.load_entity_dir('networks').items()
+                   for config in configs if isinstance(config, dict) and 'name' in config}
+    return remote_by_name, local_names
+
+def run(stages, only=None, profiler=None, compile_policies=False):
+    # stages — набор этапов из STAGES; only — ограничение файлами и объектами (см. Selection)
+    stage = profiler.stage if profiler else null_stage
+    completed = {name for name in stages if api.stage_completed(name)}
+    if completed:
+        # Списки этапа в журнал не пишутся: оставшиеся этапы читают состояние API заново
+        print(f"{YELLOW}Продолжение по журналу: этапы {', '.join(s for s in STAGES if s in completed)} уже выполнены{RESET}")
+        stages = stages - completed
+    if 'groups' in stages:
+        with stage('groups'):
+            sync_groups(only)
+        api.complete_stage('groups')
+    if 'users' in stages:
+        with stage('users'):
+            sync_entity_dir('users', only)
+        api.complete_stage('users')
+    if 'dns' in stages:
+        with stage('dns'):
+            sync_entity_dir('dns', only)
+        api.complete_stage('dns')
+    remote_networks, local_network_names = None, None
+    if 'networks' in stages:
+        with stage('networks'):
+            remote_networks, local_network_names = sync_networks(wait=True, only=only)
+        api.complete_stage('networks')
+    elif stages & {'resources', 'routes', 'cleanup'}:
+        with stage('networks'):
+            remote_networks, local_network_names = load_networks()
+    state = None
+    if 'resources' in stages or 'routes' in stages:
+        with stage('resources/routes'):
+            extra = cascade_networks(remote_networks, local_network_names) if 'cleanup' in stages else ()
+            state = sync_resources_and_routes(remote_networks, local_network_names, only, extra)
+        for name in sorted(stages & {'resources', 'routes'}):
+            api.complete_stage(name)
+    if 'policy' in stages:
+        with stage('policy'):
+            compiled = None
+            if compile_policies:
+                compiled, report = netbird_policy.compiled_policies(netbird_config.load_config_tree())
+                netbird_policy.print_report(report)
+            sync_entity_dir('policy', only, compiled)
+        api.complete_stage('policy')
+    if 'cleanup' in stages:
+        with stage('cleanup'):
+            cleanup_all(remote_networks, local_network_names, state)
+        api.complete_stage('cleanup')
+
+def write_report(path, stages, duration, error=None):
+    # Итог запуска для сводного отчёта по нескольким аккаунтам (netbird_accounts.py)
+    report = {'stages': stages, 'duration': round(duration, 3), 'plan': api.DRY_RUN, 'error': error, 'run_id': api.RUN_ID,
+              'api': api.metrics()}
+    with open(path, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Netbird Configurator')
     parser.add_argument('--tag', type=str, default='all', help='Тег действия: all, groups, users, dns, networks, resources, routes, policy, cleanup')
-    args = parser.parse_args()
+    parser.add_argument('--plan', action='store_true', help='Показать изменения без применения (изменяющие запросы не отправляются)')
+    parser.add_argument('--only', action='append', metavar='FILE|TYPE:NAME', help='Синхронизировать только файл (policy/admins-to-ALL.yaml) или объект (group:u-devops); можно указать несколько раз')
+    parser.add_argument('--profile', type=str, nargs='?', const='profile', default=None, metavar='DIR', help='Профилировать этапы: pstats и collapsed-стеки в DIR (по умолчанию profile)')
+    parser.add_argument('--resume', action='store_true', help='Продолжить прерванный запуск по журналу операций')
+    parser.add_argument('--journal', type=str, default='.netbird-journal.jsonl', help='Файл журнала операций')
+    parser.add_argument('--runs', type=str, default=api.RUNS_DIR, metavar='DIR', help='Каталог снимков изменяемых объектов для отката (netbird.py rollback)')
+    parser.add_argument('--compile-policies', action='store_true', help='Объединить избыточные правила политик перед применением (см. netbird_policy.py)')
+    parser.add_argument('--report', type=str, default=None, metavar='FILE', help='Записать итог запуска (этапы, длительность, метрики API) в JSON')
+    args = parser.parse_args(argv)
     tag = args.tag
+    stages = stages_for_tag(tag)
+    only = None
+    if args.only:
+        try:
+            only = parse_selection(args.only)
+        except ValueError as e:
+            print(f"{RED}--only: {e}{RESET}")
+            sys.exit(1)
+        # Выполняются только этапы выбранных сущностей, без очистки
+        stages &= only.entities()
+    api.configure(dry_run=args.plan)
+    if only is not None:
+        # Подстановка id для каждого объекта читает одни и те же списки
+        api.enable_cache()
 
-    if tag == 'all' or tag == 'groups':
-        sync_groups()
-    if tag == 'all' or tag == 'users':
-        sync_entity_dir('users')
-    if tag == 'all' or tag == 'dns':
-        sync_entity_dir('dns')
-    if tag == 'all' or tag == 'networks':
-        remote_networks, local_network_names = sync_networks()
-        wait_for_networks_ready(local_network_names)
-    else:
-        # если не networks, но нужны для других этапов
-        remote_networks, local_network_names = None, None
-        if os.path.isdir('networks'):
-            remote_networks, local_network_names = sync_networks()
-    if tag == 'all':
-        sync_resources_and_routes(remote_networks)
-    else:
-        if tag == 'resources':
-            sync_resources_and_routes(remote_networks)
-        if tag == 'routes':
-            sync_resources_and_routes(remote_networks)
-    if tag == 'all' or tag == 'policy':
-        sync_entity_dir('policy')
-    if tag == 'all' or tag == 'cleanup':
-        if remote_networks is None or local_network_names is None:
-            remote_networks, local_network_names = sync_networks()
-        cleanup_all(remote_networks, local_network_names)
+    if not args.plan:
+        confirmed = api.open_journal(args.journal, resume=args.resume)
+        if args.resume:
+            print(f"{YELLOW}Продолжение по журналу: подтверждённых изменений {confirmed}{RESET}")
+        # Продолженный запуск дописывает снимки в тот же файл: откат охватывает обе части
+        api.open_run(args.runs, resume=bool(confirmed))
+    profiler = Profiler(args.profile) if args.profile else None
+    started = time.time()
+    error = None
+    try:
+        run(stages, only, profiler, args.compile_policies)
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if profiler:
+            profiler.finish()
+        if args.report:
+            write_report(args.report, sorted(stages), time.time() - started, error)
+    api.close_journal()
+    if api.close_run():
+        print(f"{YELLOW}Запуск {api.RUN_ID}, откат: python3 netbird.py rollback {api.RUN_ID}{RESET}")
+    stats = api.metrics()
+    if stats.get('throttled'):
+        print(f"{YELLOW}API: ограничений 429/503 — {stats['throttled']}, повторов — {stats['retries']}, "
+              f"параллельность {stats['limit']} (макс. {stats['peak_limit']} из {stats['max_limit']}){RESET}")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,272 @@
+# netbird_daemon.py
+#
+# This script runs the configurator as a long-running reconciler.
+# It keeps the parsed yaml-files and the remote state warm in memory, watches the config
+# directories (polling file mtimes), coalesces bursts of edits and applies only the objects
+# from the changed files. A small local HTTP endpoint triggers or inspects a reconcile.
+#
+# Usage:
+# python3 netbird_daemon.py [--interval 0.5] [--debounce 0.3] [--port 8765]
+# curl http://127.0.0.1:8765/status
+# curl -X POST http://127.0.0.1:8765/reconcile
+# curl -X POST -d '{"files": ["groups/clusters.yaml"]}' http://127.0.0.1:8765/reconcile
+#
+# Version: 1.0.1
+#
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import netbird_api as api
+import netbird_config
+import netbird_configurator as configurator
+
+RED = '\033[91m'
+GREEN = '\033[92m'
+YELLOW = '\033[93m'
+RESET = '\033[0m'
+
+# Какие этапы затрагивает изменение файла в каталоге
+DIR_STAGES = {
+    'groups': {'groups'},
+    'users': {'users'},
+    'dns': {'dns'},
+    'networks': {'networks', 'cleanup'},
+    'resources': {'resources', 'cleanup'},
+    'routes': {'routes', 'cleanup'},
+    'policy': {'policy'},
+}
+
+
+def snapshot():
+    # {(entity, fname): (mtime_ns, size)} по всем yaml-файлам конфигурации
+    files = {}
+    for entity in netbird_config.CONFIG_DIRS:
+        if not os.path.isdir(entity):
+            continue
+        for entry in os.scandir(entity):
+            if entry.is_file() and netbird_config.is_yaml_file(entry.name):
+                st = entry.stat()
+                files[(entity, entry.name)] = (st.st_mtime_ns, st.st_size)
+    return files
+
+
+def changed_files(old, new):
+    return {key for key in old.keys() | new.keys() if old.get(key) != new.get(key)}
+
+
+def plan_for_changes(changed):
+    # (этапы, {entity: {fname, ...}}) для набора изменённых файлов
+    stages = set()
+    files = {}
+    for entity, fname in changed:
+        stages |= DIR_STAGES.get(entity, set())
+        files.setdefault(entity, set()).add(fname)
+    return stages, files
+
+
+def parse_file_keys(paths):
+    # "groups/clusters.yaml" -> ('groups', 'clusters.yaml')
+    keys = set()
+    for path in paths:
+        entity, _, fname = path.strip('/').partition('/')
+        if entity in DIR_STAGES and netbird_config.is_yaml_file(fname):
+            keys.add((entity, fname))
+    return keys
+
+
+class Reconciler:
+    def __init__(self, interval=0.5, debounce=0.3, full_sync_interval=3600, runs_dir=api.RUNS_DIR):
+        self.interval = interval
+        self.runs_dir = runs_dir
+        self.debounce = debounce
+        self.full_sync_interval = full_sync_interval
+        self.cond = threading.Condition()
+        self.pending = set()
+        self.pending_full = False
+        self.last_change = 0
+        self.last_full = 0
+        self.running = False
+        self.reconciles = 0
+        self.last = None
+
+    def request_full(self):
+        with self.cond:
+            self.pending_full = True
+            self.last_change = time.monotonic()
+            self.cond.notify()
+
+    def request_files(self, keys):
+        with self.cond:
+            self.pending |= keys
+            self.last_change = time.monotonic()
+            self.cond.notify()
+
+    def status(self):
+        with self.cond:
+            return {
+                'state': 'running' if self.running else 'idle',
+                'reconciles': self.reconciles,
+                'pending_full': self.pending_full,
+                'pending_files': sorted('/'.join(key) for key in self.pending),
+                'last': self.last,
+                'api': api.metrics(),
+            }
+
+    def watch_loop(self):
+        previous = snapshot()
+        while True:
+            time.sleep(self.interval)
+            try:
+                current = snapshot()
+            except OSError:
+                continue
+            changed = changed_files(previous, current)
+            previous = current
+            if changed:
+                self.request_files(changed)
+
+    def worker_loop(self):
+        while True:
+            with self.cond:
+                # Ждём изменений, затем паузу без новых правок (склеиваем серию сохранений)
+                while not self.pending and not self.pending_full:
+                    timeout = None
+                    if self.full_sync_interval:
+                        timeout = max(0, self.last_full + self.full_sync_interval - time.monotonic())
+                    self.cond.wait(timeout)
+                    if self.full_sync_interval and time.monotonic() - self.last_full >= self.full_sync_interval:
+                        self.pending_full = True
+                while time.monotonic() - self.last_change < self.debounce:
+                    self.cond.wait(self.debounce)
+                full, keys = self.pending_full, self.pending
+                self.pending_full, self.pending = False, set()
+                self.running = True
+            try:
+                self.reconcile(full, keys)
+            finally:
+                with self.cond:
+                    self.running = False
+
+    def reconcile(self, full, keys):
+        started = time.time()
+        if full:
+            # Полная синхронизация заново читает удалённое состояние (на случай изменений вне репозитория)
+            api.clear_cache()
+            stages, files = set(configurator.STAGES), None
+            label = 'all'
+        else:
+            stages, files = plan_for_changes(keys)
+            label = ', '.join(sorted('/'.join(key) for key in keys))
+        print(f"{YELLOW}[DAEMON] reconcile: {label}{RESET}")
+        error = None
+        # Каждый reconcile — отдельный запуск со снимками изменённых объектов (netbird.py rollback <run-id>)
+        run_id = api.open_run(self.runs_dir)
+        try:
+            configurator.run(stages, files if files is None else configurator.Selection(files))
+        except (Exception, SystemExit) as e:
+            error = str(e) or e.__class__.__name__
+            # Состояние могло разойтись с кэшем: следующий запуск перечитает его
+            api.clear_cache()
+            print(f"{RED}[DAEMON] ошибка reconcile: {error}{RESET}")
+        if not api.close_run(complete=error is None):
+            run_id = None
+        duration = time.time() - started
+        if full and error is None:
+            self.last_full = time.monotonic()
+        with self.cond:
+            self.reconciles += 1
+            self.last = {
+                'started': started,
+                'duration': round(duration, 3),
+                'full': full,
+                'stages': sorted(stages),
+                'files': sorted('/'.join(key) for key in keys),
+                'error': error,
+                'run_id': run_id,
+            }
+        if error is None:
+            print(f"{GREEN}[DAEMON] применено за {duration:.2f} с" + (f", запуск {run_id}" if run_id else '') + RESET)
+
+
+def make_handler(reconciler):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, code, obj):
+            body = json.dumps(obj, ensure_ascii=False).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/status':
+                self._send(200, reconciler.status())
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                payload = json.loads(self.rfile.read(length)) if length else {}
+            except ValueError:
+                return self._send(400, {'error': 'invalid json'})
+            if self.path == '/reconcile':
+                keys = parse_file_keys(payload.get('files') or [])
+                if keys:
+                    reconciler.request_files(keys)
+                else:
+                    reconciler.request_full()
+                self._send(202, {'queued': True})
+            elif self.path == '/refresh':
+                api.clear_cache()
+                self._send(200, {'cleared': True})
+            else:
+                self._send(404, {'error': 'not found'})
+
+    return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Netbird: демон синхронизации')
+    parser.add_argument('--root', type=str, default='.', help='Каталог с конфигурацией')
+    parser.add_argument('--interval', type=float, default=0.5, help='Период опроса файлов, с')
+    parser.add_argument('--debounce', type=float, default=0.3, help='Пауза без изменений перед применением, с')
+    parser.add_argument('--full-sync-interval', type=float, default=3600, help='Период полной синхронизации, с (0 — отключить)')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Адрес HTTP-эндпоинта')
+    parser.add_argument('--port', type=int, default=8765, help='Порт HTTP-эндпоинта (0 — отключить)')
+    parser.add_argument('--runs', type=str, default=api.RUNS_DIR, metavar='DIR', help='Каталог снимков изменённых объектов для отката')
+    parser.add_argument('--no-initial-sync', action='store_true', help='Не выполнять полную синхронизацию при старте')
+    args = parser.parse_args(argv)
+
+    os.chdir(args.root)
+    api.configure()
+    api.enable_cache()
+    netbird_config.enable_file_cache()
+
+    reconciler = Reconciler(args.interval, args.debounce, args.full_sync_interval, args.runs)
+    if args.no_initial_sync:
+        reconciler.last_full = time.monotonic()
+    else:
+        reconciler.request_full()
+    if args.port:
+        server = ThreadingHTTPServer((args.host, args.port), make_handler(reconciler))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"{GREEN}[DAEMON] HTTP: http://{args.host}:{server.server_port}{RESET}")
+    threading.Thread(target=reconciler.watch_loop, daemon=True).start()
+    try:
+        reconciler.worker_loop()
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
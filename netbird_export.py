@@ -0,0 +1,255 @@
+# netbird_export.py
+#
+# This script is used to export an existing Netbird account into the local yaml tree
+# (reverse sync). All entity lists and every network's resources and routers are fetched
+# concurrently, ids are translated back to names and the files are written in the layout
+# the configurator and the linter expect. Objects are written to disk one by one.
+#
+# Usage:
+# python3 netbird_export.py [--output DIR] [--force]
+#
+# Version: 1.0.1
+#
+
+import os
+import sys
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import yaml
+
+import netbird_api as api
+import netbird_models
+from netbird_models import ref_id
+
+RED = '\033[91m'
+GREEN = '\033[92m'
+YELLOW = '\033[93m'
+RESET = '\033[0m'
+
+DUMPER = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+TOP_LEVEL = {
+    'groups': '/api/groups',
+    'users': '/api/users',
+    'policies': '/api/policies',
+    'dns': '/api/dns/nameservers',
+    'networks': '/api/networks',
+}
+
+EXPORT_DIRS = ['groups', 'users', 'dns', 'networks', 'resources', 'routes', 'policy']
+
+
+def fetch(path):
+    resp = api.request('GET', path)
+    resp.raise_for_status()
+    return resp.json() or []
+
+
+def ref_names(refs, index):
+    names = []
+    for ref in refs or []:
+        name = index.get(ref_id(ref))
+        if name is None and isinstance(ref, dict):
+            name = ref.get('name')
+        if name is not None:
+            names.append(name)
+    return names
+
+
+def compact(obj):
+    # Пустые поля не переносим в yaml, чтобы файлы оставались похожими на написанные вручную
+    return {k: v for k, v in obj.items() if v is not None and v != [] and v != ''}
+
+
+class YamlListWriter:
+    # Записывает объекты в yaml-файл как элементы списка по одному, не собирая документ в памяти.
+    # Файл создаётся при первой записи: пустые списки файлов не дают.
+    def __init__(self, path):
+        self.path = path
+        self.f = None
+        self.count = 0
+
+    def write(self, obj):
+        if self.f is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.f = open(self.path, 'w')
+        self.f.write(yaml.dump([obj], Dumper=DUMPER, allow_unicode=True, sort_keys=False))
+        self.count += 1
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+
+
+def write_list(path, objs):
+    writer = YamlListWriter(path)
+    for obj in objs:
+        writer.write(obj)
+    writer.close()
+    return writer.count
+
+
+def export_group(group, peer_names):
+    return compact({'name': group['name'], 'peers': ref_names(group.get('peers'), peer_names)})
+
+
+def export_user(user, group_names):
+    return compact({
+        'name': user.get('name'),
+        'email': user.get('email'),
+        'role': user.get('role'),
+        'is_blocked': user.get('is_blocked'),
+        'auto_groups': ref_names(user.get('auto_groups'), group_names),
+    })
+
+
+def export_dns(ns, group_names):
+    return compact({
+        'name': ns['name'],
+        'description': ns.get('description'),
+        'enabled': ns.get('enabled'),
+        'primary': ns.get('primary'),
+        'search_domains_enabled': ns.get('search_domains_enabled'),
+        'domains': ns.get('domains'),
+        'nameservers': [compact({'ip': n.get('ip'), 'ns_type': n.get('ns_type'), 'port': n.get('port')}) for n in ns.get('nameservers') or []],
+        'groups': ref_names(ns.get('groups'), group_names),
+    })
+
+
+def export_resource(resource, group_names):
+    return compact({
+        'name': resource['name'],
+        'description': resource.get('description'),
+        'type': resource.get('type'),
+        'enabled': resource.get('enabled'),
+        'address': resource.get('address'),
+        'groups': ref_names(resource.get('groups'), group_names),
+    })
+
+
+def export_route(router, network_name, idx, group_names, peer_names):
+    # У роутеров в API нет имени: имя нужно только для сопоставления при синхронизации
+    return compact({
+        'name': router.get('name') or f"{network_name}-router-{idx + 1}",
+        'enabled': router.get('enabled'),
+        'metric': router.get('metric'),
+        'masquerade': router.get('masquerade'),
+        'peer': peer_names.get(router.get('peer')),
+        'peer_groups': ref_names(router.get('peer_groups'), group_names),
+    })
+
+
+def export_policy(policy, group_names, resource_names):
+    rules = []
+    for rule in policy.get('rules') or []:
+        out = {
+            'name': rule.get('name'),
+            'description': rule.get('description'),
+            'enabled': rule.get('enabled'),
+            'action': rule.get('action'),
+            'bidirectional': rule.get('bidirectional'),
+            'protocol': rule.get('protocol'),
+            'ports': rule.get('ports'),
+            'port_ranges': [compact({'start': r.get('start'), 'end': r.get('end')}) for r in rule.get('port_ranges') or []],
+            'sources': ref_names(rule.get('sources'), group_names),
+        }
+        resource = rule.get('destinationResource')
+        if isinstance(resource, list):
+            resource = resource[0] if resource else None
+        if resource and resource_names.get(ref_id(resource)):
+            out['destinationResource'] = [resource_names[ref_id(resource)]]
+        else:
+            out['destinations'] = ref_names(rule.get('destinations'), group_names)
+        rules.append(compact(out))
+    return compact({
+        'name': policy['name'],
+        'description': policy.get('description'),
+        'enabled': policy.get('enabled'),
+        'rules': rules,
+    })
+
+
+def safe_file_name(name):
+    # Имя файла resources\routes должно совпадать с именем сети
+    return bool(name) and '/' not in name and '\\' not in name and name not in ('.', '..')
+
+
+def existing_files(output):
+    found = []
+    for entity in EXPORT_DIRS:
+        path = os.path.join(output, entity)
+        if os.path.isdir(path):
+            found.extend(os.path.join(entity, f) for f in os.listdir(path) if f.endswith(('.yaml', '.yml')))
+    return found
+
+
+def export_tree(output='.'):
+    stats = {}
+    with ThreadPoolExecutor(max_workers=api.MAX_WORKERS) as pool:
+        # Из списка пиров (самого большого ответа) нужны только имена: он сразу сворачивается в индекс id -> имя
+        peers = pool.submit(api.get_model, '/api/peers', netbird_models.IdIndex)
+        lists = dict(zip(TOP_LEVEL, pool.map(fetch, TOP_LEVEL.values())))
+        group_names = netbird_models.IdIndex(lists['groups'])
+        peer_names = peers.result()
+
+        # Ресурсы и роутеры сетей запрашиваются параллельно и записываются по мере получения
+        networks = [n for n in lists['networks'] if safe_file_name(n.get('name'))]
+        for n in lists['networks']:
+            if n not in networks:
+                print(f"{YELLOW}Пропускаю сеть с недопустимым для имени файла названием: {n.get('name')}{RESET}")
+        futures = {}
+        for n in networks:
+            for kind in ('resources', 'routers'):
+                futures[pool.submit(fetch, f"/api/networks/{n['id']}/{kind}")] = (n, kind)
+
+        stats['groups'] = write_list(os.path.join(output, 'groups', 'groups.yaml'),
+                                     (export_group(g, peer_names) for g in lists['groups'] if g['name'] != 'All'))
+        stats['users'] = write_list(os.path.join(output, 'users', 'users.yaml'),
+                                    (export_user(u, group_names) for u in lists['users'] if u.get('email') and not u.get('is_service_user')))
+        stats['dns'] = write_list(os.path.join(output, 'dns', 'dns.yaml'),
+                                  (export_dns(ns, group_names) for ns in lists['dns']))
+        for n in networks:
+            path = os.path.join(output, 'networks', f"{n['name']}.yaml")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                yaml.dump(compact({'name': n['name'], 'description': n.get('description')}), f, Dumper=DUMPER, allow_unicode=True, sort_keys=False)
+        stats['networks'] = len(networks)
+
+        resource_names = {}
+        stats['resources'] = stats['routes'] = 0
+        for future in as_completed(futures):
+            n, kind = futures[future]
+            objs = future.result()
+            if kind == 'resources':
+                resource_names.update((r['id'], r['name']) for r in objs)
+                stats['resources'] += write_list(os.path.join(output, 'resources', f"{n['name']}.yaml"),
+                                                 (export_resource(r, group_names) for r in objs))
+            else:
+                stats['routes'] += write_list(os.path.join(output, 'routes', f"{n['name']}.yaml"),
+                                              (export_route(r, n['name'], i, group_names, peer_names) for i, r in enumerate(objs)))
+
+    # Политики ссылаются на ресурсы всех сетей, поэтому записываются последними
+    stats['policy'] = write_list(os.path.join(output, 'policy', 'policies.yaml'),
+                                 (export_policy(p, group_names, resource_names) for p in lists['policies']))
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Netbird: экспорт аккаунта в yaml-файлы')
+    parser.add_argument('--output', type=str, default='.', help='Каталог для конфигурации')
+    parser.add_argument('--force', action='store_true', help='Перезаписать существующие файлы')
+    args = parser.parse_args(argv)
+
+    existing = existing_files(args.output)
+    if existing and not args.force:
+        print(f"{RED}В {args.output} уже есть файлы конфигурации ({len(existing)}), используйте --force{RESET}")
+        sys.exit(1)
+    api.configure()
+    stats = export_tree(args.output)
+    for entity, count in stats.items():
+        print(f"{GREEN}✓{RESET} {entity}: {count}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,443 @@
+# netbird_gc.py
+#
+# This script is used to find remote objects that are no longer needed and to delete them safely.
+# The account is fetched once (all lists, resources and routers of every network, concurrently)
+# and merged with the local tree into one reference graph: a node per object, an edge per
+# reference (policy -> groups and resources, resource and router -> groups and network, router ->
+# peer, dns -> groups, user and setup key -> auto_groups, group -> peers). References are counted
+# in the remote objects and in their local versions alike, so an object stays while either of them
+# uses it.
+# A remote object of a managed entity (its local directory exists) that is absent from the local
+# tree is a candidate; a candidate referenced by anything that stays is blocked, and so is everything
+# a blocked object references. The rest is ordered into waves (objects before what they reference):
+# every wave is deleted in parallel. Resources and routers of a deleted network go with the network.
+# The same pass reports unused objects: groups nothing references, peers in no group, networks
+# without resources.
+#
+# Usage:
+# python3 netbird_gc.py                   # план удаления и неиспользуемые объекты
+# python3 netbird_gc.py --apply           # выполнить план
+# python3 netbird_gc.py --json gc.json
+#
+# Version: 1.0.1
+#
+
+import os
+import sys
+import json
+import argparse
+
+import netbird_api as api
+import netbird_config
+import netbird_models
+from netbird_config import CONFIG_DIRS, iter_items, network_name, object_key, as_list
+from netbird_configurator import (run_parallel, fetch_network_state, plan_routes, delete_network_object,
+                                  report_delete)
+from netbird_impact import references, ALL_GROUP
+from netbird_models import ref_id
+
+RED = '\033[91m'
+GREEN = '\033[92m'
+YELLOW = '\033[93m'
+RESET = '\033[0m'
+
+TOP_LEVEL = {
+    'groups': '/api/groups',
+    'users': '/api/users',
+    'policy': '/api/policies',
+    'dns': '/api/dns/nameservers',
+    'networks': '/api/networks',
+    'peers': '/api/peers',
+    'setup_keys': '/api/setup-keys',
+    'legacy_routes': '/api/routes',
+}
+# Списки, которых может не быть в API (старые и новые версии управления): 404 — пустой список
+OPTIONAL = {'setup_keys', 'legacy_routes'}
+
+# Порядок удаления внутри волны и в отчёте: сначала то, что ссылается, потом то, на что ссылаются
+DELETABLE = ['policy', 'routes', 'resources', 'dns', 'networks', 'groups']
+NETWORK_CHILDREN = ('resources', 'routes')
+REPORT_LIMIT = 20
+
+
+class Node:
+    __slots__ = ('entity', 'name', 'id', 'network', 'remote', 'local', 'protected', 'refs', 'referrers')
+
+    def __init__(self, entity, name):
+        self.entity = entity
+        self.name = name        # resources\routes: <сеть>/<имя>
+        self.id = None
+        self.network = None
+        self.remote = False
+        self.local = False
+        self.protected = False
+        self.refs = set()
+        self.referrers = set()
+
+    def short_name(self):
+        return self.name.split('/', 1)[1] if self.entity in NETWORK_CHILDREN else self.name
+
+    def label(self):
+        return f"{self.entity}: {self.name}"
+
+
+class RefGraph:
+    # Объекты аккаунта и локального дерева: (entity, name) -> Node. Ссылки из API разрешаются
+    # по id, ссылки из yaml — по имени; ссылки на несуществующие объекты (ошибки линтера) не учитываются
+    def __init__(self):
+        self.nodes = {}
+        self.by_id = {}            # (entity, id) -> key
+        self.resource_names = {}   # имя ресурса -> [key] (в yaml ресурсы указываются без сети)
+
+    def add(self, entity, name, obj_id=None, network=None):
+        key = (entity, name)
+        node = self.nodes.get(key)
+        if node is None:
+            node = self.nodes[key] = Node(entity, name)
+            if entity == 'resources':
+                self.resource_names.setdefault(node.short_name(), []).append(key)
+        if obj_id is not None:
+            node.id = obj_id
+            node.remote = True
+            self.by_id[(entity, obj_id)] = key
+        if network is not None:
+            node.network = network
+        return node
+
+    def link(self, src, dst):
+        if dst is None or dst == src or dst not in self.nodes:
+            return
+        self.nodes[src].refs.add(dst)
+        self.nodes[dst].referrers.add(src)
+
+    def link_ids(self, src, entity, refs):
+        for ref in as_list(refs):
+            self.link(src, self.by_id.get((entity, ref_id(ref))))
+
+    def link_names(self, src, refs):
+        for entity, name in refs:
+            if entity == 'resources':
+                for key in self.resource_names.get(name, ()):
+                    self.link(src, key)
+            else:
+                self.link(src, (entity, name))
+
+
+def fetch(item):
+    entity, path = item
+    resp = api.request('GET', path)
+    if entity in OPTIONAL and resp.status_code == 404:
+        return entity, []
+    resp.raise_for_status()
+    return entity, resp.json() or []
+
+
+def fetch_account():
+    # Один проход по API: все списки, затем ресурсы и роутеры всех сетей — параллельно
+    lists = dict(run_parallel(fetch, TOP_LEVEL.items()))
+    networks = {n['name']: n for n in lists['networks'] if n.get('name')}
+    return lists, networks, fetch_network_state(networks, networks.keys())
+
+
+def router_name(network, router):
+    return f"{network}/{router.get('name') or router['id']}"
+
+
+def add_remote(g, lists, network_state):
+    for p in lists['peers']:
+        g.add('peers', p.get('name') or p['id'], p['id'])
+    for grp in lists['groups']:
+        # All и группы, выданные не через API (JWT, интеграции), не удаляются
+        g.add('groups', grp['name'], grp['id']).protected = grp['name'].upper() == 'ALL' or grp.get('issued') not in (None, 'api')
+    for entity, key in (('policy', 'name'), ('dns', 'name'), ('networks', 'name'), ('users', 'email')):
+        for obj in lists[entity]:
+            if obj.get(key):
+                g.add(entity, obj[key], obj['id'])
+    for k in lists['setup_keys']:
+        g.add('setup_keys', k.get('name') or k['id'], k['id'])
+    for r in lists['legacy_routes']:
+        g.add('legacy_routes', r.get('network_id') or r['id'], r['id'])
+    for network, state in network_state.items():
+        for r in state['resources']:
+            if r and r.get('name'):
+                g.add('resources', f"{network}/{r['name']}", r['id'], network)
+        for r in state['routers']:
+            if r and 'id' in r:
+                g.add('routes', router_name(network, r), r['id'], network)
+    # Ссылки удалённых объектов
+    for grp in lists['groups']:
+        g.link_ids(('groups', grp['name']), 'peers', grp.get('peers'))
+    for p in lists['policy']:
+        key = ('policy', p.get('name'))
+        for rule in p.get('rules') or []:
+            g.link_ids(key, 'groups', as_list(rule.get('sources')) + as_list(rule.get('destinations')))
+            for ref in as_list(rule.get('sourceResource')) + as_list(rule.get('destinationResource')):
+                g.link(key, g.by_id.get(('resources', ref_id(ref))) or g.by_id.get(('peers', ref_id(ref))))
+    for ns in lists['dns']:
+        g.link_ids(('dns', ns.get('name')), 'groups', ns.get('groups'))
+    for u in lists['users']:
+        g.link_ids(('users', u.get('email')), 'groups', u.get('auto_groups'))
+    for k in lists['setup_keys']:
+        g.link_ids(('setup_keys', k.get('name') or k['id']), 'groups', k.get('auto_groups'))
+    for r in lists['legacy_routes']:
+        key = ('legacy_routes', r.get('network_id') or r['id'])
+        g.link_ids(key, 'groups', as_list(r.get('groups')) + as_list(r.get('peer_groups')) + as_list(r.get('access_control_groups')))
+        g.link_ids(key, 'peers', r.get('peer'))
+    for network, state in network_state.items():
+        for r in state['resources']:
+            if r and r.get('name'):
+                key = ('resources', f"{network}/{r['name']}")
+                g.link_ids(key, 'groups', r.get('groups'))
+                g.link(key, ('networks', network))
+        for r in state['routers']:
+            if r and 'id' in r:
+                key = ('routes', router_name(network, r))
+                g.link_ids(key, 'groups', r.get('peer_groups'))
+                g.link_ids(key, 'peers', r.get('peer'))
+                g.link(key, ('networks', network))
+
+
+def local_key(entity, fname, idx, obj, route_keys):
+    if entity == 'routes':
+        return route_keys.get((network_name(fname), idx), ('routes', f"{network_name(fname)}/{obj.get('name')}"))
+    name = object_key(entity, obj)
+    if not name:
+        return None
+    return (entity, f"{network_name(fname)}/{name}" if entity == 'resources' else name)
+
+
+def local_route_keys(tree, network_state, group_ids):
+    # Локальные роуты сопоставляются с роутерами так же, как при синхронизации (RouterIndex)
+    files = {network_name(fname): items for fname, items in tree.get('routes', {}).items()}
+    configs = {network: [c for c in items if isinstance(c, dict)] for network, items in files.items()}
+    state = {'networks': network_state, 'routes': configs, 'group_ids': group_ids}
+    keys = {}
+    for network, (pairs, unmatched) in plan_routes(state).items():
+        # Позиции в файле (как у iter_items), а не в списке только объектов
+        positions = [idx for idx, c in enumerate(files.get(network, [])) if isinstance(c, dict)]
+        for idx, (config, found) in zip(positions, pairs):
+            if found:
+                keys[(network, idx)] = ('routes', router_name(network, found))
+    return keys
+
+
+def add_local(g, tree, route_keys):
+    keys = []
+    for entity in CONFIG_DIRS:
+        for fname, idx, obj in iter_items(tree, entity):
+            key = local_key(entity, fname, idx, obj, route_keys)
+            if key is None:
+                continue
+            node = g.add(*key, network=network_name(fname) if entity in NETWORK_CHILDREN else None)
+            node.local = True
+            keys.append((key, entity, fname, obj))
+    for key, entity, fname, obj in keys:
+        g.link_names(key, references(entity, fname, obj))
+        if entity == 'groups':
+            # peers_match не раскрывается: синхронизация записывает найденных пиров в состав группы в аккаунте
+            g.link_names(key, (('peers', p) for p in as_list(obj.get('peers'))))
+        elif entity == 'routes' and obj.get('peer'):
+            g.link(key, ('peers', obj['peer']))
+
+
+def build_graph(lists, network_state, tree):
+    g = RefGraph()
+    add_remote(g, lists, network_state)
+    route_keys = local_route_keys(tree, network_state, netbird_models.NameIndex(lists['groups']))
+    add_local(g, tree, route_keys)
+    return g
+
+
+def managed_entities(root='.'):
+    # Удаляются только сущности, каталог которых есть в локальной конфигурации
+    return {entity for entity in DELETABLE if os.path.isdir(os.path.join(root, entity))}
+
+
+def plan(g, managed):
+    nodes = g.nodes
+    networks = {key[1] for key, n in nodes.items() if key[0] == 'networks' and n.remote and not n.local and 'networks' in managed}
+    # Кандидаты: удалённые объекты, которых нет в локальной конфигурации. Ресурсы и роутеры удаляемой сети —
+    # вместе с ней, даже если их каталоги не ведутся локально
+    candidates = {key for key, n in nodes.items() if n.remote and not n.local and not n.protected and n.entity in DELETABLE
+                  and (n.entity in managed or n.entity in NETWORK_CHILDREN and n.network in networks)}
+    # Заблокированы кандидаты, на которые ссылается то, что остаётся, и всё, на что ссылаются заблокированные
+    blocked = {}
+    queue = []
+    for key in candidates:
+        by = next((ref for ref in nodes[key].referrers if ref not in candidates), None)
+        if by is not None:
+            blocked[key] = by
+            queue.append(key)
+    while queue:
+        key = queue.pop()
+        for ref in nodes[key].refs:
+            if ref in candidates and ref not in blocked:
+                blocked[ref] = key
+                queue.append(ref)
+    deletable = candidates - blocked.keys()
+
+    def owner(key):
+        node = nodes[key]
+        if node.entity in NETWORK_CHILDREN and ('networks', node.network) in deletable:
+            return ('networks', node.network)
+        return key
+
+    # Волны (Kahn): объект удаляется после всех удаляемых объектов, которые на него ссылаются
+    after = {}
+    cascade = {}
+    for key in deletable:
+        own = owner(key)
+        after.setdefault(own, set())
+        if own != key:
+            cascade[own] = cascade.get(own, 0) + 1
+    dependents = {}
+    for key in deletable:
+        own = owner(key)
+        for ref in nodes[key].referrers:
+            if ref in deletable and owner(ref) != own:
+                after[own].add(owner(ref))
+                dependents.setdefault(owner(ref), set()).add(own)
+    remaining = {key: len(deps) for key, deps in after.items()}
+    wave = [key for key, n in remaining.items() if n == 0]
+    waves = []
+    while wave:
+        waves.append(sorted(wave, key=lambda k: (DELETABLE.index(k[0]), k[1])))
+        following = []
+        for key in wave:
+            del remaining[key]
+            for dep in dependents.get(key, ()):
+                remaining[dep] -= 1
+                if remaining[dep] == 0:
+                    following.append(dep)
+        wave = following
+    for key in remaining:
+        # Циклических ссылок между удаляемыми объектами в API быть не должно: такие объекты не трогаем
+        blocked[key] = next(iter(after[key] & remaining.keys()))
+    deleted = {key for key in deletable if owner(key) not in remaining}
+    return {'waves': waves, 'after': after, 'cascade': cascade, 'blocked': blocked, 'deleted': deleted}
+
+
+def find_unused(g, deleted):
+    # Неиспользуемые объекты среди остающихся; ссылки удаляемых объектов не учитываются
+    def live_referrers(node, entities=None):
+        return [ref for ref in node.referrers if ref not in deleted and (entities is None or ref[0] in entities)
+                and ref != ('groups', ALL_GROUP)]
+    unused = {'groups': [], 'peers': [], 'networks': []}
+    for key, node in g.nodes.items():
+        if key in deleted:
+            continue
+        if node.entity == 'groups' and not node.protected and not live_referrers(node):
+            unused['groups'].append(node.name)
+        elif node.entity == 'peers' and not live_referrers(node, ('groups', 'routes', 'legacy_routes')):
+            unused['peers'].append(node.name)
+        elif node.entity == 'networks' and not live_referrers(node, ('resources',)):
+            unused['networks'].append(node.name)
+    return {kind: sorted(names) for kind, names in unused.items()}
+
+
+def reason(g, by):
+    node = g.nodes[by]
+    where = 'в локальной конфигурации' if node.local else 'в аккаунте'
+    return f"{node.label()} ({where})"
+
+
+def analyze(root='.'):
+    lists, networks, network_state = fetch_account()
+    tree = netbird_config.load_config_tree(root)
+    g = build_graph(lists, network_state, tree)
+    result = plan(g, managed_entities(root))
+    result['unused'] = find_unused(g, result['deleted'])
+    result['graph'] = g
+    result['stats'] = {'objects': len(g.nodes), 'remote': sum(n.remote for n in g.nodes.values()),
+                       'local': sum(n.local for n in g.nodes.values()),
+                       'references': sum(len(n.refs) for n in g.nodes.values())}
+    return result
+
+
+def to_json(result):
+    g = result['graph']
+    return {
+        'stats': result['stats'],
+        'waves': [[{'entity': k[0], 'name': k[1], 'id': g.nodes[k].id, 'cascade': result['cascade'].get(k, 0)} for k in wave]
+                  for wave in result['waves']],
+        'blocked': [{'entity': k[0], 'name': k[1], 'referenced_by': reason(g, by)} for k, by in sorted(result['blocked'].items())],
+        'unused': result['unused'],
+    }
+
+
+def print_plan(result):
+    g = result['graph']
+    stats = result['stats']
+    print(f"Объектов: {stats['objects']} (в аккаунте {stats['remote']}, в локальной конфигурации {stats['local']}), "
+          f"ссылок: {stats['references']}")
+    total = sum(len(wave) for wave in result['waves'])
+    print(f"\n{GREEN}План удаления: {total} объектов, волн: {len(result['waves'])}{RESET}")
+    for i, wave in enumerate(result['waves'], 1):
+        print(f"  волна {i} ({len(wave)}):")
+        for key in wave:
+            cascade = result['cascade'].get(key)
+            print(f"    {RED}-{RESET} {g.nodes[key].label()}" + (f" (вместе с ресурсами и роутерами: {cascade})" if cascade else ''))
+    if result['blocked']:
+        print(f"\n{YELLOW}Нет в локальной конфигурации, но используются ({len(result['blocked'])}):{RESET}")
+        for key, by in sorted(result['blocked'].items()):
+            print(f"    {g.nodes[key].label()} <- {reason(g, by)}")
+    titles = {'groups': 'Группы без ссылок', 'peers': 'Пиры вне групп', 'networks': 'Сети без ресурсов'}
+    for kind, names in result['unused'].items():
+        if not names:
+            continue
+        shown = ', '.join(names[:REPORT_LIMIT])
+        more = f" и ещё {len(names) - REPORT_LIMIT}" if len(names) > REPORT_LIMIT else ''
+        print(f"\n{YELLOW}{titles[kind]} ({len(names)}):{RESET} {shown}{more}")
+
+
+def delete_node(g, key):
+    # Только запрос: вызывается из потоков run_parallel, результат печатает apply_plan
+    node = g.nodes[key]
+    if node.entity in NETWORK_CHILDREN:
+        network_id = g.nodes[('networks', node.network)].id
+        return delete_network_object('resources' if node.entity == 'resources' else 'routers', node.id, network_id)
+    api_entity = {'policy': 'policies', 'dns': 'dns/nameservers'}.get(node.entity, node.entity)
+    return api.request('DELETE', f"/api/{api_entity}/{node.id}")
+
+
+def apply_plan(result):
+    # Волны выполняются по очереди, объекты волны — параллельно. Если объект не удалён, то, на что он
+    # ссылается, не удаляется (API отклонит удаление используемого объекта)
+    g = result['graph']
+    failed = set()
+    deleted = 0
+    for wave in result['waves']:
+        ready = [key for key in wave if not result['after'][key] & failed]
+        failed.update(key for key in wave if key not in ready)
+        for key, resp in zip(ready, run_parallel(lambda key: delete_node(g, key), ready)):
+            if report_delete(g.nodes[key].entity, resp, g.nodes[key].name):
+                deleted += 1
+            else:
+                failed.add(key)
+    return deleted, len(failed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Netbird: неиспользуемые объекты и план их удаления')
+    parser.add_argument('--apply', action='store_true', help='Выполнить план удаления (по умолчанию только показать)')
+    parser.add_argument('--json', type=str, default=None, metavar='FILE', help='Записать план и неиспользуемые объекты в JSON')
+    args = parser.parse_args(argv)
+    api.configure()
+    result = analyze()
+    print_plan(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(to_json(result), f, ensure_ascii=False, indent=2)
+    if not args.apply:
+        if result['waves']:
+            print(f"\n{YELLOW}Для удаления запустите с --apply{RESET}")
+        return
+    deleted, failed = apply_plan(result)
+    print(f"\n{GREEN}Удалено: {deleted}{RESET}")
+    if failed:
+        print(f"{RED}Не удалено: {failed}{RESET}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+# netbird_impact.py
+#
+# This script is used to estimate the blast radius of a configuration change.
+# It builds a reverse reference index from the parsed config (group -> policies, resources,
+# routes, dns and users that reference it; resource -> policies; network -> resources and
+# routes; group -> peers) and walks it from the changed objects only.
+# Changed objects come from a list of files or from a git revision range; with git the old
+# and new versions of every changed file are compared object by object.
+#
+# Usage:
+# python3 netbird_impact.py groups/clusters.yaml
+# python3 netbird_impact.py --git HEAD~1..HEAD
+# python3 netbird_impact.py --git origin/main --only-args
+#
+# Version: 1.0.1
+#
+
+import os
+import sys
+import json
+import argparse
+import shlex
+import subprocess
+
+import netbird_config
+from netbird_config import CONFIG_DIRS, iter_items, network_name, object_key, as_list
+from netbird_configurator import SELECTOR_ENTITIES
+
+RED = '\033[91m'
+YELLOW = '\033[93m'
+GREEN = '\033[92m'
+RESET = '\033[0m'
+
+ALL_GROUP = 'All'
+
+# Обратное отображение для аргументов --only конфигуратора: groups -> group
+SELECTOR_NAMES = {entity: kind for kind, entity in SELECTOR_ENTITIES.items()}
+
+
+def references(entity, fname, obj):
+    # Ссылки объекта на другие объекты: (entity, name)
+    refs = set()
+    if entity == 'users':
+        refs.update(('groups', g) for g in as_list(obj.get('auto_groups')))
+    elif entity in ('dns', 'resources'):
+        refs.update(('groups', g) for g in as_list(obj.get('groups')))
+    if entity == 'routes':
+        refs.update(('groups', g) for g in as_list(obj.get('peer_groups')))
+    if entity in ('resources', 'routes'):
+        refs.add(('networks', network_name(fname)))
+    if entity == 'policy':
+        for rule in as_list(obj.get('rules')):
+            if not isinstance(rule, dict):
+                continue
+            refs.update(('groups', g) for g in as_list(rule.get('sources')) + as_list(rule.get('destinations')))
+            # destinationResource может указывать как на ресурс, так и на группу
+            for name in as_list(rule.get('destinationResource')):
+                refs.add(('resources', name))
+                refs.add(('groups', name))
+    return refs
+
+
+class ReferenceIndex:
+    def __init__(self, tree):
+        self.objects = {}     # (entity, name) -> obj
+        self.files = {}       # (entity, name) -> fname
+        self.refs = {}        # (entity, name) -> {(entity, name), ...}
+        self.referrers = {}   # (entity, name) -> {(entity, name), ...}
+        self.group_peers = {}
+        for entity in CONFIG_DIRS:
+            for fname, idx, obj in iter_items(tree, entity):
+                name = object_key(entity, obj)
+                if not name:
+                    continue
+                key = (entity, name)
+                self.objects[key] = obj
+                self.files[key] = fname
+                self.refs[key] = references(entity, fname, obj)
+                for ref in self.refs[key]:
+                    self.referrers.setdefault(ref, set()).add(key)
+                if entity == 'groups':
+                    self.group_peers.setdefault(name, set()).update(as_list(obj.get('peers')))
+
+    def peers_of(self, group):
+        if group == ALL_GROUP:
+            return set().union(*self.group_peers.values()) if self.group_peers else set()
+        return self.group_peers.get(group, set())
+
+
+def changed_objects(old_tree, new_tree):
+    # Объекты, добавленные, удалённые или изменённые в файлах, которые есть в old_tree/new_tree
+    changed, removed = set(), set()
+    for entity in CONFIG_DIRS:
+        old_files = old_tree.get(entity, {})
+        new_files = new_tree.get(entity, {})
+        for fname in old_files.keys() | new_files.keys():
+            old = {object_key(entity, o): o for o in old_files.get(fname, []) if isinstance(o, dict)}
+            new = {object_key(entity, o): o for o in new_files.get(fname, []) if isinstance(o, dict)}
+            for name in old.keys() | new.keys():
+                if name and old.get(name) != new.get(name):
+                    changed.add((entity, name))
+                    if name not in new:
+                        removed.add((entity, name))
+    return changed, removed
+
+
+def impact(index, changed, old_index=None):
+    # Обход только от изменённых объектов: время пропорционально размеру затронутого множества
+    indexes = [index] + ([old_index] if old_index else [])
+    affected = set(changed)
+    queue = list(changed)
+    while queue:
+        key = queue.pop()
+        for idx in indexes:
+            for ref in idx.referrers.get(key, ()):
+                if ref not in affected:
+                    affected.add(ref)
+                    queue.append(ref)
+    # Пиры: участники изменённых групп (старый и новый состав) и групп, на которые ссылаются затронутые объекты
+    peers = set()
+    for key in affected:
+        groups = {key[1]} if key[0] == 'groups' else set()
+        for idx in indexes:
+            groups.update(name for entity, name in idx.refs.get(key, ()) if entity == 'groups')
+        for group in groups:
+            for idx in indexes:
+                peers.update(idx.peers_of(group))
+    return affected, peers
+
+
+def git(*args):
+    return subprocess.run(['git'] + list(args), capture_output=True, text=True, check=True).stdout
+
+
+def git_show(rev, path):
+    proc = subprocess.run(['git', 'show', f"{rev}:{path}"], capture_output=True, text=True)
+    return proc.stdout if proc.returncode == 0 else None
+
+
+def split_path(path):
+    entity, _, fname = path.partition('/')
+    if entity in CONFIG_DIRS and '/' not in fname and netbird_config.is_yaml_file(fname):
+        return entity, fname
+    return None
+
+
+def load_file_version(rev, path):
+    # rev=None — рабочая копия
+    if rev is None:
+        return netbird_config.parse_yaml_file(path) if os.path.isfile(path) else None
+    text = git_show(rev, path)
+    return netbird_config.parse_yaml_docs(text) if text is not None else None
+
+
+def trees_from_git(rev_range):
+    # 'A..B' — сравнение ревизий, 'A' — ревизия против рабочей копии
+    old_rev, _, new_rev = rev_range.partition('..')
+    new_rev = new_rev or None
+    args = ['diff', '--name-only', '--relative', old_rev] + ([new_rev] if new_rev else []) + ['--'] + CONFIG_DIRS
+    old_tree, new_tree = {}, {}
+    for path in git(*args).splitlines():
+        parts = split_path(path)
+        if parts is None:
+            continue
+        entity, fname = parts
+        for tree, rev in ((old_tree, old_rev), (new_tree, new_rev)):
+            items = load_file_version(rev, path)
+            if items is not None:
+                tree.setdefault(entity, {})[fname] = items
+    return old_tree, new_tree
+
+
+def analyze(paths=None, rev_range=None):
+    # Индекс строится по рабочей копии (в CI она совпадает с конечной ревизией диапазона)
+    index = ReferenceIndex(netbird_config.load_config_tree())
+    old_index = None
+    if rev_range:
+        old_tree, new_tree = trees_from_git(rev_range)
+        changed, removed = changed_objects(old_tree, new_tree)
+        old_index = ReferenceIndex(old_tree)
+    else:
+        # Без истории все объекты указанных файлов считаются изменёнными
+        new_tree = {}
+        for path in paths or []:
+            parts = split_path(path.strip('/'))
+            if parts is None:
+                raise ValueError(f"не файл конфигурации: {path}")
+            entity, fname = parts
+            new_tree.setdefault(entity, {})[fname] = netbird_config.load_yaml_file(path)
+        changed, removed = changed_objects({}, new_tree)
+    affected, peers = impact(index, changed, old_index)
+    return {
+        'changed': group_keys(changed),
+        'removed': group_keys(removed),
+        'affected': group_keys(affected - changed),
+        'peers': sorted(peers),
+        'only': [f"{SELECTOR_NAMES[entity]}:{name}" for entity, name in sorted(affected - removed)],
+    }
+
+
+def group_keys(keys):
+    result = {}
+    for entity, name in sorted(keys):
+        result.setdefault(entity, []).append(name)
+    return result
+
+
+def print_result(result):
+    for title, key in (('Изменённые объекты', 'changed'), ('Удалённые объекты', 'removed'), ('Затронутые объекты', 'affected')):
+        entities = result[key]
+        if not entities:
+            continue
+        print(f"{GREEN}{title} ({sum(len(v) for v in entities.values())}):{RESET}")
+        for entity, names in entities.items():
+            print(f"  {entity}: {', '.join(names)}")
+    print(f"{GREEN}Затронутые пиры ({len(result['peers'])}):{RESET} {', '.join(result['peers']) or '-'}")
+    if result['removed']:
+        print(f"{YELLOW}Удаление объектов применяется полной синхронизацией (этап cleanup){RESET}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Netbird: объекты и пиры, затронутые изменением')
+    parser.add_argument('files', nargs='*', help='Изменённые файлы (groups/clusters.yaml ...)')
+    parser.add_argument('--git', type=str, default=None, metavar='RANGE', help='Диапазон ревизий (HEAD~1..HEAD) или ревизия для сравнения с рабочей копией')
+    parser.add_argument('--json', action='store_true', help='Вывод в формате JSON')
+    parser.add_argument('--only-args', action='store_true', help='Вывести аргументы --only для конфигуратора')
+    args = parser.parse_args(argv)
+    if not args.files and not args.git:
+        parser.error('укажите файлы или --git')
+
+    try:
+        result = analyze(args.files, args.git)
+    except (ValueError, subprocess.CalledProcessError) as e:
+        print(f"{RED}{getattr(e, 'stderr', None) or e}{RESET}")
+        sys.exit(1)
+    if args.only_args:
+        print(" ".join(f"--only {shlex.quote(selector)}" for selector in result["only"]))
+    elif args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_result(result)
+
+
+if __name__ == '__main__':
+    main()
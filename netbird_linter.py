@@ -1,126 +1,72 @@
 # netbird_linter.py
 #
 # This script is used to lint the Netbird configuration files.
-# It can be used to check for duplicates, empty groups in policies, and other issues.
+# It can be used to check for duplicates, empty groups in policies, required keys and field
+# types of every entity (netbird_schema), and other issues.
 #
 # Usage:
 # python3 netbird_linter.py
 #
 # Version: 1.0.1
 #
-import os
 import sys
-import yaml
+import argparse
+
+from netbird_access import AccessMatrix
+from netbird_cidr import resource_cidr_index, find_address_problems
+from netbird_config import load_config_tree, iter_items, object_key
+from netbird_selectors import SelectorSet, group_selectors
+from netbird_schema import validate_tree, ERROR
+from netbird_profile import Profiler, null_stage
 
 RED = '\033[91m'
 YELLOW = '\033[93m'
 GREEN = '\033[92m'
 RESET = '\033[0m'
 
-def check_duplicates_in_dir(entity):
+def check_duplicates_in_dir(tree, entity):
     seen = {}
     duplicates = []
-    if not os.path.isdir(entity):
-        return []
-    for fname in os.listdir(entity):
-        if fname.endswith('.yaml') or fname.endswith('.yml'):
-            with open(os.path.join(entity, fname), 'r') as f:
-                try:
-                    configs = list(yaml.safe_load_all(f))
-                except Exception as e:
-                    print(f"{RED}[LINTER ERROR]{RESET} Ошибка парсинга {fname}: {e}")
-                    sys.exit(1)
-                for doc in configs:
-                    if isinstance(doc, list):
-                        for idx, item in enumerate(doc):
-                            key = item.get('email') if entity == 'users' else item.get('name')
-                            if key:
-                                if key in seen:
-                                    prev = seen[key]
-                                    duplicates.append({
-                                        'name': key,
-                                        'file1': prev['file'],
-                                        'line1': prev['line'],
-                                        'file2': fname,
-                                        'line2': idx + 1
-                                    })
-                                else:
-                                    seen[key] = {'file': fname, 'line': idx + 1}
-                    elif isinstance(doc, dict):
-                        key = doc.get('email') if entity == 'users' else doc.get('name')
-                        if key:
-                            if key in seen:
-                                prev = seen[key]
-                                duplicates.append({
-                                    'name': key,
-                                    'file1': prev['file'],
-                                    'line1': prev['line'],
-                                    'file2': fname,
-                                    'line2': 1
-                                })
-                            else:
-                                seen[key] = {'file': fname, 'line': 1}
+    for fname, idx, item in iter_items(tree, entity):
+        key = object_key(entity, item)
+        if not key:
+            continue
+        if key in seen:
+            prev = seen[key]
+            duplicates.append({
+                'name': key,
+                'file1': prev['file'],
+                'line1': prev['line'],
+                'file2': fname,
+                'line2': idx + 1
+            })
+        else:
+            seen[key] = {'file': fname, 'line': idx + 1}
     return duplicates
 
-def check_empty_groups_in_policies():
+def check_empty_groups_in_policies(tree):
     warnings = []
     # Собираем все группы из groups
     groups_data = {}
-    if os.path.isdir('groups'):
-        for fname in os.listdir('groups'):
-            if fname.endswith('.yaml') or fname.endswith('.yml'):
-                with open(os.path.join('groups', fname), 'r') as f:
-                    try:
-                        configs = list(yaml.safe_load_all(f))
-                    except Exception:
-                        continue
-                    for doc in configs:
-                        if isinstance(doc, list):
-                            for g in doc:
-                                if g and 'name' in g:
-                                    groups_data[g['name']] = g
-                        elif isinstance(doc, dict) and 'name' in doc:
-                            groups_data[doc['name']] = doc
+    for fname, idx, g in iter_items(tree, 'groups'):
+        if 'name' in g:
+            groups_data[g['name']] = g
     # Собираем группы из users.yaml
     users_groups = set()
-    users_path = os.path.join('groups', 'users.yaml')
-    if os.path.isfile(users_path):
-        with open(users_path, 'r') as f:
-            try:
-                configs = list(yaml.safe_load_all(f))
-            except Exception:
-                configs = []
-            for doc in configs:
-                if isinstance(doc, list):
-                    for u in doc:
-                        # если это user с auto_groups
-                        for g in u.get('auto_groups', []):
-                            users_groups.add(g)
-                        # если это группа (name)
-                        if 'name' in u:
-                            users_groups.add(u['name'])
-                elif isinstance(doc, dict):
-                    for g in doc.get('auto_groups', []):
-                        users_groups.add(g)
-                    if 'name' in doc:
-                        users_groups.add(doc['name'])
+    for u in tree.get('groups', {}).get('users.yaml', []):
+        if not isinstance(u, dict):
+            continue
+        # если это user с auto_groups
+        for g in u.get('auto_groups', []):
+            users_groups.add(g)
+        # если это группа (name)
+        if 'name' in u:
+            users_groups.add(u['name'])
     # Проверяем все policy
-    if os.path.isdir('policy'):
-        for fname in os.listdir('policy'):
-            if fname == 'users.yaml':
-                continue
-            if fname.endswith('.yaml') or fname.endswith('.yml'):
-                with open(os.path.join('policy', fname), 'r') as f:
-                    try:
-                        configs = list(yaml.safe_load_all(f))
-                    except Exception:
-                        continue
-                    for doc in configs:
-                        if isinstance(doc, list):
-                            for p in doc:
-                                _check_policy_groups(p, groups_data, warnings, fname, users_groups)
-                        elif isinstance(doc, dict):
-                            _check_policy_groups(doc, groups_data, warnings, fname, users_groups)
+    for fname, idx, p in iter_items(tree, 'policy'):
+        if fname == 'users.yaml':
+            continue
+        _check_policy_groups(p, groups_data, warnings, fname, users_groups)
     return warnings
 
 def _check_policy_groups(policy, groups_data, warnings, fname, users_groups):
@@ -135,21 +81,49 @@ def _check_policy_groups(policy, groups_data, warnings, fname, users_groups):
                     group = groups_data.get(group_name)
                     if group is not None:
                         peers = group.get('peers', [])
-                        if not peers:
+                        if not peers and not group.get('peers_match'):
                             warnings.append(f"{YELLOW}[LINTER WARNING]{RESET} Группа '{group_name}' из policy ({fname}) не содержит пиров")
 
-def main():
+def check_schema(tree):
+    # Обязательные поля, типы и допустимые значения по схемам netbird_schema
+    errors, warnings = [], []
+    for issue in validate_tree(tree):
+        if issue.level == ERROR:
+            errors.append(f"{RED}[LINTER ERROR]{RESET} {issue.location()}: {issue.message}")
+        else:
+            warnings.append(f"{YELLOW}[LINTER WARNING]{RESET} {issue.location()}: {issue.message}")
+    return errors, warnings
+
+def check_selector_errors(tree):
+    # Синтаксис peers_match: шаблоны, регулярные выражения, поля условий
     errors = []
-    for entity in ['groups', 'policy', 'users', 'dns']:
-        dups = check_duplicates_in_dir(entity)
-        for d in dups:
-            errors.append(
-                f"{RED}[LINTER ERROR]{RESET} Дубликат '{d['name']}'\n"
-                f"  Папка: {entity}\n"
-                f"  1: {d['file1']} (элемент {d['line1']})\n"
-                f"  2: {d['file2']} (элемент {d['line2']})"
-            )
-    warnings = check_empty_groups_in_policies()
+    for group, entries in group_selectors(g for fname, idx, g in iter_items(tree, 'groups')).items():
+        try:
+            SelectorSet({group: entries})
+        except ValueError as e:
+            errors.append(f"{RED}[LINTER ERROR]{RESET} peers_match: {e}")
+    return errors
+
+def check_access_problems(tree):
+    # Ссылки политик на несуществующие группы/ресурсы и ресурсы без роутов
+    engine = AccessMatrix(tree)
+    return [f"{YELLOW}[LINTER WARNING]{RESET} {problem}" for problem in engine.problems]
+
+def check_address_problems(tree):
+    # Дубликаты и перекрытия CIDR ресурсов/роутов между сетями
+    index = resource_cidr_index(tree)
+    return [f"{YELLOW}[LINTER WARNING]{RESET} {problem}" for problem in find_address_problems(index)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Netbird Linter')
+    parser.add_argument('--profile', type=str, nargs='?', const='profile', default=None, metavar='DIR', help='Профилировать этапы: pstats и collapsed-стеки в DIR (по умолчанию profile)')
+    args = parser.parse_args(argv)
+    profiler = Profiler(args.profile) if args.profile else None
+    try:
+        errors, warnings = lint(profiler.stage if profiler else null_stage)
+    finally:
+        if profiler:
+            profiler.finish()
     if errors:
         for err in errors:
             print(err)
@@ -159,5 +133,37 @@ def main():
             print(warn)
     print(f"{GREEN}[LINTER ADVICE]{RESET}: ошибок нет.")
 
+def lint(stage=null_stage):
+    # Файлы разбираются один раз: все проверки работают по одному дереву конфигурации
+    errors = []
+    with stage('load'):
+        parse_errors = []
+        tree = load_config_tree(errors=parse_errors)
+    for path, e in parse_errors:
+        errors.append(f"{RED}[LINTER ERROR]{RESET} Ошибка парсинга {path}: {e}")
+    with stage('duplicates'):
+        for entity in ['groups', 'policy', 'users', 'dns']:
+            dups = check_duplicates_in_dir(tree, entity)
+            for d in dups:
+                errors.append(
+                    f"{RED}[LINTER ERROR]{RESET} Дубликат '{d['name']}'\n"
+                    f"  Папка: {entity}\n"
+                    f"  1: {d['file1']} (элемент {d['line1']})\n"
+                    f"  2: {d['file2']} (элемент {d['line2']})"
+                )
+    with stage('empty-groups'):
+        warnings = check_empty_groups_in_policies(tree)
+    with stage('schema'):
+        schema_errors, schema_warnings = check_schema(tree)
+        errors += schema_errors
+        warnings += schema_warnings
+    with stage('selectors'):
+        errors += check_selector_errors(tree)
+    with stage('access'):
+        warnings += check_access_problems(tree)
+    with stage('addresses'):
+        warnings += check_address_problems(tree)
+    return errors, warnings
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,189 @@
+# netbird_models.py
+#
+# This module holds compact in-memory models for entity lists fetched from the Netbird API.
+# Raw responses are lists of dicts in which every object repeats the ids and names of what
+# it references (a group lists {id, name, ...} of each member peer). The models keep only
+# the fields the tools use: strings are interned once in a shared symbol table, records use
+# __slots__, and group membership is an array of integer peer indexes.
+#
+# Usage:
+# import netbird_models
+# groups = api.get_model('/api/groups', netbird_models.NameIndex)
+# groups.resolve(['admins', 'devs'])        # -> [id, id]
+# inventory = netbird_models.Inventory(peers_json, groups_json)
+#
+# Version: 1.0.1
+#
+
+import sys
+from array import array
+
+
+def ref_id(ref):
+    # Ссылка в ответе API — либо id, либо объект с id
+    return ref.get('id') if isinstance(ref, dict) else ref
+
+
+class SymbolTable:
+    # Общая таблица строк: каждая строка хранится один раз, ссылки на неё — целые индексы
+    __slots__ = ('strings', 'index')
+
+    def __init__(self):
+        self.strings = []
+        self.index = {}
+
+    def add(self, value):
+        i = self.index.get(value)
+        if i is None:
+            if isinstance(value, str):
+                value = sys.intern(value)
+            i = len(self.strings)
+            self.strings.append(value)
+            self.index[value] = i
+        return i
+
+    def intern(self, value):
+        return self.strings[self.add(value)] if value is not None else None
+
+    def lookup(self, value):
+        return self.index.get(value)
+
+    def __getitem__(self, i):
+        return self.strings[i]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class NameIndex:
+    # Ключ -> id по списку сущностей: всё, что синхронизации нужно из ответа API
+    __slots__ = ('ids',)
+    KEY = 'name'
+
+    def __init__(self, objs, symbols=None):
+        symbols = symbols or SymbolTable()
+        self.ids = {}
+        for o in objs or []:
+            if isinstance(o, dict) and o.get(self.KEY) is not None and 'id' in o:
+                self.ids[symbols.intern(o[self.KEY])] = symbols.intern(o['id'])
+
+    def get(self, key, default=None):
+        return self.ids.get(key, default)
+
+    def __getitem__(self, key):
+        return self.ids[key]
+
+    def __contains__(self, key):
+        return key in self.ids
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def names(self):
+        return set(self.ids)
+
+    def resolve(self, keys):
+        # id найденных ключей в исходном порядке, ненайденные пропускаются
+        return [self.ids[k] for k in keys if k in self.ids]
+
+
+class EmailIndex(NameIndex):
+    # Пользователи: email -> id
+    __slots__ = ()
+    KEY = 'email'
+
+
+class IdIndex(NameIndex):
+    # id -> имя: перевод ссылок из ответа API обратно в имена
+    __slots__ = ()
+
+    def __init__(self, objs, symbols=None):
+        symbols = symbols or SymbolTable()
+        self.ids = {}
+        for o in objs or []:
+            if isinstance(o, dict) and o.get(self.KEY) is not None and 'id' in o:
+                self.ids[symbols.intern(o['id'])] = symbols.intern(o[self.KEY])
+
+
+class MemberIndex(NameIndex):
+    # Группы: имя -> frozenset id пиров (для сравнения состава с локальной конфигурацией)
+    __slots__ = ()
+
+    def __init__(self, objs, symbols=None):
+        symbols = symbols or SymbolTable()
+        self.ids = {}
+        for o in objs or []:
+            if isinstance(o, dict) and o.get(self.KEY) is not None:
+                self.ids[symbols.intern(o[self.KEY])] = frozenset(symbols.intern(ref_id(p)) for p in o.get('peers') or [])
+
+
+class Peer:
+    __slots__ = ('id', 'name', 'ip', 'dns_label', 'hostname', 'os')
+
+    def __init__(self, id, name, ip=None, dns_label=None, hostname=None, os=None):
+        self.id = id
+        self.name = name
+        self.ip = ip
+        self.dns_label = dns_label
+        self.hostname = hostname
+        self.os = os
+
+    def __repr__(self):
+        return f"Peer({self.name!r}, {self.ip!r})"
+
+
+class Group:
+    __slots__ = ('id', 'name', 'members')
+
+    def __init__(self, id, name, members):
+        self.id = id
+        self.name = name
+        self.members = members  # array('I') индексов в Inventory.peers
+
+    def __repr__(self):
+        return f"Group({self.name!r}, {len(self.members)} peers)"
+
+
+class Inventory:
+    # Пиры и группы аккаунта. Индекс пира — его позиция в self.peers; состав группы хранится
+    # как array('I') индексов (4 байта на участника) вместо списка объектов {id, name, ...}
+    def __init__(self, peers_json, groups_json=()):
+        self.symbols = SymbolTable()
+        self.peers = []
+        self.peer_index = {}
+        self.groups = {}
+        for p in peers_json or []:
+            if not isinstance(p, dict) or 'id' not in p:
+                continue
+            peer = Peer(self.symbols.intern(p['id']), self.symbols.intern(p.get('name')),
+                        self.symbols.intern(p.get('ip')), self.symbols.intern(p.get('dns_label')),
+                        self.symbols.intern(p.get('hostname')), self.symbols.intern(p.get('os')))
+            self.peer_index[peer.id] = len(self.peers)
+            self.peers.append(peer)
+        for g in groups_json or []:
+            if isinstance(g, dict) and 'id' in g and g.get('name') is not None:
+                self.add_group(g['id'], g['name'], (ref_id(ref) for ref in g.get('peers') or []))
+
+    def add_group(self, id, name, peer_ids):
+        members = array('I', (self.peer_index[p] for p in peer_ids if p in self.peer_index))
+        group = Group(self.symbols.intern(id), self.symbols.intern(name), members)
+        self.groups[group.name] = group
+        return group
+
+    def peer_names(self):
+        return {p.id: p.name for p in self.peers}
+
+    def group_peers(self, name):
+        group = self.groups.get(name)
+        return [self.peers[i] for i in group.members] if group else []
+
+    def members_mask(self, name):
+        # Состав группы как битовая маска по индексам пиров (для пересечений и объединений групп)
+        mask = 0
+        group = self.groups.get(name)
+        for i in (group.members if group else ()):
+            mask |= 1 << i
+        return mask
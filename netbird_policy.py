@@ -0,0 +1,311 @@
+# netbird_policy.py
+#
+# This script is used to compile policy rules into a smaller equivalent rule set before apply.
+# Every enabled accept rule is expanded into edges (service, source group, destination group
+# or resource); edges already covered by a broader one are dropped (source All, protocol all,
+# a port set that contains the other), rules whose edges are all covered by other rules are
+# removed, and the remaining edges are regrouped: sources with the same destinations share
+# one rule, and a pair of mirrored rules becomes one bidirectional rule.
+# Rules are merged only inside one policy, so policy names and ids stay the same. Disabled and
+# drop rules, and rules the compiler does not model, are passed through unchanged.
+# The result is checked twice: edge by edge (including ports) and against the access matrix
+# (netbird_access) at peer/user level; a policy that fails a check is left as written.
+#
+# Usage:
+# python3 netbird_policy.py             # отчёт: правил до и после по каждой политике
+# python3 netbird_policy.py --show      # скомпилированные политики в yaml
+# python3 netbird_configurator.py --compile-policies
+#
+# Version: 1.0.1
+#
+
+import sys
+import json
+import argparse
+
+import yaml
+
+from netbird_access import AccessMatrix, PROTOCOLS, ALL_GROUP, iter_bits
+from netbird_config import load_config_tree, as_list
+
+RED = '\033[91m'
+YELLOW = '\033[93m'
+GREEN = '\033[92m'
+RESET = '\033[0m'
+
+# Поля правила, которые учитывает компилятор; правила с другими полями не изменяются
+RULE_KEYS = {'name', 'description', 'enabled', 'action', 'bidirectional', 'protocol', 'ports', 'port_ranges',
+             'sources', 'destinations', 'destinationResource'}
+
+
+def rule_service(rule):
+    # (protocol, порты, диапазоны портов); пустые порты — любой порт
+    ports = frozenset(str(p) for p in as_list(rule.get('ports')))
+    ranges = frozenset((r.get('start'), r.get('end')) for r in as_list(rule.get('port_ranges')) if isinstance(r, dict))
+    return rule.get('protocol', 'all'), ports, ranges
+
+
+def service_covers(a, b):
+    # Правило со службой a разрешает всё, что разрешает правило со службой b
+    if a == b:
+        return True
+    a_any = not a[1] and not a[2]
+    if a[0] == 'all' and a_any:
+        return True
+    return a[0] == b[0] and (a_any or (bool(b[1] or b[2]) and b[1] <= a[1] and b[2] <= a[2]))
+
+
+def optimizable(rule):
+    if not isinstance(rule, dict) or not set(rule) <= RULE_KEYS:
+        return False
+    if not rule.get('enabled', True) or rule.get('action', 'accept') != 'accept':
+        return False
+    if rule.get('protocol', 'all') not in PROTOCOLS or not as_list(rule.get('sources')):
+        return False
+    destinations, resources = as_list(rule.get('destinations')), as_list(rule.get('destinationResource'))
+    # Конфигуратор передаёт в API только первый ресурс правила: такие правила не трогаем
+    return bool(destinations) != bool(resources) and len(resources) <= 1
+
+
+def rule_edges(rule):
+    # Ребро: (служба, источник, 'g'|'r', назначение, bidirectional для ресурсов)
+    service = rule_service(rule)
+    sources = as_list(rule.get('sources'))
+    edges = set()
+    for dst in as_list(rule.get('destinations')):
+        for src in sources:
+            edges.add((service, src, 'g', dst, None))
+            if rule.get('bidirectional'):
+                edges.add((service, dst, 'g', src, None))
+    for dst in as_list(rule.get('destinationResource')):
+        for src in sources:
+            edges.add((service, src, 'r', dst, bool(rule.get('bidirectional'))))
+    return edges
+
+
+def edge_index(edges):
+    index = {}
+    for service, src, kind, dst, flag in edges:
+        index.setdefault((kind, dst, flag), []).append((service, src))
+    return index
+
+
+def edge_covered(edge, index, strict=False):
+    # Источник All включает всех пиров; назначение All не расширяется (ресурсы групп в него не входят)
+    service, src, kind, dst, flag = edge
+    for other_service, other_src in index.get((kind, dst, flag), ()):
+        if strict and (other_service, other_src) == (service, src):
+            continue
+        if (other_src == src or other_src == ALL_GROUP) and service_covers(other_service, service):
+            return True
+    return False
+
+
+def all_covered(edges, others):
+    index = edge_index(others)
+    return all(edge_covered(e, index) for e in edges)
+
+
+def drop_redundant(rules):
+    # Правило удаляется, если всё, что оно разрешает, разрешают остальные оставшиеся правила
+    kept = list(rules)
+    for rule, edges in sorted(rules, key=lambda item: len(item[1])):
+        others = set()
+        for other, other_edges in kept:
+            if other is not rule:
+                others |= other_edges
+        if all_covered(edges, others):
+            kept = [item for item in kept if item[0] is not rule]
+    return kept
+
+
+def minimal_edges(edges):
+    index = edge_index(edges)
+    return {e for e in edges if not edge_covered(e, index, strict=True)}
+
+
+def new_rule(template, service, sources, bidirectional, destinations=None, resource=None):
+    protocol, ports, ranges = service
+    rule = {'name': template['name']}
+    if template.get('description'):
+        rule['description'] = template['description']
+    rule.update(enabled=True, action='accept', bidirectional=bidirectional, protocol=protocol)
+    if ports:
+        rule['ports'] = sorted(ports, key=lambda p: (len(p), p))
+    if ranges:
+        rule['port_ranges'] = [{'start': start, 'end': end} for start, end in sorted(ranges, key=str)]
+    rule['sources'] = sorted(sources)
+    if resource is not None:
+        rule['destinationResource'] = [resource]
+    else:
+        rule['destinations'] = sorted(destinations)
+    return rule
+
+
+def regroup(kept):
+    # Правила из рёбер: источники с одинаковым набором назначений объединяются, зеркальные пары
+    # (S -> D и D -> S) становятся одним bidirectional правилом
+    origin = {}
+    for pos, (rule, edges) in enumerate(kept):
+        for edge in edges:
+            origin.setdefault(edge, pos)
+    edges = minimal_edges(set(origin))
+    groups, resources = {}, {}
+    for edge in edges:
+        service, src, kind, dst, flag = edge
+        if kind == 'g':
+            groups.setdefault(service, {}).setdefault(src, set()).add(dst)
+        else:
+            resources.setdefault((service, dst, flag), set()).add(src)
+
+    def first(service, srcs, kind, dsts, flag=None):
+        return min(origin.get((service, s, kind, d, flag), len(kept)) for s in srcs for d in dsts)
+
+    result = []
+    for service, out in groups.items():
+        candidates = {}
+        for src, dsts in out.items():
+            candidates.setdefault(frozenset(dsts), set()).add(src)
+        pairs = {(frozenset(srcs), dsts) for dsts, srcs in candidates.items()}
+        done = set()
+        for srcs, dsts in sorted(pairs, key=lambda p: (sorted(p[0]), sorted(p[1]))):
+            if (srcs, dsts) in done:
+                continue
+            mirrored = (dsts, srcs) in pairs
+            done.update({(srcs, dsts), (dsts, srcs)} if mirrored else {(srcs, dsts)})
+            pos = first(service, srcs, 'g', dsts)
+            result.append((pos, service, srcs, mirrored or srcs == dsts, dsts, None))
+    for (service, dst, flag), srcs in resources.items():
+        result.append((first(service, srcs, 'r', [dst], flag), service, srcs, flag, None, dst))
+    result.sort(key=lambda item: (item[0], sorted(item[2])))
+    rules, names = [], set()
+    for pos, service, srcs, bidirectional, dsts, resource in result:
+        rule = new_rule(kept[min(pos, len(kept) - 1)][0], service, srcs, bidirectional, dsts, resource)
+        name, n = rule['name'], 2
+        while rule['name'] in names:
+            rule['name'] = f"{name}-{n}"
+            n += 1
+        names.add(rule['name'])
+        rules.append(rule)
+    return rules
+
+
+def compile_rules(rules):
+    # Возвращает (правила, проверка рёбер пройдена)
+    rules = as_list(rules)
+    passthrough = [r for r in rules if not optimizable(r)]
+    candidates = [(r, rule_edges(r)) for r in rules if optimizable(r)]
+    if not candidates:
+        return rules, True
+    kept = drop_redundant(candidates)
+    compiled = regroup(kept)
+    if len(compiled) >= len(kept):
+        compiled = [rule for rule, edges in kept]
+    if len(passthrough) + len(compiled) >= len(rules):
+        return rules, True
+    before = set().union(*(edges for rule, edges in candidates))
+    after = set().union(*(rule_edges(r) for r in compiled))
+    if not (all_covered(before, after) and all_covered(after, before)):
+        return rules, False
+    # Неизменённые правила идут первыми в исходном порядке, затем скомпилированные
+    return passthrough + compiled, True
+
+
+def principal_reach(matrix):
+    # Что доступно участнику, входящему в группу g (и, как любой пир, в All), по каждому protocol
+    result = {}
+    for protocol in (None,) + PROTOCOLS:
+        for name in matrix.groups:
+            gmask = 1 | (1 << matrix.group_index[name])
+            g, r = matrix.reach(gmask, protocol)
+            result[(protocol, name)] = ({matrix.groups[i] for i in iter_bits(g)},
+                                        {matrix.resources[i]['name'] for i in iter_bits(r)})
+    return result
+
+
+def equivalent(tree, compiled_tree):
+    # Совпадение эффективного доступа на уровне пиров/пользователей (все они входят в All).
+    # Списки групп-источников в who-can-reach могут сократиться: доступ через All перекрывает частные правила.
+    # Группа, на которую больше не ссылается ни одно правило, в матрице отсутствует: её участникам доступно то же, что All.
+    before = principal_reach(AccessMatrix(tree))
+    after = principal_reach(AccessMatrix(compiled_tree))
+
+    def get(reach, key):
+        return reach.get(key, reach.get((key[0], ALL_GROUP), (set(), set())))
+
+    return all(get(before, k) == get(after, k) for k in before.keys() | after.keys())
+
+
+def compile_tree(tree):
+    # Возвращает (скомпилированное дерево, отчёт); отчёт: [{policy, file, before, after, status}]
+    report = []
+    policy_files = {}
+    for fname, items in tree.get('policy', {}).items():
+        compiled_items = []
+        for obj in items:
+            if not isinstance(obj, dict) or 'name' not in obj:
+                compiled_items.append(obj)
+                continue
+            rules = as_list(obj.get('rules'))
+            compiled, ok = compile_rules(rules)
+            entry = {'policy': obj['name'], 'file': fname, 'before': len(rules), 'after': len(compiled),
+                     'status': 'compiled' if len(compiled) < len(rules) else ('unchanged' if ok else 'check-failed')}
+            report.append(entry)
+            compiled_items.append(dict(obj, rules=compiled) if entry['status'] == 'compiled' else obj)
+        policy_files[fname] = compiled_items
+    compiled_tree = dict(tree, policy=policy_files)
+    if not equivalent(tree, compiled_tree):
+        # Не должно случаться: проверка по рёбрам строже матрицы. Применяется исходная конфигурация.
+        for entry in report:
+            if entry['status'] == 'compiled':
+                entry.update(status='check-failed', after=entry['before'])
+        return tree, report
+    return compiled_tree, report
+
+
+def compiled_policies(tree):
+    # {имя политики: скомпилированная политика} только для изменившихся политик
+    compiled_tree, report = compile_tree(tree)
+    changed = {e['policy'] for e in report if e['status'] == 'compiled'}
+    result = {}
+    for items in compiled_tree.get('policy', {}).values():
+        for obj in items:
+            if isinstance(obj, dict) and obj.get('name') in changed:
+                result[obj['name']] = obj
+    return result, report
+
+
+def print_report(report):
+    before = sum(e['before'] for e in report)
+    after = sum(e['after'] for e in report)
+    for e in report:
+        if e['status'] == 'compiled':
+            print(f"{GREEN}✓{RESET} {e['policy']} ({e['file']}): {e['before']} -> {e['after']} правил")
+        elif e['status'] == 'check-failed':
+            print(f"{RED}✗{RESET} {e['policy']} ({e['file']}): проверка эквивалентности не пройдена, правила не изменены")
+    saved = f" (-{(before - after) * 100 // before}%)" if before else ''
+    print(f"{GREEN}Правил: {before} -> {after}{saved}{RESET}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Netbird: оптимизация правил политик')
+    parser.add_argument('--show', action='store_true', help='Вывести скомпилированные политики в yaml')
+    parser.add_argument('--json', action='store_true', help='Отчёт в формате JSON')
+    args = parser.parse_args(argv)
+
+    tree = load_config_tree()
+    compiled_tree, report = compile_tree(tree)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+    if args.show:
+        for fname, items in compiled_tree.get('policy', {}).items():
+            print(f"\n# policy/{fname}")
+            print(yaml.safe_dump(items, allow_unicode=True, sort_keys=False), end='')
+    if any(e['status'] == 'check-failed' for e in report):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
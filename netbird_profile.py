@@ -0,0 +1,157 @@
+# netbird_profile.py
+#
+# This module is the --profile hook shared by the configurator, the linter and the visualizer.
+# Every stage is profiled separately: cProfile of the calling thread goes to <stage>.pstats,
+# a sampler over all threads writes collapsed stacks (<stage>.collapsed) ready for
+# flamegraph.pl / speedscope. Wall time is split into network wait (time inside
+# netbird_api.send), YAML parsing (yaml.safe_load / safe_load_all) and process CPU time.
+#
+# Usage:
+# profiler = Profiler('profile')
+# with profiler.stage('groups'):
+#     ...
+# profiler.finish()
+#
+# Version: 1.0.1
+#
+
+import os
+import sys
+import json
+import time
+import cProfile
+import threading
+from contextlib import contextmanager, nullcontext
+
+GREEN = '\033[92m'
+RESET = '\033[0m'
+
+
+def null_stage(name):
+    return nullcontext()
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    # Снимки стеков всех потоков с заданным интервалом; cProfile видит только текущий поток,
+    # а запросы к API выполняются в пуле
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.counts = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path, prefix):
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{prefix};{stack} {count}\n")
+
+
+class Profiler:
+    def __init__(self, output_dir='profile', interval=0.005):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._totals = {'network': 0.0, 'network_calls': 0, 'yaml': 0.0, 'yaml_calls': 0}
+        self._originals = []
+        os.makedirs(output_dir, exist_ok=True)
+        self._install()
+
+    def _timed(self, category, func, materialize=False):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                # safe_load_all возвращает генератор: разбор происходит при итерации
+                return list(result) if materialize else result
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self._totals[category] += elapsed
+                    self._totals[f"{category}_calls"] += 1
+        return wrapper
+
+    def _patch(self, module, name, category, materialize=False):
+        original = getattr(module, name)
+        self._originals.append((module, name, original))
+        setattr(module, name, self._timed(category, original, materialize))
+
+    def _install(self):
+        import yaml
+        self._patch(yaml, 'safe_load', 'yaml')
+        self._patch(yaml, 'safe_load_all', 'yaml', materialize=True)
+        if 'netbird_api' in sys.modules:
+            self._patch(sys.modules['netbird_api'], 'send', 'network')
+
+    def _uninstall(self):
+        for module, name, original in reversed(self._originals):
+            setattr(module, name, original)
+        self._originals = []
+
+    @contextmanager
+    def stage(self, name):
+        with self._lock:
+            before = dict(self._totals)
+        profile = cProfile.Profile()
+        sampler = StackSampler(self.interval)
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        sampler.start()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            sampler.stop()
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            with self._lock:
+                delta = {k: self._totals[k] - before[k] for k in self._totals}
+            fname = name.replace('/', '_')
+            profile.dump_stats(os.path.join(self.output_dir, f"{fname}.pstats"))
+            sampler.write(os.path.join(self.output_dir, f"{fname}.collapsed"), fname)
+            self.stages[name] = {
+                'wall': round(wall, 4),
+                # Сумма по всем потокам: при параллельных запросах может превышать wall
+                'network': round(delta['network'], 4),
+                'network_calls': delta['network_calls'],
+                'yaml': round(delta['yaml'], 4),
+                'yaml_calls': delta['yaml_calls'],
+                # CPU процесса (все потоки), включая разбор YAML
+                'cpu': round(cpu, 4),
+                'cpu_python': round(max(cpu - delta['yaml'], 0), 4),
+            }
+
+    def finish(self):
+        self._uninstall()
+        with open(os.path.join(self.output_dir, 'summary.json'), 'w') as f:
+            json.dump(self.stages, f, ensure_ascii=False, indent=2)
+        print(f"\n{GREEN}=== PROFILE ({self.output_dir}) ==={RESET}")
+        print(f"{'stage':<18} {'wall':>8} {'network':>8} {'calls':>6} {'yaml':>8} {'cpu':>8}")
+        for name, s in self.stages.items():
+            print(f"{name:<18} {s['wall']:8.3f} {s['network']:8.3f} {s['network_calls']:6} {s['yaml']:8.3f} {s['cpu_python']:8.3f}")
@@ -0,0 +1,258 @@
+# netbird_rollback.py
+#
+# This script is used to roll back an applied run of the configurator.
+# Every run keeps the pre-image of each object it updated or deleted (taken from the lists the
+# run had already fetched) and the ids of the objects it created (see netbird_api: open_run).
+# Rollback needs no GET requests: deleted objects are created again (groups and networks first,
+# so later objects can reference their new ids), updated objects are put back in their previous
+# state, then the objects created by the run are deleted (policies first, groups last).
+# Each step runs in parallel through the same adaptive request path as the configurator, so the
+# time depends on the number of touched objects, not on the size of the account.
+#
+# Usage:
+# python3 netbird_rollback.py --list
+# python3 netbird_rollback.py 20261019-120501-3fa2 [--plan]
+#
+# Version: 1.0.1
+#
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import netbird_api as api
+from netbird_configurator import run_parallel, response_object
+from netbird_models import ref_id
+
+RED = '\033[91m'
+GREEN = '\033[92m'
+YELLOW = '\033[93m'
+RESET = '\033[0m'
+
+# Порядок пересоздания: объекты, на которые ссылаются, раньше ссылающихся; удаление — в обратном порядке
+LEVELS = ['groups', 'posture-checks', 'networks', 'resources', 'routers', 'dns', 'routes', 'setup-keys', 'policies', 'users']
+
+# Поля ответа API со ссылками на объекты ({id, name, ...} или id): в теле запроса передаются только id
+REF_FIELDS = {'peers', 'groups', 'auto_groups', 'peer_groups', 'sources', 'destinations', 'access_control_groups',
+              'source_posture_checks'}
+# Вычисляемые поля ответа, которых нет в теле запроса (routers, policies — id в ответе по сети)
+READ_ONLY = {'id', 'peers_count', 'resources_count', 'routing_peers_count', 'issued', 'last_login', 'is_current',
+             'status', 'permissions', 'routers', 'policies'}
+
+
+def level(path):
+    # /api/groups/1 -> groups, /api/networks/1/resources/2 -> resources, /api/dns/nameservers/1 -> dns
+    parts = path.strip('/').split('/')
+    kind = parts[3] if parts[1] == 'networks' and len(parts) > 3 else parts[1]
+    return LEVELS.index(kind) if kind in LEVELS else len(LEVELS)
+
+
+def remap(value, id_map):
+    return id_map.get(value, value)
+
+
+def remap_path(path, id_map):
+    return '/'.join(remap(part, id_map) for part in path.split('/'))
+
+
+def request_body(obj, id_map):
+    # Объект из ответа GET -> тело PUT/POST; id пересозданных объектов заменяются новыми
+    body = {}
+    for key, value in obj.items():
+        if key in READ_ONLY:
+            continue
+        if key in REF_FIELDS and isinstance(value, list):
+            value = [remap(ref_id(ref), id_map) for ref in value]
+        elif key == 'rules' and isinstance(value, list):
+            value = [request_body(rule, id_map) if isinstance(rule, dict) else rule for rule in value]
+        elif key in ('sourceResource', 'destinationResource') and isinstance(value, dict):
+            value = dict(value, id=remap(value.get('id'), id_map))
+        elif key == 'resources' and isinstance(value, list):
+            # У группы — ссылки {id, type}, у сети — вычисляемый список id её ресурсов
+            if not value or any(not isinstance(r, dict) for r in value):
+                continue
+            value = [dict(r, id=remap(r.get('id'), id_map)) for r in value]
+        elif key == 'peer' and isinstance(value, str):
+            value = remap(value, id_map)
+        body[key] = value
+    return body
+
+
+def load_run(runs_dir, run_id):
+    # {путь объекта: {'object': снимок или None, 'created': bool, 'deleted': bool}} в порядке первой записи
+    path = api.run_file(runs_dir, run_id)
+    if not os.path.exists(path):
+        raise ValueError(f"запуск {run_id} не найден в {runs_dir}")
+    objects = {}
+    complete = False
+    for entry in api.read_journal(path):
+        kind = entry.get('kind')
+        if kind == 'preimage':
+            # Снимок пишется до запроса; удалённым объект считается только по записи deleted после ответа 2xx
+            objects.setdefault(entry['path'], {'object': entry.get('object'), 'created': False, 'deleted': False})
+        elif kind == 'created':
+            objects.setdefault(entry['path'], {'object': None, 'created': True, 'deleted': False})
+        elif kind == 'deleted' and entry['path'] in objects:
+            objects[entry['path']]['deleted'] = True
+        elif kind == 'complete':
+            complete = True
+    return objects, complete
+
+
+def plan_rollback(objects):
+    # (пересоздать по уровням, вернуть прежнее состояние, удалить созданные по уровням, без снимка)
+    recreate, restore, delete, missing = {}, [], {}, []
+    for path, item in objects.items():
+        if item['created']:
+            if not item['deleted']:
+                delete.setdefault(level(path), []).append(path)
+        elif item['object'] is None:
+            missing.append(path)
+        elif item['deleted']:
+            recreate.setdefault(level(path), []).append((path, item['object']))
+        else:
+            restore.append((path, item['object']))
+    return ([recreate[k] for k in sorted(recreate)], restore,
+            [delete[k] for k in sorted(delete, reverse=True)], missing)
+
+
+def describe(path, obj=None):
+    name = (obj or {}).get('name') or (obj or {}).get('email')
+    return f"{path} ({name})" if name else path
+
+
+def ok_status(resp):
+    return resp.status_code < 400
+
+
+def load_progress(runs_dir, run_id):
+    # {путь: новый id или None} — шаги прерванного или частично неудачного отката, выполненные успешно
+    path = progress_file(runs_dir, run_id)
+    if not os.path.exists(path):
+        return {}
+    return {entry['path']: entry.get('new_id') for entry in api.read_journal(path)}
+
+
+def rollback(objects, done=None, progress=None):
+    # done — выполненные ранее шаги (load_progress): повторный запуск выполняет только оставшиеся;
+    # progress — файл, куда дописываются успешные шаги
+    done = done or {}
+    objects = {path: item for path, item in objects.items() if path not in done}
+    recreate, restore, delete, missing = plan_rollback(objects)
+    # id объектов, пересозданных прошлым запуском отката: /api/groups/<старый id> -> новый id
+    id_map = {path.rsplit('/', 1)[1]: new_id for path, new_id in done.items() if new_id}
+    stats = {'recreated': 0, 'restored': 0, 'deleted': 0, 'errors': 0, 'missing': len(missing), 'skipped': len(done)}
+    for path in missing:
+        print(f"{YELLOW}Нет снимка объекта (список не был получен до записи): {path}{RESET}")
+
+    # Потоки только отправляют запросы и возвращают (путь, объект, ответ); вывод — из основного потока
+    def create(item):
+        path, obj = item
+        collection = remap_path(path.rsplit('/', 1)[0], id_map)
+        return path, obj, api.request('POST', collection, request_body(obj, id_map))
+
+    def put(item):
+        path, obj = item
+        return path, obj, api.request('PUT', remap_path(path, id_map), request_body(obj, id_map))
+
+    def remove(path):
+        return path, None, api.request('DELETE', remap_path(path, id_map))
+
+    def report(counter, action, results):
+        for path, obj, resp in results:
+            if ok_status(resp):
+                print(f"{GREEN}✓{RESET} {action}: {describe(path, obj)}")
+                stats[counter] += 1
+                created = response_object(resp) if counter == 'recreated' else None
+                if created:
+                    id_map[obj['id']] = created['id']
+                if progress is not None:
+                    progress.write(json.dumps({'path': path, 'new_id': created['id'] if created else None}) + '\n')
+                    progress.flush()
+            else:
+                print(f"{RED}✗{RESET} Ошибка ({action}) {describe(path, obj)}: {resp.status_code} {resp.text}")
+                stats['errors'] += 1
+
+    # Уровни выполняются по очереди (id пересозданных групп и сетей нужны следующим), объекты уровня — параллельно
+    for items in recreate:
+        report('recreated', 'пересоздан', run_parallel(create, items))
+    report('restored', 'восстановлен', run_parallel(put, restore))
+    for paths in delete:
+        report('deleted', 'удалён созданный', run_parallel(remove, paths))
+    return stats
+
+
+def print_runs(runs_dir):
+    runs = api.list_runs(runs_dir)
+    if not runs:
+        print(f"Запусков со снимками нет в {runs_dir}")
+        return
+    for run_id in runs:
+        objects, complete = load_run(runs_dir, run_id)
+        state = 'завершён' if complete else 'не завершён'
+        rolled_back = ', откачен' if os.path.exists(rollback_file(runs_dir, run_id)) else ''
+        print(f"{run_id}  объектов: {len(objects):>5}  {state}{rolled_back}")
+
+
+def rollback_file(runs_dir, run_id):
+    # Отметка о полностью выполненном откате
+    return os.path.join(runs_dir, f"{run_id}.rollback.json")
+
+
+def progress_file(runs_dir, run_id):
+    return os.path.join(runs_dir, f"{run_id}.rollback.jsonl")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Netbird: откат применённого запуска по снимкам объектов')
+    parser.add_argument('run_id', nargs='?', help='id запуска (выводится конфигуратором и демоном, см. --list)')
+    parser.add_argument('--runs', type=str, default=api.RUNS_DIR, metavar='DIR', help='Каталог снимков запусков')
+    parser.add_argument('--list', action='store_true', help='Показать запуски со снимками')
+    parser.add_argument('--plan', action='store_true', help='Показать изменения без применения')
+    args = parser.parse_args(argv)
+    if args.list:
+        print_runs(args.runs)
+        return
+    if not args.run_id:
+        parser.error('укажите id запуска или --list')
+    if os.path.exists(rollback_file(args.runs, args.run_id)):
+        # Повторный откат удалил бы пересозданные объекты как созданные запуском
+        print(f"{RED}Запуск {args.run_id} уже откачен: {rollback_file(args.runs, args.run_id)}{RESET}")
+        sys.exit(1)
+    try:
+        objects, complete = load_run(args.runs, args.run_id)
+    except ValueError as e:
+        print(f"{RED}{e}{RESET}")
+        sys.exit(1)
+    if not complete:
+        print(f"{YELLOW}Запуск {args.run_id} не завершён: откатываются только записанные в нём изменения{RESET}")
+    done = load_progress(args.runs, args.run_id)
+    if done:
+        print(f"{YELLOW}Продолжение отката: выполненных шагов {len(done)}{RESET}")
+    api.configure(dry_run=args.plan)
+    started = time.time()
+    progress = None if args.plan else open(progress_file(args.runs, args.run_id), 'a')
+    try:
+        stats = rollback(objects, done, progress)
+    finally:
+        if progress is not None:
+            progress.close()
+    duration = time.time() - started
+    print(f"--- ОТКАТ {args.run_id} ---")
+    print(f"Пересоздано: {stats['recreated']}, восстановлено: {stats['restored']}, удалено созданных: {stats['deleted']} "
+          f"за {duration:.2f} с")
+    if stats['missing']:
+        print(f"{YELLOW}Без снимка: {stats['missing']}{RESET}")
+    if stats['errors']:
+        print(f"{RED}Ошибок: {stats['errors']} (повторный запуск выполнит только невыполненные шаги){RESET}")
+    if not args.plan and not stats['errors']:
+        with open(rollback_file(args.runs, args.run_id), 'w') as f:
+            json.dump(dict(stats, time=started, duration=round(duration, 3)), f, ensure_ascii=False, indent=2)
+    if stats['errors']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+# netbird_schema.py
+#
+# This module validates the objects of the configuration tree against per-entity schemas
+# (groups, users, dns, networks, resources, routes, policy): required keys, field types,
+# allowed values, nested objects (dns nameservers, policy rules, port ranges) and rules that
+# span several fields (a rule needs destinations or destinationResource, ports only for tcp/udp).
+# Schemas are compiled once at import into plain closures, one per field, so validating an
+# object is a dict lookup and an isinstance check per key.
+#
+# Usage:
+# from netbird_schema import validate_tree
+# for issue in validate_tree(load_config_tree()):
+#     print(issue.level, issue.location(), issue.message)
+#
+# Version: 1.0.1
+#
+
+import re
+from collections import namedtuple
+
+from netbird_cidr import parse_network
+
+ERROR = 'error'
+WARNING = 'warning'
+
+DOMAIN_RE = re.compile(r'^(\*\.)?([a-z0-9_]([a-z0-9_-]*[a-z0-9_])?\.)*[a-z0-9_]([a-z0-9_-]*[a-z0-9_])?$', re.IGNORECASE)
+
+
+class Issue(namedtuple('Issue', 'level entity fname idx key path message')):
+    __slots__ = ()
+
+    def location(self):
+        # groups/clusters.yaml, элемент 2 (c-Home), rules[0].protocol
+        where = f"{self.entity}/{self.fname}, элемент {self.idx + 1}"
+        if self.key:
+            where += f" ({self.key})"
+        return f"{where}, {self.path}" if self.path else where
+
+
+# Проверки значений: check(value) -> None или текст ошибки. Вложенные объекты возвращают
+# список (путь, уровень, текст) — см. obj()
+
+def string(value):
+    if not isinstance(value, str):
+        return f"ожидается строка, получено {type(value).__name__}"
+
+
+def boolean(value):
+    if not isinstance(value, bool):
+        return f"ожидается true/false, получено {value!r}"
+
+
+def integer(low=None, high=None):
+    def check(value):
+        if isinstance(value, bool) or not isinstance(value, int):
+            return f"ожидается целое число, получено {value!r}"
+        if (low is not None and value < low) or (high is not None and value > high):
+            return f"значение {value} вне диапазона {low}..{high}"
+    return check
+
+
+def enum(*values):
+    allowed = frozenset(values)
+
+    def check(value):
+        if not isinstance(value, str) or value not in allowed:
+            return f"недопустимое значение {value!r} (допустимо: {', '.join(values)})"
+    return check
+
+
+def port(value):
+    # Порты в правилах задаются строками или числами
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or not 1 <= value <= 65535:
+        return f"некорректный порт {value!r}"
+
+
+def ip_address(value):
+    net = parse_network(value) if isinstance(value, str) else None
+    if net is None or net.num_addresses != 1:
+        return f"ожидается IP-адрес, получено {value!r}"
+
+
+def address(value):
+    # Ресурс: IP, CIDR или домен (в том числе *.example.com)
+    if not isinstance(value, str) or not value.strip():
+        return f"ожидается IP, CIDR или домен, получено {value!r}"
+    if parse_network(value) is None and not DOMAIN_RE.match(value.strip()):
+        return f"некорректный адрес {value!r}: не IP/CIDR и не домен"
+
+
+def any_value(value):
+    return None
+
+
+def list_of(item_check):
+    def check(value):
+        if not isinstance(value, list):
+            return f"ожидается список, получено {type(value).__name__}"
+        issues = []
+        for i, item in enumerate(value):
+            result = item_check(item)
+            if result is None:
+                continue
+            if isinstance(result, str):
+                issues.append((f"[{i}]", ERROR, result))
+            else:
+                issues.extend((f"[{i}]{'.' if p and p[0] != '[' else ''}{p}", level, text) for p, level, text in result)
+        return issues or None
+    return check
+
+
+def one_or_list(item_check):
+    # Одиночное значение или список значений (destinationResource)
+    as_list = list_of(item_check)
+
+    def check(value):
+        return as_list(value) if isinstance(value, list) else item_check(value)
+    return check
+
+
+def obj(fields, required=(), constraints=()):
+    # Компилирует схему объекта в одну функцию: проверка по ключам объекта, затем обязательные
+    # поля и ограничения на сочетания полей. Возвращает список (путь, уровень, текст) или None
+    required = tuple(required)
+
+    def check(value):
+        if not isinstance(value, dict):
+            return [('', ERROR, f"ожидается объект, получено {type(value).__name__}")]
+        issues = []
+        for key, item in value.items():
+            field_check = fields.get(key)
+            if field_check is None:
+                issues.append((key, WARNING, "неизвестное поле"))
+                continue
+            if item is None:
+                continue
+            result = field_check(item)
+            if result is None:
+                continue
+            if isinstance(result, str):
+                issues.append((key, ERROR, result))
+            else:
+                issues.extend((f"{key}{'.' if p and p[0] != '[' else ''}{p}", level, text) for p, level, text in result)
+        for key in required:
+            if value.get(key) is None:
+                issues.append((key, ERROR, "обязательное поле не задано"))
+        for constraint in constraints:
+            result = constraint(value)
+            if result:
+                issues.append(result)
+        return issues or None
+    return check
+
+
+def requires_one_of(*keys):
+    def check(value):
+        if not any(value.get(key) for key in keys):
+            return ('', ERROR, f"нужно указать {' или '.join(keys)}")
+    return check
+
+
+def ports_need_protocol(value):
+    # API принимает порты только для tcp и udp
+    if (value.get('ports') or value.get('port_ranges')) and value.get('protocol', 'all') not in ('tcp', 'udp'):
+        return ('ports', ERROR, f"порты допустимы только для protocol tcp/udp, указан {value.get('protocol', 'all')}")
+
+
+NAMES = list_of(string)
+
+PORT_RANGE = obj({'start': integer(1, 65535), 'end': integer(1, 65535)}, required=('start', 'end'),
+                 constraints=[lambda r: ('', ERROR, f"start {r['start']} больше end {r['end']}")
+                              if isinstance(r.get('start'), int) and isinstance(r.get('end'), int) and r['start'] > r['end'] else None])
+
+RULE = obj({
+    'name': string,
+    'description': string,
+    'enabled': boolean,
+    'action': enum('accept', 'drop'),
+    'bidirectional': boolean,
+    'protocol': enum('all', 'tcp', 'udp', 'icmp'),
+    'ports': list_of(port),
+    'port_ranges': list_of(PORT_RANGE),
+    'sources': NAMES,
+    'destinations': NAMES,
+    'sourceResource': one_or_list(string),
+    'destinationResource': one_or_list(string),
+}, required=('name',), constraints=[requires_one_of('sources', 'sourceResource'),
+                                    requires_one_of('destinations', 'destinationResource'), ports_need_protocol])
+
+NAMESERVER = obj({'ip': ip_address, 'ns_type': enum('udp'), 'port': integer(1, 65535)}, required=('ip', 'ns_type', 'port'))
+
+SCHEMAS = {
+    'groups': obj({
+        'name': string,
+        'peers': NAMES,
+        'peers_match': any_value,  # синтаксис селекторов проверяет netbird_selectors (этап selectors)
+        'resources': NAMES,
+    }, required=('name',)),
+    'users': obj({
+        'name': string,
+        'email': string,
+        'role': enum('owner', 'admin', 'user', 'billing_admin', 'auditor', 'network_admin'),
+        'is_blocked': boolean,
+        'is_service_user': boolean,
+        'auto_groups': NAMES,
+    }, required=('email',)),
+    'dns': obj({
+        'name': string,
+        'description': string,
+        'enabled': boolean,
+        'primary': boolean,
+        'search_domains_enabled': boolean,
+        'domains': NAMES,
+        'nameservers': list_of(NAMESERVER),
+        'groups': NAMES,
+    }, required=('name', 'nameservers', 'groups')),
+    'networks': obj({
+        'name': string,
+        'description': string,
+        'resources': NAMES,
+        'routes': NAMES,
+        'policies': NAMES,
+    }, required=('name',)),
+    'resources': obj({
+        'name': string,
+        'description': string,
+        'type': enum('host', 'subnet', 'domain'),
+        'address': address,
+        'enabled': boolean,
+        'groups': NAMES,
+    }, required=('name', 'address')),
+    'routes': obj({
+        'name': string,
+        'description': string,
+        'enabled': boolean,
+        'metric': integer(1, 9999),
+        'masquerade': boolean,
+        'peer': string,
+        'peer_groups': NAMES,
+    }, required=('name',), constraints=[requires_one_of('peer', 'peer_groups')]),
+    'policy': obj({
+        'name': string,
+        'description': string,
+        'enabled': boolean,
+        'source_posture_checks': NAMES,
+        'rules': list_of(RULE),
+    }, required=('name', 'rules')),
+}
+
+
+def validate_object(entity, item):
+    # [(путь, уровень, текст)] для одного объекта
+    return SCHEMAS[entity](item) or []
+
+
+def validate_tree(tree):
+    # Issue по всем объектам дерева {entity: {fname: [obj, ...]}} в порядке файлов
+    issues = []
+    for entity, check in SCHEMAS.items():
+        for fname, items in tree.get(entity, {}).items():
+            for idx, item in enumerate(items):
+                result = check(item)
+                if not result:
+                    continue
+                key = (item.get('email') if entity == 'users' else item.get('name')) if isinstance(item, dict) else None
+                issues.extend(Issue(level, entity, fname, idx, key, path, text) for path, level, text in result)
+    return issues
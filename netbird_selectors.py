@@ -0,0 +1,138 @@
+# netbird_selectors.py
+#
+# This module expands peer selectors of groups (peers_match) against a peer inventory.
+# A selector is a glob over the peer name ("c-Home-*"), a regex ("re:^k8s-node-\d+$") or a
+# mapping of conditions over name/hostname/os that must all hold ({os: "Linux*", hostname: "db-*"}).
+# All selectors of all groups are compiled together and evaluated in one pass per field:
+# globs are answered from a sorted prefix index (the literal prefix before the first wildcard
+# selects a contiguous range), regexes of a field are joined into one alternation that is used
+# as a prefilter, so peers that match no regex are rejected with a single search.
+#
+# Usage:
+# from netbird_selectors import SelectorSet
+# selectors = SelectorSet({'c-Home': ['c-Home-*'], 'db': [{'os': 'Linux*', 'hostname': 're:^db-'}]})
+# selectors.expand(inventory)      # -> {'c-Home': ['c-Home-peer1', ...], 'db': [...]}
+#
+# Version: 1.0.1
+#
+
+import re
+import bisect
+import fnmatch
+
+FIELDS = ('name', 'hostname', 'os')
+REGEX_PREFIX = 're:'
+WILDCARDS = '*?['
+
+
+def parse_condition(field, pattern):
+    # (field, 'glob'|'regex', pattern, compiled); ошибки синтаксиса — ValueError
+    if field not in FIELDS:
+        raise ValueError(f"неизвестное поле селектора: {field} (допустимо: {', '.join(FIELDS)})")
+    if not isinstance(pattern, str) or not pattern:
+        raise ValueError(f"пустой или нестроковый шаблон в поле {field}")
+    if pattern.startswith(REGEX_PREFIX):
+        try:
+            return field, 'regex', pattern[len(REGEX_PREFIX):], re.compile(pattern[len(REGEX_PREFIX):])
+        except re.error as e:
+            raise ValueError(f"некорректное регулярное выражение '{pattern}': {e}")
+    return field, 'glob', pattern, re.compile(fnmatch.translate(pattern))
+
+
+def parse_selector(entry):
+    # Строка — условие по имени пира; словарь — условия по полям, которые должны выполняться все
+    if isinstance(entry, str):
+        return [parse_condition('name', entry)]
+    if isinstance(entry, dict) and entry:
+        return [parse_condition(field, pattern) for field, pattern in entry.items()]
+    raise ValueError(f"селектор должен быть строкой или словарём: {entry!r}")
+
+
+def glob_prefix(pattern):
+    # Буквальный префикс шаблона до первого символа подстановки
+    for i, ch in enumerate(pattern):
+        if ch in WILDCARDS:
+            return pattern[:i]
+    return pattern
+
+
+class PrefixIndex:
+    # Отсортированные значения поля с индексами пиров: все значения с общим префиксом лежат
+    # подряд, диапазон находится двумя бинарными поисками (плоское представление префиксного дерева)
+    def __init__(self, values):
+        pairs = sorted((v, i) for i, v in enumerate(values) if v is not None)
+        self.keys = [v for v, i in pairs]
+        self.ids = [i for v, i in pairs]
+
+    def with_prefix(self, prefix):
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + '\U0010ffff') if prefix else len(self.keys)
+        return zip(self.keys[lo:hi], self.ids[lo:hi])
+
+
+class SelectorSet:
+    def __init__(self, group_selectors):
+        # group_selectors: {группа: [селектор, ...]}; ValueError при ошибке в любом селекторе
+        self.selectors = {}
+        self.regexes = {field: [] for field in FIELDS}
+        for group, entries in group_selectors.items():
+            if not isinstance(entries, list):
+                entries = [entries]
+            try:
+                self.selectors[group] = [parse_selector(entry) for entry in entries]
+            except ValueError as e:
+                raise ValueError(f"группа {group}: {e}")
+            for conditions in self.selectors[group]:
+                for field, kind, pattern, compiled in conditions:
+                    if kind == 'regex' and pattern not in self.regexes[field]:
+                        self.regexes[field].append(pattern)
+
+    def _regex_matches(self, field, values):
+        # Один проход по значениям поля: объединённое выражение отсекает пиров, не подходящих ни под одно
+        patterns = self.regexes[field]
+        matches = {pattern: set() for pattern in patterns}
+        if not patterns:
+            return matches
+        combined = re.compile('|'.join(f"(?:{p})" for p in patterns))
+        compiled = [(p, re.compile(p)) for p in patterns]
+        for i, value in enumerate(values):
+            if value is None or not combined.search(value):
+                continue
+            for pattern, regex in compiled:
+                if regex.search(value):
+                    matches[pattern].add(i)
+        return matches
+
+    def expand(self, inventory):
+        # {группа: [имена пиров]} по inventory (netbird_models.Inventory)
+        values = {field: [getattr(p, field) for p in inventory.peers] for field in FIELDS}
+        regex_matches = {field: self._regex_matches(field, values[field]) for field in FIELDS}
+        prefix_indexes = {}
+        glob_cache = {}
+
+        def glob_matches(field, pattern, compiled):
+            key = (field, pattern)
+            if key not in glob_cache:
+                if field not in prefix_indexes:
+                    prefix_indexes[field] = PrefixIndex(values[field])
+                glob_cache[key] = {i for v, i in prefix_indexes[field].with_prefix(glob_prefix(pattern)) if compiled.match(v)}
+            return glob_cache[key]
+
+        result = {}
+        for group, selectors in self.selectors.items():
+            members = set()
+            for conditions in selectors:
+                matched = None
+                for field, kind, pattern, compiled in conditions:
+                    found = regex_matches[field][pattern] if kind == 'regex' else glob_matches(field, pattern, compiled)
+                    matched = found if matched is None else matched & found
+                    if not matched:
+                        break
+                members |= matched or set()
+            result[group] = sorted(inventory.peers[i].name for i in members if inventory.peers[i].name is not None)
+        return result
+
+
+def group_selectors(groups):
+    # {группа: peers_match} для групп с селекторами
+    return {g['name']: g['peers_match'] for g in groups if isinstance(g, dict) and 'name' in g and g.get('peers_match')}
@@ -0,0 +1,368 @@
+# visualize_html.py
+#
+# This module exports the relations graph of visualize_relations.py as one self-contained HTML
+# file that renders with WebGL (canvas 2D as a fallback) and can be shared as is.
+# Positions are computed once on export: the most connected nodes (anchors) are laid out with
+# the spring layout over their links and two-step links through other nodes; every other node
+# is placed level by level from the anchors on a spiral around its placed neighbour (or around
+# the centre of several), so the cost grows linearly after the fixed-size spring step. The payload is compact:
+# coordinates as Float32Array, type codes as Uint8Array, edges as Uint32Array (base64) and one
+# list of labels. Search by name and the group filter (same semantics as --groups/--depth)
+# run in the browser.
+#
+# Usage:
+# python3 visualize_relations.py --html graph.html [--groups c-Home --depth 2]
+#
+# Version: 1.0.1
+#
+
+import sys
+import json
+import math
+import base64
+from array import array
+
+ANCHORS = 1000
+ANCHOR_LINKS = 10       # сколько соседей-якорей узла связывать между собой для укладки якорей
+GOLDEN_ANGLE = math.pi * (3 - math.sqrt(5))
+
+
+def typed(typecode, values):
+    # base64 массива в порядке байтов little-endian (как у TypedArray в браузерах)
+    arr = array(typecode, values)
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return base64.b64encode(arr.tobytes()).decode('ascii')
+
+
+def anchor_graph(G, anchors):
+    # Якоря связаны, если соседствуют в G или есть общий сосед (политика, пир в двух группах)
+    import networkx as nx
+
+    H = nx.Graph()
+    H.add_nodes_from(anchors)
+    for n in G:
+        linked = [m for m in G[n] if m in anchors][:ANCHOR_LINKS]
+        if n in anchors:
+            H.add_edges_from((n, m) for m in linked)
+        for i, a in enumerate(linked):
+            H.add_edges_from((a, b) for b in linked[i + 1:])
+    return H
+
+
+def pack_components(H, seed=0):
+    # Самая большая компонента укладывается в [-1, 1], остальные — рядами под ней
+    import networkx as nx
+
+    components = sorted(nx.connected_components(H), key=lambda c: (-len(c), min(map(str, c))))
+    pos = {n: tuple(p) for n, p in nx.spring_layout(H.subgraph(components[0]), iterations=50, seed=seed).items()}
+    cell = 0.1
+    per_row = int(2 / cell)
+    for i, component in enumerate(components[1:]):
+        center = (-1 + cell * (i % per_row + 0.5), -1.1 - cell * (i // per_row))
+        sub = nx.spring_layout(H.subgraph(component), iterations=50, seed=seed, center=center, scale=cell * 0.4)
+        pos.update((n, tuple(p)) for n, p in sub.items())
+    return pos
+
+
+def scalable_layout(G, anchors=ANCHORS, seed=0):
+    # {узел: (x, y)}; небольшие графы укладываются целиком
+    import networkx as nx
+
+    if G.number_of_nodes() <= anchors:
+        return {n: tuple(p) for n, p in nx.spring_layout(G, iterations=50, seed=seed).items()}
+    ranked = sorted(G.degree, key=lambda item: (-item[1], str(item[0])))
+    chosen = {n for n, degree in ranked[:anchors]}
+    # В каждой компоненте связности нужен хотя бы один якорь
+    for component in nx.connected_components(G):
+        if chosen.isdisjoint(component):
+            chosen.add(max(component, key=lambda n: (G.degree(n), str(n))))
+    pos = pack_components(anchor_graph(G, chosen), seed)
+    # Остальные узлы — уровнями от якорей: узел с одним уже размещённым соседом — на спирали
+    # вокруг него, с несколькими — на спирали вокруг их центра (без узлов-хабов вроде All)
+    step = 0.15 / math.sqrt(len(chosen))
+    hub = math.sqrt(G.number_of_nodes())
+    slots = {}
+    frontier = sorted(chosen, key=lambda n: (-G.degree(n), str(n)))
+    while frontier:
+        level = {}
+        for parent in frontier:
+            for m in G[parent]:
+                if m not in pos and m not in level:
+                    level[m] = [p for p in G[m] if p in pos]
+        for child, parents in level.items():
+            if len(parents) > 1:
+                parents = [p for p in parents if G.degree(p) <= hub] or parents
+            if len(parents) == 1:
+                key = parents[0]
+                cx, cy = pos[key]
+            else:
+                cx = sum(pos[p][0] for p in parents) / len(parents)
+                cy = sum(pos[p][1] for p in parents) / len(parents)
+                key = (round(cx / step), round(cy / step))
+            k = slots.get(key, 0)
+            slots[key] = k + 1
+            r = step * math.sqrt(k + 1)
+            pos[child] = (cx + r * math.cos(k * GOLDEN_ANGLE), cy + r * math.sin(k * GOLDEN_ANGLE))
+        frontier = list(level)
+    return pos
+
+
+def graph_payload(G, pos, node_colors, node_labels):
+    # Компактное описание графа для страницы: индексы узлов вместо имён в рёбрах
+    types = list(node_colors) + [None]
+    type_index = {t: i for i, t in enumerate(types)}
+    nodes = list(G.nodes)
+    index = {n: i for i, n in enumerate(nodes)}
+    xy = [c for n in nodes for c in pos[n]]
+    return {
+        'labels': [str(G.nodes[n].get('label', n)) for n in nodes],
+        'types': typed('B', (type_index.get(G.nodes[n].get('type'), len(types) - 1) for n in nodes)),
+        'xy': typed('f', xy),
+        'edges': typed('I', (index[n] for edge in G.edges() for n in edge)),
+        'legend': [{'type': t, 'label': node_labels.get(t, 'Другое'), 'color': node_colors.get(t, '#808080')} for t in types],
+        'group_type': type_index['group'],
+    }
+
+
+def export_html(G, path, node_colors, node_labels, title='Netbird: облако связей между сущностями', pos=None):
+    from matplotlib.colors import to_hex
+
+    pos = pos if pos is not None else scalable_layout(G)
+    colors = {t: to_hex(c) for t, c in node_colors.items()}
+    payload = graph_payload(G, pos, colors, node_labels)
+    data = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/')
+    html = HTML_TEMPLATE.replace('__TITLE__', title).replace('__PAYLOAD__', data)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(html)
+    return len(html)
+
+
+HTML_TEMPLATE = r'''<!DOCTYPE html>
+<html lang="ru">
+<head>
+<meta charset="utf-8">
+<title>__TITLE__</title>
+<style>
+  html, body { margin: 0; height: 100%; overflow: hidden; font: 13px sans-serif; background: #fff; }
+  canvas { position: absolute; top: 0; left: 0; width: 100%; height: 100%; }
+  #panel { position: absolute; top: 8px; left: 8px; z-index: 2; background: rgba(255,255,255,.92);
+           border: 1px solid #ccc; border-radius: 4px; padding: 8px; width: 260px; }
+  #panel input { box-sizing: border-box; width: 100%; margin: 2px 0 6px; }
+  #panel .row { display: flex; gap: 6px; }
+  #panel .row input { width: auto; flex: 1; }
+  #legend div { display: flex; align-items: center; gap: 6px; }
+  #legend span { width: 12px; height: 12px; border: 1px solid #000; display: inline-block; }
+  #info { position: absolute; right: 8px; top: 8px; z-index: 2; max-width: 320px; background: rgba(255,255,255,.92);
+          border: 1px solid #ccc; border-radius: 4px; padding: 8px; display: none; white-space: pre-wrap; }
+</style>
+</head>
+<body>
+<canvas id="gl"></canvas>
+<canvas id="labels"></canvas>
+<div id="panel">
+  <b>__TITLE__</b><br>
+  Поиск (Enter — перейти):<input id="search" placeholder="имя объекта">
+  Группы через запятую и глубина:
+  <div class="row"><input id="groups" placeholder="c-Home,u-devops"><input id="depth" type="number" min="0" placeholder="∞" style="max-width:60px"></div>
+  <div class="row"><button id="apply">Показать</button><button id="reset">Все узлы</button></div>
+  <div id="stats"></div>
+  <div id="legend"></div>
+</div>
+<div id="info"></div>
+<script id="payload" type="application/json">__PAYLOAD__</script>
+<script>
+"use strict";
+const P = JSON.parse(document.getElementById('payload').textContent);
+function decode(b64, T) {
+  const bin = atob(b64), bytes = new Uint8Array(bin.length);
+  for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+  return new T(bytes.buffer);
+}
+const labels = P.labels, N = labels.length;
+const xy = decode(P.xy, Float32Array), types = decode(P.types, Uint8Array), edges = decode(P.edges, Uint32Array);
+const M = edges.length / 2;
+const rgb = P.legend.map(l => [1, 3, 5].map(i => parseInt(l.color.substr(i, 2), 16) / 255));
+
+// Списки смежности (CSR) для фильтра по группам и карточки узла
+const start = new Uint32Array(N + 1), adj = new Uint32Array(2 * M);
+for (let e = 0; e < 2 * M; e++) start[edges[e] + 1]++;
+for (let i = 0; i < N; i++) start[i + 1] += start[i];
+const fill = start.slice(0, N);
+for (let e = 0; e < M; e++) { const a = edges[2 * e], b = edges[2 * e + 1]; adj[fill[a]++] = b; adj[fill[b]++] = a; }
+const byLabel = new Map();
+for (let i = 0; i < N; i++) if (types[i] === P.group_type) byLabel.set(labels[i], i);
+
+// Видимые узлы и рёбра (фильтр), найденные узлы (поиск)
+let visible = new Uint8Array(N).fill(1), nodeIdx, edgeIdx, matches = [];
+function rebuild() {
+  const nodes = [], lines = [];
+  for (let i = 0; i < N; i++) if (visible[i]) nodes.push(i);
+  for (let e = 0; e < M; e++) if (visible[edges[2 * e]] && visible[edges[2 * e + 1]]) lines.push(edges[2 * e], edges[2 * e + 1]);
+  nodeIdx = new Uint32Array(nodes); edgeIdx = new Uint32Array(lines);
+  document.getElementById('stats').textContent = `Узлов: ${nodeIdx.length} из ${N}, рёбер: ${edgeIdx.length / 2} из ${M}` +
+    (matches.length ? `, найдено: ${matches.length}` : '');
+  upload(); redraw();
+}
+function filterGroups(names, depth) {
+  // Как visualize_relations.filter_graph: BFS до depth или вся компонента связности
+  const level = new Int32Array(N).fill(-1), queue = [];
+  for (const name of names) { const i = byLabel.get(name); if (i !== undefined && level[i] < 0) { level[i] = 0; queue.push(i); } }
+  for (let q = 0; q < queue.length; q++) {
+    const n = queue[q];
+    if (depth !== null && level[n] >= depth) continue;
+    for (let k = start[n]; k < start[n + 1]; k++) { const m = adj[k]; if (level[m] < 0) { level[m] = level[n] + 1; queue.push(m); } }
+  }
+  visible = new Uint8Array(N);
+  for (const n of queue) visible[n] = 1;
+}
+
+// Вид: центр (cx, cy) и масштаб (пикселей на единицу координат)
+let minX = Infinity, minY = Infinity, maxX = -Infinity, maxY = -Infinity;
+for (let i = 0; i < N; i++) { minX = Math.min(minX, xy[2 * i]); maxX = Math.max(maxX, xy[2 * i]); minY = Math.min(minY, xy[2 * i + 1]); maxY = Math.max(maxY, xy[2 * i + 1]); }
+const view = { cx: (minX + maxX) / 2 || 0, cy: (minY + maxY) / 2 || 0, s: 1 };
+const dpr = window.devicePixelRatio || 1, canvas = document.getElementById('gl'), overlay = document.getElementById('labels');
+const ctx = overlay.getContext('2d');
+function fit() { view.s = 0.9 * Math.min(canvas.width / (maxX - minX || 1), canvas.height / (maxY - minY || 1)); }
+function toScreen(i) { return [(xy[2 * i] - view.cx) * view.s + canvas.width / 2, canvas.height / 2 - (xy[2 * i + 1] - view.cy) * view.s]; }
+function pointSize() { return Math.max(2, Math.min(14, 1.5 * Math.sqrt(view.s * 2 / Math.sqrt(N)))) * dpr; }
+
+// WebGL: точки узлов и линии рёбер из общих буферов координат и цветов; без WebGL — canvas 2D
+const gl = canvas.getContext('webgl', { antialias: true });
+let prog, uScale, uOffset, uSize, uMode, uColor, nodeBuf, edgeBuf;
+if (gl && gl.getExtension('OES_element_index_uint')) {
+  const vs = `attribute vec2 a_pos; attribute vec3 a_color; uniform vec2 u_scale, u_offset; uniform float u_size;
+    varying vec3 v_color; void main() { gl_Position = vec4(a_pos * u_scale + u_offset, 0.0, 1.0); gl_PointSize = u_size; v_color = a_color; }`;
+  const fs = `precision mediump float; varying vec3 v_color; uniform float u_mode; uniform vec4 u_color;
+    void main() {
+      if (u_mode > 0.5) { vec2 d = gl_PointCoord - 0.5; if (dot(d, d) > 0.25) discard; }
+      gl_FragColor = u_color.a > 0.0 ? u_color : vec4(v_color, 1.0);
+    }`;
+  const shader = (type, src) => { const s = gl.createShader(type); gl.shaderSource(s, src); gl.compileShader(s); return s; };
+  prog = gl.createProgram();
+  gl.attachShader(prog, shader(gl.VERTEX_SHADER, vs)); gl.attachShader(prog, shader(gl.FRAGMENT_SHADER, fs));
+  gl.linkProgram(prog); gl.useProgram(prog);
+  const colors = new Float32Array(3 * N);
+  for (let i = 0; i < N; i++) colors.set(rgb[types[i]], 3 * i);
+  for (const [name, data, size] of [['a_pos', xy, 2], ['a_color', colors, 3]]) {
+    const buf = gl.createBuffer(), loc = gl.getAttribLocation(prog, name);
+    gl.bindBuffer(gl.ARRAY_BUFFER, buf); gl.bufferData(gl.ARRAY_BUFFER, data, gl.STATIC_DRAW);
+    gl.enableVertexAttribArray(loc); gl.vertexAttribPointer(loc, size, gl.FLOAT, false, 0, 0);
+  }
+  [uScale, uOffset, uSize, uMode, uColor] = ['u_scale', 'u_offset', 'u_size', 'u_mode', 'u_color'].map(u => gl.getUniformLocation(prog, u));
+  nodeBuf = gl.createBuffer(); edgeBuf = gl.createBuffer();
+  gl.enable(gl.BLEND); gl.blendFunc(gl.SRC_ALPHA, gl.ONE_MINUS_SRC_ALPHA);
+}
+let matchBuf = gl && prog ? gl.createBuffer() : null;
+function upload() {
+  if (!prog) return;
+  gl.bindBuffer(gl.ELEMENT_ARRAY_BUFFER, nodeBuf); gl.bufferData(gl.ELEMENT_ARRAY_BUFFER, nodeIdx, gl.STATIC_DRAW);
+  gl.bindBuffer(gl.ELEMENT_ARRAY_BUFFER, edgeBuf); gl.bufferData(gl.ELEMENT_ARRAY_BUFFER, edgeIdx, gl.STATIC_DRAW);
+  gl.bindBuffer(gl.ELEMENT_ARRAY_BUFFER, matchBuf); gl.bufferData(gl.ELEMENT_ARRAY_BUFFER, new Uint32Array(matches), gl.STATIC_DRAW);
+}
+function drawGL() {
+  gl.viewport(0, 0, canvas.width, canvas.height); gl.clearColor(1, 1, 1, 1); gl.clear(gl.COLOR_BUFFER_BIT);
+  const sx = 2 * view.s / canvas.width, sy = 2 * view.s / canvas.height;
+  gl.uniform2f(uScale, sx, sy); gl.uniform2f(uOffset, -view.cx * sx, -view.cy * sy);
+  gl.uniform1f(uMode, 0); gl.uniform4f(uColor, 0.5, 0.5, 0.5, 0.35);
+  gl.bindBuffer(gl.ELEMENT_ARRAY_BUFFER, edgeBuf); gl.drawElements(gl.LINES, edgeIdx.length, gl.UNSIGNED_INT, 0);
+  gl.uniform1f(uMode, 1); gl.uniform4f(uColor, 0, 0, 0, 0); gl.uniform1f(uSize, pointSize());
+  gl.bindBuffer(gl.ELEMENT_ARRAY_BUFFER, nodeBuf); gl.drawElements(gl.POINTS, nodeIdx.length, gl.UNSIGNED_INT, 0);
+  if (matches.length) {
+    gl.uniform1f(uSize, pointSize() + 8 * dpr); gl.uniform4f(uColor, 0.86, 0.08, 0.24, 0.8);
+    gl.bindBuffer(gl.ELEMENT_ARRAY_BUFFER, matchBuf); gl.drawElements(gl.POINTS, matches.length, gl.UNSIGNED_INT, 0);
+  }
+}
+function draw2D(c) {
+  c.strokeStyle = 'rgba(128,128,128,0.35)'; c.beginPath();
+  for (let e = 0; e < edgeIdx.length; e += 2) { const [x1, y1] = toScreen(edgeIdx[e]), [x2, y2] = toScreen(edgeIdx[e + 1]); c.moveTo(x1, y1); c.lineTo(x2, y2); }
+  c.stroke();
+  const r = pointSize() / 2;
+  for (const i of nodeIdx) { const [x, y] = toScreen(i); c.fillStyle = P.legend[types[i]].color; c.fillRect(x - r, y - r, 2 * r, 2 * r); }
+  c.fillStyle = 'rgba(220,20,60,0.8)';
+  for (const i of matches) { const [x, y] = toScreen(i); c.fillRect(x - r - 4, y - r - 4, 2 * r + 8, 2 * r + 8); }
+}
+function drawLabels() {
+  // Подписи — только когда в окне немного узлов, и для найденных узлов
+  ctx.clearRect(0, 0, overlay.width, overlay.height);
+  if (!prog) draw2D(ctx);
+  const inView = [], w = canvas.width, h = canvas.height;
+  for (const i of nodeIdx) {
+    const x = (xy[2 * i] - view.cx) * view.s + w / 2, y = h / 2 - (xy[2 * i + 1] - view.cy) * view.s;
+    if (x >= 0 && y >= 0 && x <= w && y <= h && inView.push(i) > 400) break;
+  }
+  ctx.font = `${11 * dpr}px sans-serif`; ctx.fillStyle = '#000';
+  for (const i of (inView.length <= 400 ? inView : []).concat(matches.slice(0, 50))) {
+    const [x, y] = toScreen(i); ctx.fillText(labels[i], x + pointSize() / 2 + 2, y + 4 * dpr);
+  }
+}
+let pending = false;
+function redraw() {
+  if (pending) return;
+  pending = true;
+  requestAnimationFrame(() => { pending = false; if (prog) drawGL(); drawLabels(); });
+}
+function resize() {
+  for (const c of [canvas, overlay]) { c.width = innerWidth * dpr; c.height = innerHeight * dpr; }
+  redraw();
+}
+
+// Перемещение, масштаб колесом вокруг курсора, карточка узла по щелчку
+let drag = null;
+canvas.style.pointerEvents = 'none';
+overlay.addEventListener('mousedown', e => { drag = { x: e.clientX, y: e.clientY, moved: false }; });
+addEventListener('mouseup', e => { if (drag && !drag.moved) pick(e); drag = null; });
+addEventListener('mousemove', e => {
+  if (!drag) return;
+  const dx = e.clientX - drag.x, dy = e.clientY - drag.y;
+  if (Math.abs(dx) + Math.abs(dy) > 2) drag.moved = true;
+  view.cx -= dx * dpr / view.s; view.cy += dy * dpr / view.s; drag.x = e.clientX; drag.y = e.clientY; redraw();
+});
+overlay.addEventListener('wheel', e => {
+  e.preventDefault();
+  const k = Math.exp(-e.deltaY * 0.0015), mx = e.clientX * dpr - canvas.width / 2, my = canvas.height / 2 - e.clientY * dpr;
+  view.cx += mx / view.s * (1 - 1 / k); view.cy += my / view.s * (1 - 1 / k); view.s *= k; redraw();
+}, { passive: false });
+function pick(e) {
+  const px = e.clientX * dpr, py = e.clientY * dpr, r2 = Math.pow(pointSize() / 2 + 4 * dpr, 2);
+  let best = -1, bestD = r2;
+  for (const i of nodeIdx) { const [x, y] = toScreen(i), d = (x - px) ** 2 + (y - py) ** 2; if (d <= bestD) { best = i; bestD = d; } }
+  const info = document.getElementById('info');
+  if (best < 0) { info.style.display = 'none'; return; }
+  const neighbors = [];
+  for (let k = start[best]; k < start[best + 1]; k++) neighbors.push(labels[adj[k]]);
+  info.textContent = `${labels[best]}\n${P.legend[types[best]].label}, связей: ${neighbors.length}\n\n` +
+    neighbors.slice(0, 30).join('\n') + (neighbors.length > 30 ? `\n… ещё ${neighbors.length - 30}` : '');
+  info.style.display = 'block';
+}
+
+document.getElementById('search').addEventListener('input', e => {
+  const q = e.target.value.trim().toLowerCase();
+  matches = [];
+  if (q) for (let i = 0; i < N && matches.length < 1000; i++) if (visible[i] && labels[i].toLowerCase().includes(q)) matches.push(i);
+  // Сначала точное совпадение, затем совпадение с начала имени
+  const rank = i => { const l = labels[i].toLowerCase(); return l === q ? 0 : l.startsWith(q) ? 1 : 2; };
+  matches.sort((a, b) => rank(a) - rank(b) || a - b);
+  rebuild();
+});
+document.getElementById('search').addEventListener('keydown', e => {
+  if (e.key !== 'Enter' || !matches.length) return;
+  view.cx = xy[2 * matches[0]]; view.cy = xy[2 * matches[0] + 1]; view.s = Math.max(view.s, 40 * Math.sqrt(N)); redraw();
+});
+document.getElementById('apply').addEventListener('click', () => {
+  const names = document.getElementById('groups').value.split(',').map(s => s.trim()).filter(Boolean);
+  const depth = document.getElementById('depth').value === '' ? null : parseInt(document.getElementById('depth').value, 10);
+  if (names.length) filterGroups(names, depth); else visible = new Uint8Array(N).fill(1);
+  rebuild();
+});
+document.getElementById('reset').addEventListener('click', () => { visible = new Uint8Array(N).fill(1); rebuild(); });
+document.getElementById('legend').innerHTML = P.legend.map(l => `<div><span style="background:${l.color}"></span>${l.label}</div>`).join('');
+
+addEventListener('resize', resize);
+for (const c of [canvas, overlay]) { c.width = innerWidth * dpr; c.height = innerHeight * dpr; }
+fit();
+rebuild();
+</script>
+</body>
+</html>
+'''
@@ -3,254 +3,572 @@
 # This script is used to visualize the relations between entities in the Netbird configuration.
 #
 # Usage:
-# python3 visualize_relations.py
+# python3 visualize_relations.py [--groups c-Home --depth 2] [--output graph.png] [--html graph.html]
 #
 # Version: 1.0.1
 
 import os
-import yaml
-import networkx as nx
-import matplotlib.pyplot as plt
-import numpy as np
+import math
+import itertools
 import argparse
 
-parser = argparse.ArgumentParser(description='Визуализация связей Netbird')
-parser.add_argument('--groups', type=str, default=None, help='Список групп через запятую для фильтрации визуализации')
-parser.add_argument('--depth', type=int, default=None, help='Глубина связывания от выбранных групп (по умолчанию — без ограничения)')
-parser.add_argument('--no-legend', action='store_true', help='Отключить отображение легенды по цветам узлов')
-args = parser.parse_args()
-
-if args.groups:
-    filter_groups = set([g.strip() for g in args.groups.split(',') if g.strip()])
-else:
-    filter_groups = None
-
-# Сбор всех сущностей и связей
-G = nx.Graph()
-
-# Группы
-groups = {}
-if os.path.isdir('groups'):
-    for fname in os.listdir('groups'):
-        if fname.endswith('.yaml') or fname.endswith('.yml'):
-            with open(os.path.join('groups', fname), 'r') as f:
-                configs = yaml.safe_load(f)
-                if isinstance(configs, list):
-                    for g in configs:
-                        if g and 'name' in g:
-                            groups[g['name']] = g
-                            G.add_node(g['name'], type='group')
-                elif isinstance(configs, dict) and 'name' in configs:
-                    groups[configs['name']] = configs
-                    G.add_node(configs['name'], type='group')
-
-# Пользователи
-if os.path.isdir('users'):
-    for fname in os.listdir('users'):
-        if fname.endswith('.yaml') or fname.endswith('.yml'):
-            with open(os.path.join('users', fname), 'r') as f:
-                configs = yaml.safe_load(f)
-                if isinstance(configs, list):
-                    for u in configs:
-                        if u and 'email' in u:
-                            G.add_node(u['email'], type='user')
-                            for g in u.get('auto_groups', []):
-                                G.add_edge(u['email'], g, label='auto_group')
-                elif isinstance(configs, dict) and 'email' in configs:
-                    G.add_node(configs['email'], type='user')
-                    for g in configs.get('auto_groups', []):
-                        G.add_edge(configs['email'], g, label='auto_group')
-
-# Пиры в группах
-for g in groups.values():
-    for peer in g.get('peers', []):
-        G.add_node(peer, type='peer')
-        G.add_edge(g['name'], peer, label='peer')
-
-# Ресурсы
-if os.path.isdir('resources'):
-    for fname in os.listdir('resources'):
-        if fname.endswith('.yaml') or fname.endswith('.yml'):
-            network_name = fname.rsplit('.', 1)[0]
-            with open(os.path.join('resources', fname), 'r') as f:
-                configs = yaml.safe_load(f)
-                if isinstance(configs, list):
-                    for r in configs:
-                        if r and 'name' in r:
-                            G.add_node(r['name'], type='resource')
-                            for gname in r.get('groups', []):
-                                G.add_edge(r['name'], gname, label='resource-group')
-                elif isinstance(configs, dict) and 'name' in configs:
-                    G.add_node(configs['name'], type='resource')
-                    for gname in configs.get('groups', []):
-                        G.add_edge(configs['name'], gname, label='resource-group')
-
-# Роуты
-if os.path.isdir('routes'):
-    for fname in os.listdir('routes'):
-        if fname.endswith('.yaml') or fname.endswith('.yml'):
-            with open(os.path.join('routes', fname), 'r') as f:
-                configs = yaml.safe_load(f)
-                if isinstance(configs, list):
-                    for r in configs:
-                        if r and 'name' in r:
-                            G.add_node(r['name'], type='route')
-                            for gname in r.get('peer_groups', []):
-                                G.add_edge(r['name'], gname, label='route-group')
-                elif isinstance(configs, dict) and 'name' in configs:
-                    G.add_node(configs['name'], type='route')
-                    for gname in configs.get('peer_groups', []):
-                        G.add_edge(configs['name'], gname, label='route-group')
-
-# Политики
-if os.path.isdir('policy'):
-    for fname in os.listdir('policy'):
-        if fname.endswith('.yaml') or fname.endswith('.yml'):
-            with open(os.path.join('policy', fname), 'r') as f:
-                configs = yaml.safe_load(f)
-                if isinstance(configs, list):
-                    for p in configs:
-                        if p and 'name' in p:
-                            G.add_node(p['name'], type='policy')
-                            for rule in p.get('rules', []):
-                                for gname in rule.get('sources', []):
-                                    G.add_edge(p['name'], gname, label='policy-source')
-                                for gname in rule.get('destinations', []):
-                                    G.add_edge(p['name'], gname, label='policy-dest')
-                elif isinstance(configs, dict) and 'name' in configs:
-                    G.add_node(configs['name'], type='policy')
-                    for rule in configs.get('rules', []):
-                        for gname in rule.get('sources', []):
-                            G.add_edge(configs['name'], gname, label='policy-source')
-                        for gname in rule.get('destinations', []):
-                            G.add_edge(configs['name'], gname, label='policy-dest')
-
-# После построения графа G:
-if filter_groups:
+import yaml
+
+from netbird_profile import Profiler, null_stage
+
+NODE_COLORS = {
+    'group': 'skyblue',
+    'user': 'orange',
+    'peer': 'green',
+    'resource': 'violet',
+    'route': 'red',
+    'policy': 'yellow',
+    'peers': 'lightgreen',
+    'users': 'navajowhite',
+    'more': 'lightgray',
+}
+
+NODE_LABELS = {
+    'group': 'Группы',
+    'user': 'Пользователи',
+    'peer': 'Пиры',
+    'resource': 'Ресурсы',
+    'route': 'Роуты',
+    'policy': 'Политики',
+    'peers': 'Пиры группы (свёрнуты)',
+    'users': 'Пользователи роли (свёрнуты)',
+    'more': 'Скрытые узлы типа',
+}
+LOD_TYPES = ('peers', 'users', 'more')
+
+# Детализация больших графов: сколько узлов показывать и сколько раскрывать за один щелчок
+MAX_NODES = 200
+EXPAND_LIMIT = 50
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Визуализация связей Netbird')
+    parser.add_argument('--groups', type=str, default=None, help='Список групп через запятую для фильтрации визуализации')
+    parser.add_argument('--depth', type=int, default=None, help='Глубина связывания от выбранных групп (по умолчанию — без ограничения)')
+    parser.add_argument('--no-legend', action='store_true', help='Отключить отображение легенды по цветам узлов')
+    parser.add_argument('--lod', choices=['auto', 'on', 'off'], default='auto', help='Свёртка пиров в узлы групп и ограничение числа узлов: auto — если узлов больше --max-nodes')
+    parser.add_argument('--max-nodes', type=int, default=MAX_NODES, help='Сколько узлов показывать в свёрнутом виде (двойной щелчок раскрывает узел)')
+    parser.add_argument('--users-by-role', action='store_true', help='В свёрнутом виде объединять пользователей по ролям')
+    parser.add_argument('--html', type=str, default=None, metavar='FILE', help='Экспорт в самодостаточный HTML (WebGL, поиск, фильтр групп) с заранее рассчитанной укладкой')
+    parser.add_argument('--output', type=str, default=None, metavar='FILE', help='Сохранить изображение в файл (png, svg, pdf) без открытия окна')
+    parser.add_argument('--profile', type=str, nargs='?', const='profile', default=None, metavar='DIR', help='Профилировать этапы: pstats и collapsed-стеки в DIR (по умолчанию profile)')
+    return parser.parse_args(argv)
+
+
+def build_graph():
+    import networkx as nx
+
+    # Сбор всех сущностей и связей
+    G = nx.Graph()
+
+    # Группы
+    groups = {}
+    if os.path.isdir('groups'):
+        for fname in os.listdir('groups'):
+            if fname.endswith('.yaml') or fname.endswith('.yml'):
+                with open(os.path.join('groups', fname), 'r') as f:
+                    configs = yaml.safe_load(f)
+                    if isinstance(configs, list):
+                        for g in configs:
+                            if g and 'name' in g:
+                                groups[g['name']] = g
+                                G.add_node(g['name'], type='group')
+                    elif isinstance(configs, dict) and 'name' in configs:
+                        groups[configs['name']] = configs
+                        G.add_node(configs['name'], type='group')
+
+    # Пользователи
+    if os.path.isdir('users'):
+        for fname in os.listdir('users'):
+            if fname.endswith('.yaml') or fname.endswith('.yml'):
+                with open(os.path.join('users', fname), 'r') as f:
+                    configs = yaml.safe_load(f)
+                    if isinstance(configs, list):
+                        for u in configs:
+                            if u and 'email' in u:
+                                G.add_node(u['email'], type='user', role=u.get('role'))
+                                for g in u.get('auto_groups', []):
+                                    G.add_edge(u['email'], g, label='auto_group')
+                    elif isinstance(configs, dict) and 'email' in configs:
+                        G.add_node(configs['email'], type='user', role=configs.get('role'))
+                        for g in configs.get('auto_groups', []):
+                            G.add_edge(configs['email'], g, label='auto_group')
+
+    # Пиры в группах
+    for g in groups.values():
+        for peer in g.get('peers', []):
+            G.add_node(peer, type='peer')
+            G.add_edge(g['name'], peer, label='peer')
+
+    # Ресурсы
+    if os.path.isdir('resources'):
+        for fname in os.listdir('resources'):
+            if fname.endswith('.yaml') or fname.endswith('.yml'):
+                network_name = fname.rsplit('.', 1)[0]
+                with open(os.path.join('resources', fname), 'r') as f:
+                    configs = yaml.safe_load(f)
+                    if isinstance(configs, list):
+                        for r in configs:
+                            if r and 'name' in r:
+                                G.add_node(r['name'], type='resource')
+                                for gname in r.get('groups', []):
+                                    G.add_edge(r['name'], gname, label='resource-group')
+                    elif isinstance(configs, dict) and 'name' in configs:
+                        G.add_node(configs['name'], type='resource')
+                        for gname in configs.get('groups', []):
+                            G.add_edge(configs['name'], gname, label='resource-group')
+
+    # Роуты
+    if os.path.isdir('routes'):
+        for fname in os.listdir('routes'):
+            if fname.endswith('.yaml') or fname.endswith('.yml'):
+                with open(os.path.join('routes', fname), 'r') as f:
+                    configs = yaml.safe_load(f)
+                    if isinstance(configs, list):
+                        for r in configs:
+                            if r and 'name' in r:
+                                G.add_node(r['name'], type='route')
+                                for gname in r.get('peer_groups', []):
+                                    G.add_edge(r['name'], gname, label='route-group')
+                    elif isinstance(configs, dict) and 'name' in configs:
+                        G.add_node(configs['name'], type='route')
+                        for gname in configs.get('peer_groups', []):
+                            G.add_edge(configs['name'], gname, label='route-group')
+
+    # Политики
+    if os.path.isdir('policy'):
+        for fname in os.listdir('policy'):
+            if fname.endswith('.yaml') or fname.endswith('.yml'):
+                with open(os.path.join('policy', fname), 'r') as f:
+                    configs = yaml.safe_load(f)
+                    if isinstance(configs, list):
+                        for p in configs:
+                            if p and 'name' in p:
+                                G.add_node(p['name'], type='policy')
+                                for rule in p.get('rules', []):
+                                    for gname in rule.get('sources', []):
+                                        G.add_edge(p['name'], gname, label='policy-source')
+                                    for gname in rule.get('destinations', []):
+                                        G.add_edge(p['name'], gname, label='policy-dest')
+                    elif isinstance(configs, dict) and 'name' in configs:
+                        G.add_node(configs['name'], type='policy')
+                        for rule in configs.get('rules', []):
+                            for gname in rule.get('sources', []):
+                                G.add_edge(configs['name'], gname, label='policy-source')
+                            for gname in rule.get('destinations', []):
+                                G.add_edge(configs['name'], gname, label='policy-dest')
+
+    return G
+
+
+def filter_graph(G, filter_groups, depth):
+    import networkx as nx
+
     nodes_to_keep = set()
     for group in filter_groups:
         if group in G:
             nodes_to_keep.add(group)
-            if args.depth is not None:
+            if depth is not None:
                 # BFS до нужной глубины
                 queue = [(group, 0)]
                 visited = set([group])
                 while queue:
-                    node, depth = queue.pop(0)
-                    if depth >= args.depth:
+                    node, level = queue.pop(0)
+                    if level >= depth:
                         continue
                     for neighbor in G.neighbors(node):
                         if neighbor not in visited:
                             visited.add(neighbor)
                             nodes_to_keep.add(neighbor)
-                            queue.append((neighbor, depth + 1))
+                            queue.append((neighbor, level + 1))
             else:
                 nodes_to_keep.update(nx.node_connected_component(G, group))
-    G = G.subgraph(nodes_to_keep).copy()
-    # Пересчитываем позиции только для оставшихся
-    pos = nx.spring_layout(G, k=0.5, iterations=100)
-    node_colors = []
-    for n in G.nodes(data=True):
-        t = n[1].get('type')
-        if t == 'group':
-            node_colors.append('skyblue')
-        elif t == 'user':
-            node_colors.append('orange')
-        elif t == 'peer':
-            node_colors.append('green')
-        elif t == 'resource':
-            node_colors.append('violet')
-        elif t == 'route':
-            node_colors.append('red')
-        elif t == 'policy':
-            node_colors.append('yellow')
+    return G.subgraph(nodes_to_keep).copy()
+
+
+def node_colors_of(G):
+    return [NODE_COLORS.get(data.get('type'), 'gray') for n, data in G.nodes(data=True)]
+
+
+def aggregate_graph(G, users_by_role=False):
+    # Пиры сворачиваются в один узел на группу (count — число пиров, members — их имена),
+    # пользователи при users_by_role — в один узел на роль. Рёбра между свёрнутыми узлами
+    # объединяются, count ребра — число исходных связей
+    import networkx as nx
+
+    A = nx.Graph()
+    rep = {}
+    for n, data in G.nodes(data=True):
+        kind = data.get('type')
+        if kind == 'peer':
+            continue
+        if kind == 'user' and users_by_role:
+            role = data.get('role') or 'user'
+            key = f"users:{role}"
+            if key not in A:
+                A.add_node(key, type='users', role=role, count=0, members=[])
+            A.nodes[key]['count'] += 1
+            A.nodes[key]['members'].append(n)
+            A.nodes[key]['label'] = f"{role}: {A.nodes[key]['count']} польз."
+            rep[n] = key
         else:
-            node_colors.append('gray')
-
-# Визуализация
-plt.figure(figsize=(18, 12))
-pos = nx.spring_layout(G, k=0.5, iterations=100)
-node_colors = []
-for n in G.nodes(data=True):
-    t = n[1].get('type')
-    if t == 'group':
-        node_colors.append('skyblue')
-    elif t == 'user':
-        node_colors.append('orange')
-    elif t == 'peer':
-        node_colors.append('green')
-    elif t == 'resource':
-        node_colors.append('violet')
-    elif t == 'route':
-        node_colors.append('red')
-    elif t == 'policy':
-        node_colors.append('yellow')
-    else:
-        node_colors.append('gray')
-
-fig, ax = plt.subplots(figsize=(18, 12))
-
-nodes = nx.draw_networkx_nodes(G, pos, ax=ax, node_color=node_colors, node_size=800)
-edges = nx.draw_networkx_edges(G, pos, ax=ax, edge_color='gray')
-labels = nx.draw_networkx_labels(G, pos, ax=ax, font_size=8)
-plt.title('Netbird: облако связей между сущностями')
-plt.tight_layout()
-
-_drag_data = {'node': None, 'offset': (0, 0)}
-
-# Получаем список позиций и обратное соответствие координат -> node
-node_positions = {n: pos[n] for n in G.nodes}
-
-def get_node_under_point(event):
-    if event.inaxes != ax:
-        return None
-    xy = np.array([event.xdata, event.ydata])
-    min_dist = float('inf')
-    closest = None
-    for n, p in node_positions.items():
-        dist = np.linalg.norm(xy - p)
-        if dist < min_dist and dist < 0.07:  # радиус чувствительности
-            min_dist = dist
-            closest = n
-    return closest
-
-def on_press(event):
-    node = get_node_under_point(event)
-    if node is not None:
-        _drag_data['node'] = node
-        _drag_data['offset'] = (pos[node][0] - event.xdata, pos[node][1] - event.ydata)
+            A.add_node(n, **data)
+            rep[n] = n
+    for n, data in G.nodes(data=True):
+        if data.get('type') != 'group':
+            continue
+        peers = [p for p in G[n] if G.nodes[p].get('type') == 'peer']
+        if peers:
+            key = f"peers:{n}"
+            A.add_node(key, type='peers', group=n, count=len(peers), members=peers, label=f"{len(peers)} пиров")
+            A.add_edge(n, key, count=len(peers))
+    for u, v in G.edges():
+        if u not in rep or v not in rep or rep[u] == rep[v]:
+            continue
+        if A.has_edge(rep[u], rep[v]):
+            A[rep[u]][rep[v]]['count'] += 1
+        else:
+            A.add_edge(rep[u], rep[v], count=1)
+    return A
 
-def on_release(event):
-    _drag_data['node'] = None
 
-def on_motion(event):
-    node = _drag_data['node']
-    if node is not None and event.xdata is not None and event.ydata is not None:
-        pos[node][0] = event.xdata + _drag_data['offset'][0]
-        pos[node][1] = event.ydata + _drag_data['offset'][1]
-        node_positions[node] = pos[node]
-        ax.clear()
-        nx.draw_networkx_nodes(G, pos, ax=ax, node_color=node_colors, node_size=800)
-        nx.draw_networkx_edges(G, pos, ax=ax, edge_color='gray')
-        nx.draw_networkx_labels(G, pos, ax=ax, font_size=8)
-        plt.title('Netbird: облако связей между сущностями')
-        plt.tight_layout()
-        fig.canvas.draw()
-
-fig.canvas.mpl_connect('button_press_event', on_press)
-fig.canvas.mpl_connect('button_release_event', on_release)
-fig.canvas.mpl_connect('motion_notify_event', on_motion)
-
-if not args.no_legend:
+def node_score(G, n):
+    # Вес узла для отбора: число свёрнутых объектов и связей
+    return G.nodes[n].get('count', 1) + sum(d.get('count', 1) for d in G[n].values())
+
+
+class LodView:
+    # Ограниченное представление большого графа: после свёртки пиров (и ролей пользователей)
+    # показываются max_nodes узлов с наибольшим весом (поровну по типам), остальные — узлом
+    # «ещё N» на каждый тип.
+    # Двойной щелчок раскрывает узел порциями по expand_limit: свёрнутые пиры и пользователи,
+    # скрытые узлы типа, скрытые соседи обычного узла. Если узлов становится больше max_nodes,
+    # давние раскрытия сворачиваются обратно (в порядке раскрытия)
+    def __init__(self, G, users_by_role=False, max_nodes=MAX_NODES, expand_limit=EXPAND_LIMIT):
+        import networkx as nx
+
+        self.G = G
+        self.full = aggregate_graph(G, users_by_role)
+        self.max_edges = max_nodes * 4
+        self.expand_limit = expand_limit
+        self.view = nx.Graph()
+        # Узлы каждого типа по убыванию веса, типы чередуются: в видимую часть попадают все типы.
+        # Свёрнутые пиры группы показываются и скрываются вместе с группой
+        by_type = {}
+        for n in sorted(self.full, key=lambda n: (-node_score(self.full, n), str(n))):
+            if self.full.nodes[n].get('type') != 'peers':
+                by_type.setdefault(self.full.nodes[n].get('type'), []).append(n)
+        visible = []
+        for batch in itertools.zip_longest(*by_type.values()):
+            for n in batch:
+                if n is not None and len(visible) < max_nodes:
+                    visible += self._with_peers(n)
+        shown = set(visible)
+        self.hidden = {}
+        for n in self.full:
+            if n not in shown:
+                self.hidden.setdefault(self.full.nodes[n].get('type'), {})[n] = None
+        self._reveal(visible)
+        self._update_more()
+        self.max_nodes = max(max_nodes, self.view.number_of_nodes())
+        # Раскрытия по порядку: (узел, его атрибуты до раскрытия, добавленные узлы)
+        self.expansions = []
+
+    def _with_peers(self, n):
+        bucket = f"peers:{n}"
+        return [n, bucket] if self.full.nodes[n].get('type') == 'group' and bucket in self.full else [n]
+
+    def _reveal(self, nodes):
+        nodes = [m for n in nodes for m in self._with_peers(n)]
+        for n in nodes:
+            self.view.add_node(n, **self.full.nodes[n])
+            self.hidden.get(self.full.nodes[n].get('type'), {}).pop(n, None)
+        for n in nodes:
+            for m, data in self.full[n].items():
+                if m in self.view:
+                    self.view.add_edge(n, m, **data)
+
+    def _update_more(self):
+        # Узел «ещё N» на тип; рёбра к видимым узлам суммируют связи скрытых
+        for kind, nodes in self.hidden.items():
+            if kind == 'peers':
+                continue
+            key = f"more:{kind}"
+            if key in self.view:
+                self.view.remove_node(key)
+            if not nodes:
+                continue
+            self.view.add_node(key, type='more', hidden_type=kind, count=len(nodes), label=f"ещё {len(nodes)}: {kind}")
+            for n in nodes:
+                for m, data in self.full[n].items():
+                    if m in self.view and m != key:
+                        if self.view.has_edge(key, m):
+                            self.view[key][m]['count'] += data.get('count', 1)
+                        else:
+                            self.view.add_edge(key, m, count=data.get('count', 1))
+
+    def expandable(self, node):
+        data = self.view.nodes[node]
+        if data.get('type') in ('peers', 'users', 'more'):
+            return True
+        return any(m not in self.view for m in self.full[node]) if node in self.full else False
+
+    def _set_members(self, node, members):
+        data = self.view.nodes[node]
+        label = f"{len(members)} пиров" if data.get('type') == 'peers' else f"{data['role']}: {len(members)} польз."
+        data.update(members=members, count=len(members), label=label)
+
+    def expand(self, node):
+        # Возвращает добавленные узлы; свёрнутый узел уменьшается или исчезает
+        data = self.view.nodes[node]
+        kind = data.get('type')
+        before = dict(data)
+        if kind in ('peers', 'users'):
+            members = [m for m in data['members'] if m not in self.view]
+            shown, rest = members[:self.expand_limit], members[self.expand_limit:]
+            for m in shown:
+                self.view.add_node(m, **self.G.nodes[m])
+                for neighbor in self.G[m]:
+                    if neighbor in self.view:
+                        self.view.add_edge(m, neighbor, count=1)
+            if rest:
+                self._set_members(node, rest)
+            else:
+                self.view.remove_node(node)
+        else:
+            if kind == 'more':
+                shown = list(self.hidden.get(data['hidden_type'], {}))[:self.expand_limit]
+            else:
+                shown = [m for m in self.full[node] if m not in self.view and self.full.nodes[m].get('type') != 'peers'][:self.expand_limit]
+            self._reveal(shown)
+        self.expansions.append((node, before, shown))
+        self._enforce_limit(node)
+        self._update_more()
+        return shown
+
+    def _enforce_limit(self, current):
+        # Сворачивает самые давние раскрытия, пока узлов больше max_nodes; раскрытие, показавшее
+        # текущий узел, и само текущее раскрытие не сворачиваются
+        i = 0
+        while self.view.number_of_nodes() > self.max_nodes and i < len(self.expansions) - 1:
+            if current in self.expansions[i][2]:
+                i += 1
+                continue
+            self._collapse(*self.expansions.pop(i))
+
+    def _collapse(self, node, before, added):
+        kind = before.get('type')
+        if kind in ('peers', 'users'):
+            # Показанные участники возвращаются в свёрнутый узел (если он сам не скрыт)
+            returned = [m for m in added if m in self.view]
+            self.view.remove_nodes_from(returned)
+            if node in self.view:
+                self._set_members(node, returned + self.view.nodes[node]['members'])
+            elif node not in self.hidden.get(kind, {}) and returned:
+                self.view.add_node(node, **before)
+                self._set_members(node, returned)
+                for m, data in self.full[node].items():
+                    if m in self.view:
+                        self.view.add_edge(node, m, **data)
+            return
+        # Показанные узлы (вместе со свёрнутыми пирами групп) снова скрываются за «ещё N»
+        for n in added:
+            for m in self._with_peers(n):
+                if m in self.view:
+                    self.view.remove_node(m)
+                    self.hidden.setdefault(self.full.nodes[m].get('type'), {})[m] = None
+
+    def edges(self):
+        # Не больше max_edges рёбер с наибольшим числом связей
+        edges = list(self.view.edges(data='count', default=1))
+        if len(edges) > self.max_edges:
+            edges = sorted(edges, key=lambda e: -e[2])[:self.max_edges]
+        return [(u, v) for u, v, c in edges]
+
+
+def layout(G):
+    import networkx as nx
+    return nx.spring_layout(G, k=0.5, iterations=100)
+
+
+def layout_neighborhood(G, nodes, origin, radius=0.2):
+    # Укладка только новых узлов вокруг точки раскрытия; позиции остальных не меняются
+    import networkx as nx
+
+    if not nodes:
+        return {}
+    sub = G.subgraph(nodes)
+    return nx.spring_layout(sub, k=radius / max(1.0, len(nodes) ** 0.5), iterations=50, center=origin, scale=radius, seed=0)
+
+
+def node_size(data):
+    count = data.get('count')
+    return 800 if count is None else 400 + 200 * math.log2(count + 1)
+
+
+def draw(G, ax, pos, edgelist=None):
+    import networkx as nx
+    import matplotlib.pyplot as plt
+
+    edgelist = list(G.edges()) if edgelist is None else edgelist
+    nx.draw_networkx_nodes(G, pos, ax=ax, node_color=node_colors_of(G), node_size=[node_size(d) for n, d in G.nodes(data=True)])
+    nx.draw_networkx_edges(G, pos, ax=ax, edgelist=edgelist, edge_color='gray',
+                           width=[1 + math.log2(G[u][v].get('count', 1)) for u, v in edgelist])
+    nx.draw_networkx_labels(G, pos, ax=ax, font_size=8, labels={n: d.get('label', n) for n, d in G.nodes(data=True)})
+    plt.title('Netbird: облако связей между сущностями')
+    plt.tight_layout()
+
+
+def add_legend(ax, lod=False):
     from matplotlib.patches import Patch
-    legend_elements = [
-        Patch(facecolor='skyblue', edgecolor='k', label='Группы'),
-        Patch(facecolor='orange', edgecolor='k', label='Пользователи'),
-        Patch(facecolor='green', edgecolor='k', label='Пиры'),
-        Patch(facecolor='violet', edgecolor='k', label='Ресурсы'),
-        Patch(facecolor='red', edgecolor='k', label='Роуты'),
-        Patch(facecolor='yellow', edgecolor='k', label='Политики'),
-    ]
+    legend_elements = [Patch(facecolor=NODE_COLORS[t], edgecolor='k', label=label)
+                       for t, label in NODE_LABELS.items() if lod or t not in LOD_TYPES]
     ax.legend(handles=legend_elements, loc='upper right', fontsize=10, title='Легенда')
 
-plt.show()
+
+def render(G, path, no_legend=False, pos=None, lod=None):
+    # Без окна (backend Agg): отрисовка в файл, формат по расширению (png, svg, pdf)
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    G = lod.view if lod else G
+    pos = pos if pos is not None else layout(G)
+    fig, ax = plt.subplots(figsize=(18, 12))
+    draw(G, ax, pos, lod.edges() if lod else None)
+    if not no_legend:
+        add_legend(ax, lod is not None)
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def show(G, no_legend=False, lod=None):
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    # Визуализация
+    G = lod.view if lod else G
+    pos = layout(G)
+
+    fig, ax = plt.subplots(figsize=(18, 12))
+
+    def redraw():
+        ax.clear()
+        draw(G, ax, pos, lod.edges() if lod else None)
+        if not no_legend:
+            add_legend(ax, lod is not None)
+        fig.canvas.draw_idle()
+
+    redraw()
+
+    _drag_data = {'node': None, 'offset': (0, 0)}
+
+    # Получаем список позиций и обратное соответствие координат -> node
+    node_positions = {n: pos[n] for n in G.nodes}
+
+    def get_node_under_point(event):
+        if event.inaxes != ax:
+            return None
+        xy = np.array([event.xdata, event.ydata])
+        min_dist = float('inf')
+        closest = None
+        for n, p in node_positions.items():
+            dist = np.linalg.norm(xy - p)
+            if dist < min_dist and dist < 0.07:  # радиус чувствительности
+                min_dist = dist
+                closest = n
+        return closest
+
+    def expand(node):
+        # Двойной щелчок: новые узлы укладываются только вокруг раскрытого узла
+        origin = np.array(pos[node])
+        added = lod.expand(node)
+        for n in list(pos):
+            if n not in G:
+                del pos[n]
+        pos.update(layout_neighborhood(G, added, origin))
+        # Новые узлы «ещё N» (если появились) ставятся рядом с точкой раскрытия
+        for n in G:
+            if n not in pos:
+                pos[n] = origin + np.random.default_rng(len(pos)).uniform(-0.1, 0.1, 2)
+        node_positions.clear()
+        node_positions.update({n: pos[n] for n in G.nodes})
+        redraw()
+
+    def on_press(event):
+        node = get_node_under_point(event)
+        if node is None:
+            return
+        if event.dblclick and lod and lod.expandable(node):
+            _drag_data['node'] = None
+            expand(node)
+            return
+        _drag_data['node'] = node
+        _drag_data['offset'] = (pos[node][0] - event.xdata, pos[node][1] - event.ydata)
+
+    def on_release(event):
+        _drag_data['node'] = None
+
+    def on_motion(event):
+        node = _drag_data['node']
+        if node is not None and event.xdata is not None and event.ydata is not None:
+            pos[node][0] = event.xdata + _drag_data['offset'][0]
+            pos[node][1] = event.ydata + _drag_data['offset'][1]
+            node_positions[node] = pos[node]
+            redraw()
+
+    fig.canvas.mpl_connect('button_press_event', on_press)
+    fig.canvas.mpl_connect('button_release_event', on_release)
+    fig.canvas.mpl_connect('motion_notify_event', on_motion)
+
+    plt.show()
+
+
+def use_lod(G, mode, max_nodes):
+    return mode == 'on' or (mode == 'auto' and G.number_of_nodes() > max_nodes)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.groups:
+        filter_groups = set([g.strip() for g in args.groups.split(',') if g.strip()])
+    else:
+        filter_groups = None
+
+    profiler = Profiler(args.profile) if args.profile else None
+    stage = profiler.stage if profiler else null_stage
+    try:
+        with stage('build'):
+            G = build_graph()
+        if filter_groups:
+            with stage('filter'):
+                G = filter_graph(G, filter_groups, args.depth)
+        if args.html:
+            import visualize_html
+            with stage('html'):
+                size = visualize_html.export_html(G, args.html, NODE_COLORS, NODE_LABELS)
+            print(f"HTML: {args.html} ({G.number_of_nodes()} узлов, {G.number_of_edges()} рёбер, {size / 2 ** 20:.1f} МБ)")
+            if not args.output:
+                return
+        lod = None
+        if use_lod(G, args.lod, args.max_nodes):
+            with stage('lod'):
+                lod = LodView(G, args.users_by_role, args.max_nodes)
+        if args.output:
+            with stage('render'):
+                render(G, args.output, args.no_legend, lod=lod)
+        else:
+            with stage('show'):
+                show(G, args.no_legend, lod)
+    finally:
+        if profiler:
+            profiler.finish()
+
+
+if __name__ == '__main__':
+    main()